@@ -0,0 +1,39 @@
+// coordenador/hashring.js
+// Anel de hashing consistente: cada nó ocupa VNODES pontos (md5 de "<url>#<i>") e uma chave vai
+// para o primeiro ponto a partir do hash dela. Tirar ou pôr um nó só muda de lugar as chaves que
+// caíam nos pontos dele.
+const crypto = require('crypto');
+
+const VNODES = parseInt(process.env.HASH_RING_VNODES || "160", 10);
+
+function hash32(s) { return crypto.createHash('md5').update(s).digest().readUInt32BE(0); }
+
+// prefixo do telescópio: chave até o primeiro "_", o mesmo do token de fencing (fence:<prefixo>)
+function shardKey(resource) {
+  const i = resource.indexOf('_');
+  return i < 0 ? resource : resource.slice(0, i);
+}
+
+class HashRing {
+  constructor(nodes, vnodes = VNODES) {
+    this.nodes = [...nodes];
+    this.points = [];
+    for (const node of this.nodes) {
+      for (let i = 0; i < vnodes; i++) this.points.push({ h: hash32(`${node}#${i}`), node });
+    }
+    this.points.sort((a, b) => a.h - b.h);
+  }
+
+  get(key) {
+    if (this.points.length === 0) return null;
+    const h = hash32(key);
+    let lo = 0, hi = this.points.length;
+    while (lo < hi) {
+      const mid = (lo + hi) >> 1;
+      if (this.points[mid].h < h) lo = mid + 1; else hi = mid;
+    }
+    return this.points[lo % this.points.length].node;
+  }
+}
+
+module.exports = { HashRing, shardKey };
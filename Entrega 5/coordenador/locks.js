@@ -0,0 +1,172 @@
+// coordenador/locks.js
+// Aquisição, renovação e liberação tudo-ou-nada sobre os nós de shards.js: um nó (o script
+// atômico de sempre), vários nós (telescópios em nós diferentes ou prefixo em rebalanceamento) ou
+// o modo quórum (Redlock). As rotas e a espera em fila ficam em server.js.
+const CLOCK_DRIFT_FACTOR = parseFloat(process.env.CLOCK_DRIFT_FACTOR || "0.01");
+
+// concede todas as chaves ou nenhuma, numa única operação atômica no Redis (também usado para
+// chave única, por causa do token de fencing). Devolve {0, ocupadas...} sem gravar nada, ou
+// {1, prefixo, token, ...}: na concessão incrementa fence:<prefixo> de cada telescópio
+// (prefixo = chave até o primeiro "_", ex.: telescopio-1). O token só cresce, então o BD pode
+// recusar a escrita de quem tem token menor que o último visto (lock expirado e re-concedido).
+// ARGV[3] (opcional) é um piso para o token, ver fenceFloor.
+const LOCK_MANY_SCRIPT = `
+local held = {0}
+for i, k in ipairs(KEYS) do
+  if redis.call("exists", k) == 1 then table.insert(held, k) end
+end
+if #held > 1 then return held end
+local floor = tonumber(ARGV[3] or "0")
+local fences, seen = {1}, {}
+for i, k in ipairs(KEYS) do
+  redis.call("set", k, ARGV[1], "PX", ARGV[2])
+  local p = string.match(k, "^(.-)_") or k
+  if not seen[p] then
+    seen[p] = true
+    local f = redis.call("incr", "fence:" .. p)
+    if f < floor then
+      redis.call("set", "fence:" .. p, ARGV[3])
+      f = floor
+    end
+    table.insert(fences, p)
+    table.insert(fences, f)
+  end
+end
+return fences
+`;
+
+// renovação do lease: PEXPIRE em todas as chaves se todas ainda forem do owner, senão em nenhuma
+const EXTEND_SCRIPT = `
+for i, k in ipairs(KEYS) do
+  if redis.call("get", k) ~= ARGV[1] then return 0 end
+end
+for i, k in ipairs(KEYS) do
+  redis.call("pexpire", k, ARGV[2])
+end
+return 1
+`;
+
+const UNLOCK_MANY_SCRIPT = `
+local n = 0
+for i, k in ipairs(KEYS) do
+  if redis.call("get", k) == ARGV[1] then n = n + redis.call("del", k) end
+end
+return n
+`;
+
+function parseGrant(reply) {
+  if (reply[0] !== 1) return { ok: false, held: reply.slice(1) };
+  const fences = {};
+  for (let i = 1; i < reply.length; i += 2) fences[reply[i]] = reply[i + 1];
+  return { ok: true, fences };
+}
+
+function mergeFences(into, fences) {
+  for (const [p, t] of Object.entries(fences)) if (!(p in into) || t > into[p]) into[p] = t;
+  return into;
+}
+
+// shards: { groupsFor, quorum, LOCK_QUORUM } de createShards; notifyReleased([{ node, keys }]) avisa
+// os waiters (server.js); now é trocado nos testes (tests/locks.test.js)
+function createLocks({ groupsFor, quorum, LOCK_QUORUM }, { notifyReleased = async () => {}, driftFactor = CLOCK_DRIFT_FACTOR,
+                                                          now = Date.now } = {}) {
+  // Piso do token de fencing: relógio em ms * 1000. O contador fence:<prefixo> fica num nó só; quando
+  // o prefixo muda de nó (rebalanceamento) ou no modo quórum (maior token da maioria), o contador do
+  // outro nó pode estar atrás. Com o piso o token acompanha o relógio e continua crescendo, desde que
+  // um telescópio não passe de 1000 concessões por ms e os relógios dos coordenadores estejam acertados.
+  function fenceFloor() { return String(now() * 1000); }
+
+  // fn em cada grupo, em paralelo. Fora do modo quórum qualquer nó com erro derruba o pedido; no
+  // quórum os nós fora só deixam de contar, a menos que nenhum responda
+  async function eachGroup(groups, fn) {
+    const rs = await Promise.allSettled(groups.map(fn));
+    const failed = rs.filter((r) => r.status === 'rejected');
+    if (failed.length && (!LOCK_QUORUM || failed.length === rs.length)) throw failed[0].reason;
+    return rs.map((r) => (r.status === 'fulfilled' ? r.value : null));
+  }
+
+  async function unlockGroups(groups, owner) {
+    const released = await eachGroup(groups, (g) => g.node.client.eval(UNLOCK_MANY_SCRIPT, { keys: g.keys, arguments: [owner] }));
+    const freed = groups.filter((g, i) => released[i] > 0);
+    if (freed.length) await notifyReleased(freed);
+    // quórum: cada réplica conta a mesma chave
+    return LOCK_QUORUM ? Math.max(0, ...released) : released.reduce((a, n) => a + (n || 0), 0);
+  }
+
+  // tudo ou nada. Um nó: o script atômico de sempre. Vários (telescópios em nós diferentes, prefixo
+  // em rebalanceamento): nó a nó na ordem de groupsFor, desfazendo os anteriores se um recusar
+  async function lockOnce(keys, owner, ttl) {
+    const groups = groupsFor(keys);
+    if (LOCK_QUORUM) return lockQuorum(groups, owner, ttl);
+    const fences = {}, done = [];
+    try {
+      for (const g of groups) {
+        const r = parseGrant(await g.node.client.eval(LOCK_MANY_SCRIPT, { keys: g.keys, arguments: [owner, String(ttl), fenceFloor()] }));
+        if (!r.ok) {
+          await unlockGroups(done, owner);
+          return r;
+        }
+        done.push(g);
+        mergeFences(fences, r.fences);
+      }
+    } catch (e) {
+      await unlockGroups(done, owner).catch(() => {});  // o que sobrar expira pelo ttl
+      throw e;
+    }
+    return { ok: true, fences };
+  }
+
+  // Redlock: o mesmo script em todos os nós; vale com a maioria e só pelo que sobra do ttl depois
+  // do tempo gasto e da margem de relógio. Sem maioria desfaz tudo; sem nenhuma recusa (só nós fora
+  // ou ttl esgotado) o pedido é "unavailable", não "locked"
+  async function lockQuorum(groups, owner, ttl) {
+    const start = now();
+    const floor = fenceFloor();
+    const rs = await Promise.allSettled(groups.map((g) => g.node.client.eval(LOCK_MANY_SCRIPT, { keys: g.keys, arguments: [owner, String(ttl), floor] })));
+    const fences = {}, held = new Set();
+    let granted = 0;
+    for (const r of rs) {
+      if (r.status !== 'fulfilled') continue;
+      const g = parseGrant(r.value);
+      if (g.ok) { granted++; mergeFences(fences, g.fences); }
+      else g.held.forEach((k) => held.add(k));
+    }
+    const validity = ttl - (now() - start) - Math.ceil(ttl * driftFactor) - 2;
+    if (granted >= quorum && validity > 0) return { ok: true, fences, validity };
+    await unlockGroups(groups, owner).catch(() => {});
+    return { ok: false, held: [...held].sort(), unavailable: held.size === 0 };
+  }
+
+  async function extendLease(keys, owner, ttl) {
+    const groups = groupsFor(keys);
+    const r = await eachGroup(groups, (g) => g.node.client.eval(EXTEND_SCRIPT, { keys: g.keys, arguments: [owner, String(ttl)] }));
+    if (LOCK_QUORUM) return r.filter((v) => v === 1).length >= quorum;
+    if (r.every((v) => v === 1)) return true;
+    return groups.length > 1 && migrateLease(groups, keys, owner, ttl);
+  }
+
+  // carência de rebalanceamento: um lock concedido antes da mudança existe só no nó anterior. Vale se
+  // cada chave é do owner em algum dos seus nós; a renovação grava a chave onde falta (SET NX), então
+  // o lease acompanha o prefixo para o nó novo antes do fim da carência
+  async function migrateLease(groups, keys, owner, ttl) {
+    const values = await Promise.all(groups.map((g) => g.node.client.mGet(g.keys)));
+    const mine = new Set();
+    groups.forEach((g, i) => g.keys.forEach((k, j) => { if (values[i][j] === owner) mine.add(k); }));
+    if (keys.some((k) => !mine.has(k))) return false;
+    const rs = await Promise.all(groups.map(async (g, i) => {
+      const have = g.keys.filter((k, j) => values[i][j] === owner);
+      const missing = g.keys.filter((k, j) => values[i][j] === null);
+      if (have.length + missing.length < g.keys.length) return false;  // outro dono neste nó
+      const ok = await Promise.all([
+        have.length ? g.node.client.eval(EXTEND_SCRIPT, { keys: have, arguments: [owner, String(ttl)] }) : 1,
+        ...missing.map((k) => g.node.client.set(k, owner, { PX: ttl, NX: true }).then((v) => (v === 'OK' ? 1 : 0))),
+      ]);
+      return ok.every((v) => v === 1);
+    }));
+    return rs.every(Boolean);
+  }
+
+  return { fenceFloor, eachGroup, unlockGroups, lockOnce, extendLease };
+}
+
+module.exports = { createLocks, parseGrant, LOCK_MANY_SCRIPT, EXTEND_SCRIPT, UNLOCK_MANY_SCRIPT };
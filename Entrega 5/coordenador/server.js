@@ -1,36 +1,202 @@
 // coordenador/server.js
 const express = require('express');
-const { createClient } = require('redis');
 const { v4: uuidv4 } = require('uuid');
+const { createShards, NodeUnavailable } = require('./shards');
+const { createLocks, parseGrant } = require('./locks');
 
 const app = express();
 app.use(express.json());
 
-const REDIS_URL = process.env.REDIS_URL || "redis://redis:6379";
-const redis = createClient({ url: REDIS_URL });
-redis.on("error", (e) => console.error("redis err", e));
+function nowMs(){ return Date.now(); }
 
-(async () => { await redis.connect(); console.log("Redis connected", REDIS_URL); })();
+const MAX_LOCK_KEYS = parseInt(process.env.MAX_LOCK_KEYS || "1024", 10);
 
-function nowMs(){ return Date.now(); }
+// nós Redis (shards.js) e aquisição tudo-ou-nada sobre eles (locks.js)
+const { nodes, quorum, LOCK_QUORUM, groupsFor, status: nodeStatus } = createShards();
+const { fenceFloor, eachGroup, unlockGroups, lockOnce, extendLease } = createLocks({ groupsFor, quorum, LOCK_QUORUM }, { notifyReleased });
+
+// ---------- espera em fila (wait_ms) ----------
+// Quem pede wait_ms entra numa fila FIFO por chave (lista lockqueue:<chave>) com um ticket;
+// recebe o lock quando está na cabeça da fila de todas as suas chaves e elas estão livres.
+// O enfileiramento de todas as chaves é atômico (um script), então a ordem é a mesma em todas as
+// filas e pedidos multi-chave não formam ciclo. lockticket:<ticket> expira com o prazo do pedido:
+// ticket de quem desistiu ou morreu é descartado da cabeça da fila pelo próximo da fila.
+// Liberações são avisadas no canal RELEASE_CHANNEL; expiração por TTL não gera aviso, então os
+// waiters também re-tentam a cada LOCK_WAIT_POLL_MS. Pedidos sem wait_ms não passam pela fila.
+// A fila é por nó: um pedido com chaves em nós diferentes (ou no modo quórum) espera re-tentando a
+// aquisição tudo-ou-nada, sem ordem FIFO.
+const RELEASE_CHANNEL = 'lock-released';
+const LOCK_WAIT_MAX_MS = parseInt(process.env.LOCK_WAIT_MAX_MS || "10000", 10);
+const LOCK_WAIT_POLL_MS = parseInt(process.env.LOCK_WAIT_POLL_MS || "200", 10);
+
+const QUEUED_LOCK_SCRIPT = `
+local owner, ttl, ticket, wait_ttl = ARGV[1], ARGV[2], ARGV[3], tonumber(ARGV[4])
+redis.call("set", "lockticket:" .. ticket, 1, "PX", wait_ttl)
+local blocked = {0}
+for i, k in ipairs(KEYS) do
+  local q = "lockqueue:" .. k
+  if not redis.call("lpos", q, ticket) then redis.call("rpush", q, ticket) end
+  if redis.call("pttl", q) < wait_ttl then redis.call("pexpire", q, wait_ttl) end
+  while true do
+    local head = redis.call("lindex", q, 0)
+    if (not head) or head == ticket or redis.call("exists", "lockticket:" .. head) == 1 then break end
+    redis.call("lpop", q)
+  end
+  if redis.call("lindex", q, 0) ~= ticket or redis.call("exists", k) == 1 then table.insert(blocked, k) end
+end
+if #blocked > 1 then return blocked end
+for i, k in ipairs(KEYS) do
+  redis.call("lrem", "lockqueue:" .. k, 1, ticket)
+end
+redis.call("del", "lockticket:" .. ticket)
+local floor = tonumber(ARGV[5] or "0")
+local fences, seen = {1}, {}
+for i, k in ipairs(KEYS) do
+  redis.call("set", k, ARGV[1], "PX", ARGV[2])
+  local p = string.match(k, "^(.-)_") or k
+  if not seen[p] then
+    seen[p] = true
+    local f = redis.call("incr", "fence:" .. p)
+    if f < floor then
+      redis.call("set", "fence:" .. p, ARGV[5])
+      f = floor
+    end
+    table.insert(fences, p)
+    table.insert(fences, f)
+  end
+end
+return fences
+`;
+
+const CANCEL_WAIT_SCRIPT = `
+for i, k in ipairs(KEYS) do
+  redis.call("lrem", "lockqueue:" .. k, 1, ARGV[1])
+end
+return redis.call("del", "lockticket:" .. ARGV[1])
+`;
+
+const waiters = new Map();  // chave -> Set de callbacks dos pedidos esperando neste processo
+
+function wakeWaiters(keys) {
+  const fns = new Set();
+  for (const k of keys) for (const fn of (waiters.get(k) || [])) fns.add(fn);
+  fns.forEach((fn) => fn());
+}
+
+// conexão dedicada ao SUBSCRIBE em cada nó (uma conexão inscrita não executa outros comandos)
+for (const n of nodes) {
+  const sub = n.client.duplicate();
+  sub.on("error", (e) => console.error(`redis sub err ${n.url}`, e.message));
+  (async () => { await sub.connect(); await sub.subscribe(RELEASE_CHANNEL, (msg) => wakeWaiters(msg.split('\n'))); })()
+    .catch((e) => console.error(`redis sub connect ${n.url}`, e.message));
+}
+
+// aviso no nó de cada grupo ([{ node, keys }])
+async function notifyReleased(groups) {
+  await Promise.all(groups.map(async (g) => {
+    try { await g.node.client.publish(RELEASE_CHANNEL, g.keys.join('\n')); }
+    catch (e) { console.error('[notify err]', e); }
+  }));
+}
+
+async function waitForLock(keys, owner, ttl, waitMs) {
+  const ticket = uuidv4();
+  const deadline = nowMs() + waitMs;
+  // fila FIFO enquanto todas as chaves estão num nó só (conferido a cada volta: o anel pode mudar)
+  const first = groupsFor(keys);
+  let queue = (!LOCK_QUORUM && first.length === 1) ? first[0] : null;
+  const leaveQueue = async () => {
+    await queue.node.client.eval(CANCEL_WAIT_SCRIPT, { keys, arguments: [ticket] });
+    await notifyReleased([queue]);  // o próximo da fila pode ter virado cabeça
+  };
+  let wake = null;
+  const onRelease = () => { if (wake) wake(); };
+  for (const k of keys) { if (!waiters.has(k)) waiters.set(k, new Set()); waiters.get(k).add(onRelease); }
+  try {
+    while (true) {
+      // o ticket vive até o prazo (+ folga para o último script rodar)
+      const left = deadline - nowMs();
+      if (queue) {
+        const now = groupsFor(keys);
+        if (now.length !== 1 || now[0].node !== queue.node) { await leaveQueue(); queue = null; }
+      }
+      const r = queue
+        ? parseGrant(await queue.node.client.eval(QUEUED_LOCK_SCRIPT, { keys, arguments: [owner, String(ttl), ticket, String(Math.max(left, 0) + 1000), fenceFloor()] }))
+        : await lockOnce(keys, owner, ttl);
+      if (r.ok) return { ...r, waited: waitMs - Math.max(left, 0) };
+      if (left <= 0) {
+        if (queue) await leaveQueue();
+        return r;
+      }
+      await new Promise((resolve) => {
+        const t = setTimeout(resolve, Math.min(LOCK_WAIT_POLL_MS, left));
+        wake = () => { clearTimeout(t); resolve(); };
+      });
+      wake = null;
+    }
+  } finally {
+    for (const k of keys) { const w = waiters.get(k); w.delete(onRelease); if (w.size === 0) waiters.delete(k); }
+  }
+}
+
+// chaves ordenadas e sem repetição: mesma ordem de aquisição para todos os clientes
+function normalizeResources(resources) {
+  if (!Array.isArray(resources) || resources.length === 0) return null;
+  if (!resources.every((r) => typeof r === 'string' && r.length > 0)) return null;
+  return [...new Set(resources)].sort();
+}
+
+// 503 quando o nó das chaves está fora (ou em rebalanceamento sem o nó anterior)
+function internalError(res, e) {
+  if (e instanceof NodeUnavailable) return res.status(503).json({ error: 'unavailable', detail: e.message });
+  console.error(e);
+  return res.status(500).json({ error: 'internal', detail: String(e) });
+}
 
 app.post('/lock', async (req, res) => {
-  const { resource, ttl_ms } = req.body || {};
-  if (!resource) return res.status(400).json({ error: 'resource required' });
+  const { resource, resources, ttl_ms, wait_ms } = req.body || {};
+  if (!resource && !resources) return res.status(400).json({ error: 'resource required' });
   const ttl = (typeof ttl_ms === 'number' && ttl_ms>0) ? ttl_ms : 30000;
+  const wait = (typeof wait_ms === 'number' && wait_ms>0) ? Math.min(wait_ms, LOCK_WAIT_MAX_MS) : 0;
   const owner = uuidv4();
+  let keys = null;
+  if (resources) {
+    keys = normalizeResources(resources);
+    if (!keys) return res.status(400).json({ error: 'resources must be a non-empty array of strings' });
+    if (keys.length > MAX_LOCK_KEYS) return res.status(400).json({ error: `too many resources (max ${MAX_LOCK_KEYS})` });
+  }
+  const lockKeys = keys || [resource];
   try {
-    const ok = await redis.set(resource, owner, { NX: true, PX: ttl });
-    if (!ok) {
-      const current = await redis.get(resource);
-      const ttlLeft = await redis.pTTL(resource);
-      return res.status(409).json({ error: 'locked', owner: current, expiresAt: nowMs() + (ttlLeft>0 ? ttlLeft : 0) });
+    const r = wait ? await waitForLock(lockKeys, owner, ttl, wait) : await lockOnce(lockKeys, owner, ttl);
+    if (!r.ok) {
+      if (r.unavailable) return res.status(503).json({ error: 'unavailable', detail: `no quorum (${quorum} of ${nodes.length} nodes)` });
+      if (keys) return res.status(409).json({ error: 'locked', resources: r.held, ...(wait ? { waited_ms: wait } : {}) });
+      const g = groupsFor([resource]).find((x) => x.node.up);
+      const current = g ? await g.node.client.get(resource) : null;
+      const ttlLeft = g ? await g.node.client.pTTL(resource) : 0;
+      return res.status(409).json({ error: 'locked', owner: current, expiresAt: nowMs() + (ttlLeft>0 ? ttlLeft : 0), ...(wait ? { waited_ms: wait } : {}) });
     }
-    console.log(`[lock granted] resource=${resource} owner=${owner} ttl=${ttl}`);
-    return res.status(200).json({ owner, expiresAt: nowMs()+ttl });
+    console.log(`[lock granted] resources=${lockKeys.length} first=${lockKeys[0]} owner=${owner} ttl=${ttl} waited=${r.waited || 0}`);
+    return res.status(200).json({ owner, ...(keys ? { resources: keys } : {}), expiresAt: nowMs() + (r.validity || ttl), fences: r.fences,
+                                  ...(wait ? { waited_ms: r.waited } : {}) });
+  } catch (e) {
+    return internalError(res, e);
+  }
+});
+
+// renova o lease de quem ainda é dono de todas as chaves; 409 se alguma expirou ou mudou de dono
+app.post('/extend', async (req, res) => {
+  const { resource, resources, owner, ttl_ms } = req.body || {};
+  if (!resource && !resources) return res.status(400).json({ error: 'resource required' });
+  if (!owner) return res.status(400).json({ error: 'owner required' });
+  const keys = resources ? normalizeResources(resources) : [resource];
+  if (!keys) return res.status(400).json({ error: 'resources must be a non-empty array of strings' });
+  const ttl = (typeof ttl_ms === 'number' && ttl_ms>0) ? ttl_ms : 30000;
+  try {
+    if (!await extendLease(keys, owner, ttl)) return res.status(409).json({ error: 'lost', resources: keys });
+    return res.json({ result: 'extended', expiresAt: nowMs()+ttl });
   } catch (e) {
-    console.error(e);
-    return res.status(500).json({ error: 'internal', detail: String(e) });
+    return internalError(res, e);
   }
 });
 
@@ -43,34 +209,82 @@ end
 `;
 
 app.post('/unlock', async (req,res) => {
-  const { resource, owner } = req.body || {};
-  if (!resource) return res.status(400).json({ error:'resource required' });
+  const { resource, resources, owner } = req.body || {};
+  if (!resource && !resources) return res.status(400).json({ error:'resource required' });
+  if (resources) {
+    const keys = normalizeResources(resources);
+    if (!keys) return res.status(400).json({ error: 'resources must be a non-empty array of strings' });
+    if (!owner) return res.status(400).json({ error: 'owner required' });
+    try {
+      const n = await unlockGroups(groupsFor(keys), owner);
+      console.log(`[unlock] resources=${keys.length} released=${n} owner=${owner}`);
+      return res.json({ result: 'unlocked', released: n });
+    } catch (e) { return internalError(res, e); }
+  }
   try {
+    const groups = groupsFor([resource]);
     if (owner) {
-      const r = await redis.eval(UNLOCK_SCRIPT, { keys: [resource], arguments: [owner] });
-      if (r===1) { console.log(`[unlock] resource=${resource} owner=${owner}`); return res.json({ result:'unlocked' }); }
+      const r = await eachGroup(groups, (g) => g.node.client.eval(UNLOCK_SCRIPT, { keys: [resource], arguments: [owner] }));
+      if (r.includes(1)) {
+        await notifyReleased(groups.filter((g, i) => r[i] === 1));
+        console.log(`[unlock] resource=${resource} owner=${owner}`);
+        return res.json({ result:'unlocked' });
+      }
       else return res.status(403).json({ error:'owner-mismatch' });
     } else {
-      await redis.del(resource);
+      await eachGroup(groups, (g) => g.node.client.del(resource));
+      await notifyReleased(groups);
       return res.json({ result:'unlocked' });
     }
-  } catch (e) { console.error(e); return res.status(500).json({error:'internal', detail:String(e)}); }
+  } catch (e) { return internalError(res, e); }
 });
 
+// listagem paginada: SCAN (não bloqueia o Redis como KEYS) restrito ao prefixo das chaves de lock,
+// GET + PTTL de cada página num único pipeline. ?cursor= é o cursor do SCAN ("0" = início).
+// Com vários nós os nós são percorridos em ordem e o cursor leva o nó junto: cursor do SCAN * nós +
+// índice do nó (com um nó só é o próprio cursor do SCAN). No modo quórum cada réplica aparece.
+const LOCK_KEY_PREFIX = process.env.LOCK_KEY_PREFIX || 'telescopio-';
+const LOCKS_DEFAULT_COUNT = parseInt(process.env.LOCKS_DEFAULT_COUNT || "100", 10);
+const LOCKS_MAX_COUNT = parseInt(process.env.LOCKS_MAX_COUNT || "1000", 10);
+
+function globEscape(s) { return s.replace(/[*?[\]\\]/g, '\\$&'); }
+
 app.get('/locks', async (req,res) => {
+  const prefix = req.query.prefix || LOCK_KEY_PREFIX;
+  if (!prefix.startsWith(LOCK_KEY_PREFIX)) return res.status(400).json({ error: `prefix must start with ${LOCK_KEY_PREFIX}` });
+  const count = Math.min(Math.max(parseInt(req.query.limit || LOCKS_DEFAULT_COUNT, 10) || LOCKS_DEFAULT_COUNT, 1), LOCKS_MAX_COUNT);
+  const raw = String(req.query.cursor || '0');
+  if (!/^[0-9]+$/.test(raw)) return res.status(400).json({ error: 'invalid cursor' });
+  const n = BigInt(nodes.length);
+  let idx = Number(BigInt(raw) % n);
+  let cursor = String(BigInt(raw) / n);
   try {
-    const keys = await redis.keys('*');
-    const out = [];
-    for (const k of keys) {
-      const v = await redis.get(k);
-      const ttl = await redis.pTTL(k);
-      out.push({ resource:k, owner:v, ttl_ms: ttl });
+    // COUNT é só uma dica para o SCAN: repete até juntar uma página ou acabar o último nó
+    const found = [];  // [node, key]
+    while (idx < nodes.length && found.length < count) {
+      const r = await nodes[idx].client.scan(cursor, { MATCH: globEscape(prefix) + '*', COUNT: count });
+      cursor = String(r.cursor);
+      for (const k of r.keys) found.push([nodes[idx], k]);
+      if (cursor === '0') idx++;
+    }
+    const items = [];
+    for (const node of nodes) {
+      const keys = found.filter(([nd]) => nd === node).map(([, k]) => k);
+      if (!keys.length) continue;
+      const pipe = node.client.multi();
+      for (const k of keys) pipe.get(k).pTTL(k);
+      const replies = await pipe.execAsPipeline();
+      keys.forEach((k, i) => {
+        const owner = replies[2*i], ttl = replies[2*i + 1];
+        if (owner !== null && ttl !== -2)  // expirou entre o SCAN e o GET
+          items.push({ resource:k, owner, ttl_ms: ttl, ...(nodes.length > 1 ? { node: node.url } : {}) });
+      });
     }
-    return res.json(out);
+    return res.json({ items, next_cursor: idx >= nodes.length ? null : String(BigInt(cursor) * n + BigInt(idx)) });
   } catch(e) { return res.status(500).json({ error: String(e) }); }
 });
 
-app.get('/health', (req,res) => res.json({ status:'ok', time: new Date().toISOString()}));
+app.get('/health', (req,res) => res.json({ status:'ok', time: new Date().toISOString(), ...nodeStatus() }));
 
 const PORT = process.env.PORT || 3000;
 app.listen(PORT, () => console.log(`Coordenador listening ${PORT}`));
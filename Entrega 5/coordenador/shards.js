@@ -0,0 +1,112 @@
+// coordenador/shards.js
+// Nós Redis do coordenador: REDIS_NODES=url1,url2,... (sem ela, só REDIS_URL, como antes).
+// Cada chave de lock vai para o nó escolhido por hashing consistente do prefixo do telescópio
+// (hashring.js): os locks e o contador fence:<prefixo> de um telescópio ficam no mesmo nó, e um
+// pedido multi-chave de um telescópio continua sendo um script num nó só.
+// Rebalanceamento: o estado de cada conexão é conferido a cada NODE_CHECK_MS; quando um nó cai ou
+// volta, o anel é refeito só com os nós de pé e só os prefixos daquele nó mudam de lugar. Por
+// REBALANCE_GRACE_MS (>= maior ttl_ms em uso) um prefixo que mudou de nó vale nos dois lugares,
+// o novo e o anterior, para não conceder por cima de um lock que ainda vive no anterior; se o
+// anterior está fora, o prefixo fica indisponível (503) até o fim da carência, quando os locks
+// dele já expiraram.
+// Mudar REDIS_NODES exige reiniciar o coordenador: REDIS_NODES_PREVIOUS (a lista de antes) faz o
+// anel anterior valer na carência a partir do start, e os nós que saíram continuam conectados para
+// isso. Sem ela, locks vivos no dono anterior seriam ignorados e poderiam ser concedidos de novo.
+// LOCK_QUORUM=1: modo Redlock — os nós são mestres independentes, cada chave é gravada em todos e
+// o lock vale se a maioria concedeu dentro do ttl (descontados o tempo gasto e CLOCK_DRIFT_FACTOR).
+// Não usa o anel.
+// Teste local com vários redis-server:
+//   redis-server --port 6380 & redis-server --port 6381 & redis-server --port 6382 &
+//   REDIS_NODES=redis://localhost:6380,redis://localhost:6381,redis://localhost:6382 node server.js
+// (ou docker compose --profile shards up, ver docker-compose.yml). Testes: node --test
+const { HashRing, shardKey } = require('./hashring');
+
+function urlList(s) { return (s || '').split(',').map((u) => u.trim()).filter(Boolean); }
+
+const REDIS_NODES = urlList(process.env.REDIS_NODES || process.env.REDIS_URL || "redis://redis:6379");
+const REDIS_NODES_PREVIOUS = urlList(process.env.REDIS_NODES_PREVIOUS);
+const LOCK_QUORUM = process.env.LOCK_QUORUM === "1";
+const NODE_CHECK_MS = parseInt(process.env.NODE_CHECK_MS || "1000", 10);
+const REBALANCE_GRACE_MS = parseInt(process.env.REBALANCE_GRACE_MS || "30000", 10);
+
+class NodeUnavailable extends Error {}
+
+function redisClient(opts) {
+  return require('redis').createClient(opts);
+}
+
+// createClient e now são trocados nos testes (tests/shards.test.js)
+function createShards({ urls = REDIS_NODES, previousUrls = REDIS_NODES_PREVIOUS, quorumMode = LOCK_QUORUM,
+                        checkMs = NODE_CHECK_MS, graceMs = REBALANCE_GRACE_MS, createClient = redisClient,
+                        now = Date.now } = {}) {
+  const all = [...new Set([...urls, ...previousUrls])];
+  const nodes = all.map((url, index) => {
+    // com vários nós, sem fila offline: com o nó fora o comando falha na hora em vez de esperar a
+    // reconexão, e o pedido recebe 503 (ou, no quórum, o nó só não conta)
+    const client = createClient({ url, disableOfflineQueue: all.length > 1 });
+    client.on("error", (e) => console.error(`redis err ${url}`, e.message));
+    client.connect().then(() => console.log("Redis connected", url), (e) => console.error(`redis connect ${url}`, e.message));
+    return { url, index, client, up: true };
+  });
+  const byUrl = new Map(nodes.map((n) => [n.url, n]));
+  const members = nodes.filter((n) => urls.includes(n.url));  // os de REDIS_NODES
+  const quorum = Math.floor(members.length / 2) + 1;
+
+  let ring = new HashRing(urls);
+  // [{ ring, until }]: anéis anteriores ainda na carência (o de REDIS_NODES_PREVIOUS desde o start)
+  let previous = previousUrls.length && !quorumMode ? [{ ring: new HashRing(previousUrls), until: now() + graceMs }] : [];
+
+  function checkNodes() {
+    let changed = false;
+    for (const n of nodes) {
+      if (n.client.isReady !== n.up) {
+        n.up = n.client.isReady;
+        changed = members.includes(n) || changed;
+        console.log(`[node ${n.up ? 'up' : 'down'}] ${n.url}`);
+      }
+    }
+    if (!changed || quorumMode) return;
+    previous.push({ ring, until: now() + graceMs });
+    ring = new HashRing(members.filter((n) => n.up).map((n) => n.url));
+    console.log(`[rebalance] nodes=${ring.nodes.join(',') || '-'} grace_ms=${graceMs}`);
+  }
+
+  // nós onde a chave vale agora: o do anel atual mais os dos anéis ainda na carência
+  function nodesFor(key) {
+    const p = shardKey(key);
+    const t = now();
+    previous = previous.filter((h) => h.until > t);
+    const found = new Set([ring.get(p), ...previous.map((h) => h.ring.get(p))]);
+    if (found.has(null)) throw new NodeUnavailable('no redis node up');
+    const out = [...found].map((u) => byUrl.get(u));
+    const down = out.find((n) => !n.up);
+    if (down) throw new NodeUnavailable(`${down.url} is down (rebalancing ${p})`);
+    return out;
+  }
+
+  // [{ node, keys }] em ordem de nó (mesma ordem de aquisição para todos); no modo quórum, todos os nós
+  function groupsFor(keys) {
+    if (quorumMode) return members.map((node) => ({ node, keys }));
+    const groups = new Map();
+    for (const k of keys) {
+      for (const n of nodesFor(k)) {
+        if (!groups.has(n.index)) groups.set(n.index, { node: n, keys: [] });
+        groups.get(n.index).keys.push(k);
+      }
+    }
+    return [...groups.keys()].sort((a, b) => a - b).map((i) => groups.get(i));
+  }
+
+  function status() {
+    return { mode: quorumMode ? 'quorum' : 'sharded',
+             nodes: nodes.map((n) => ({ url: n.url, up: n.up, ...(members.includes(n) ? {} : { previous: true }) })) };
+  }
+
+  let timer = null;
+  if (nodes.length > 1) { timer = setInterval(checkNodes, checkMs); timer.unref(); }
+  const stop = () => clearInterval(timer);
+
+  return { nodes, quorum, LOCK_QUORUM: quorumMode, groupsFor, status, checkNodes, stop };
+}
+
+module.exports = { createShards, NodeUnavailable };
@@ -0,0 +1,84 @@
+// coordenador/tests/fake_redis.js
+// Cliente Redis em memória para os testes: só o que shards.js e locks.js usam. Os scripts Lua de
+// locks.js são reconhecidos pelo texto e executados em JS com a mesma semântica.
+const { LOCK_MANY_SCRIPT, EXTEND_SCRIPT, UNLOCK_MANY_SCRIPT } = require('../locks');
+
+class FakeRedis {
+  constructor(url) {
+    this.url = url;
+    this.data = new Map();  // chave -> { v, exp }
+    this.isReady = true;
+  }
+
+  on() {}
+  connect() { return Promise.resolve(); }
+
+  // nó fora: isReady falso (checkNodes) e comandos falhando (sem fila offline)
+  down() { this.isReady = false; }
+  up() { this.isReady = true; }
+
+  _check() { if (!this.isReady) throw new Error(`${this.url} down`); }
+
+  _get(k) {
+    const e = this.data.get(k);
+    if (!e) return null;
+    if (e.exp && e.exp <= Date.now()) { this.data.delete(k); return null; }
+    return e.v;
+  }
+
+  _set(k, v, px) { this.data.set(k, { v: String(v), exp: px ? Date.now() + Number(px) : 0 }); }
+
+  async get(k) { this._check(); return this._get(k); }
+  async mGet(keys) { this._check(); return keys.map((k) => this._get(k)); }
+
+  async set(k, v, { PX, NX } = {}) {
+    this._check();
+    if (NX && this._get(k) !== null) return null;
+    this._set(k, v, PX);
+    return 'OK';
+  }
+
+  async eval(script, { keys, arguments: args }) {
+    this._check();
+    if (script === LOCK_MANY_SCRIPT) {
+      const held = keys.filter((k) => this._get(k) !== null);
+      if (held.length) return [0, ...held];
+      const floor = Number(args[2] || 0);
+      const out = [1], seen = new Set();
+      for (const k of keys) {
+        this._set(k, args[0], args[1]);
+        const p = k.includes('_') ? k.slice(0, k.indexOf('_')) : k;
+        if (seen.has(p)) continue;
+        seen.add(p);
+        let f = Number(this._get(`fence:${p}`) || 0) + 1;
+        if (f < floor) f = floor;
+        this._set(`fence:${p}`, f);
+        out.push(p, f);
+      }
+      return out;
+    }
+    if (script === EXTEND_SCRIPT) {
+      if (keys.some((k) => this._get(k) !== args[0])) return 0;
+      for (const k of keys) this.data.get(k).exp = Date.now() + Number(args[1]);
+      return 1;
+    }
+    if (script === UNLOCK_MANY_SCRIPT) {
+      let n = 0;
+      for (const k of keys) if (this._get(k) === args[0]) { this.data.delete(k); n++; }
+      return n;
+    }
+    throw new Error('script desconhecido');
+  }
+}
+
+// createClient para createShards: um FakeRedis por url, reaproveitado entre instâncias (restart)
+function fakeCluster() {
+  const clients = new Map();
+  const createClient = ({ url }) => {
+    if (!clients.has(url)) clients.set(url, new FakeRedis(url));
+    return clients.get(url);
+  };
+  return { clients, createClient };
+}
+
+module.exports = { FakeRedis, fakeCluster };
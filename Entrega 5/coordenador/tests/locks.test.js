@@ -0,0 +1,81 @@
+const test = require('node:test');
+const assert = require('node:assert');
+const { HashRing } = require('../hashring');
+const { createShards } = require('../shards');
+const { createLocks } = require('../locks');
+const { fakeCluster } = require('./fake_redis');
+
+const URLS = ['redis://a:6379', 'redis://b:6379', 'redis://c:6379'];
+const PREFIXES = Array.from({ length: 300 }, (_, i) => `telescopio-${i}`);
+
+function setup(opts = {}) {
+  const cluster = opts.cluster || fakeCluster();
+  const shards = createShards({ urls: URLS, previousUrls: [], quorumMode: false, checkMs: 1e9, graceMs: 30000,
+                                createClient: cluster.createClient, ...opts });
+  shards.stop();
+  const released = [];
+  const locks = createLocks(shards, { notifyReleased: async (groups) => { released.push(...groups.map((g) => g.keys)); } });
+  return { cluster, shards, locks, released };
+}
+
+const ownerOf = (cluster, url, key) => cluster.clients.get(url).data.get(key)?.v ?? null;
+
+test('multi-node request is all or nothing', async () => {
+  const { cluster, shards, locks } = setup();
+  const ring = new HashRing(URLS);
+  const p1 = PREFIXES.find((p) => ring.get(p) === URLS[0]), p2 = PREFIXES.find((p) => ring.get(p) === URLS[1]);
+  const keys = [`${p1}_x`, `${p2}_x`];
+  assert.strictEqual(shards.groupsFor(keys).length, 2);
+  await cluster.clients.get(URLS[1]).set(`${p2}_x`, 'outro', { PX: 10000 });
+  const r = await locks.lockOnce(keys, 'o1', 10000);
+  assert.deepStrictEqual(r, { ok: false, held: [`${p2}_x`] });
+  assert.strictEqual(ownerOf(cluster, URLS[0], `${p1}_x`), null);  // desfeito no primeiro nó
+  await locks.unlockGroups(shards.groupsFor([`${p2}_x`]), 'outro');
+  const ok = await locks.lockOnce(keys, 'o1', 10000);
+  assert.ok(ok.ok);
+  assert.deepStrictEqual(Object.keys(ok.fences).sort(), [p1, p2].sort());
+  assert.ok(ok.fences[p1] >= Date.now() * 1000 - 1e6);  // piso de fencing pelo relógio
+});
+
+test('restart with a new node list honours locks on the previous owner', async () => {
+  const cluster = fakeCluster();
+  const old = setup({ cluster, urls: URLS.slice(0, 2) });
+  const before = new HashRing(URLS.slice(0, 2)), after = new HashRing(URLS);
+  const p = PREFIXES.find((x) => before.get(x) !== after.get(x));
+  assert.ok((await old.locks.lockOnce([`${p}_x`], 'antigo', 10000)).ok);
+
+  const blind = setup({ cluster });  // sem REDIS_NODES_PREVIOUS: concederia por cima
+  assert.ok((await blind.locks.lockOnce([`${p}_x`], 'novo', 10000)).ok);
+  await blind.locks.unlockGroups(blind.shards.groupsFor([`${p}_x`]), 'novo');
+
+  const next = setup({ cluster, previousUrls: URLS.slice(0, 2) });
+  assert.deepStrictEqual(await next.locks.lockOnce([`${p}_x`], 'novo', 10000), { ok: false, held: [`${p}_x`] });
+  // a renovação do holder antigo leva o lease para o nó novo
+  assert.ok(await next.locks.extendLease([`${p}_x`], 'antigo', 10000));
+  assert.strictEqual(ownerOf(cluster, after.get(p), `${p}_x`), 'antigo');
+  assert.strictEqual(await next.locks.extendLease([`${p}_x`], 'outro', 10000), false);
+});
+
+test('quorum mode grants with a majority and reports unavailable without one', async () => {
+  const { cluster, locks, released } = setup({ quorumMode: true });
+  const [a, b, c] = URLS.map((u) => cluster.clients.get(u));
+  c.down();
+  const r = await locks.lockOnce(['telescopio-1_x'], 'o1', 1000);
+  assert.ok(r.ok && r.validity > 0 && r.validity < 1000);
+  assert.strictEqual(await locks.extendLease(['telescopio-1_x'], 'o1', 1000), true);
+  assert.strictEqual(await locks.unlockGroups([{ node: { client: a }, keys: ['telescopio-1_x'] },
+                                               { node: { client: b }, keys: ['telescopio-1_x'] }], 'o1'), 1);
+
+  // minoria concedida (b já tem a chave de outro dono): desfaz e recusa
+  c.up();
+  await b.set('telescopio-2_x', 'outro', { PX: 10000 });
+  await c.set('telescopio-2_x', 'outro', { PX: 10000 });
+  released.length = 0;
+  const refused = await locks.lockOnce(['telescopio-2_x'], 'o2', 1000);
+  assert.deepStrictEqual(refused, { ok: false, held: ['telescopio-2_x'], unavailable: false });
+  assert.strictEqual(ownerOf(cluster, URLS[0], 'telescopio-2_x'), null);
+  assert.deepStrictEqual(released, [['telescopio-2_x']]);
+
+  b.down(); c.down();
+  assert.deepStrictEqual(await locks.lockOnce(['telescopio-3_x'], 'o3', 1000), { ok: false, held: [], unavailable: true });
+});
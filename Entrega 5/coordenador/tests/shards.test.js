@@ -0,0 +1,82 @@
+const test = require('node:test');
+const assert = require('node:assert');
+const { HashRing, shardKey } = require('../hashring');
+const { createShards, NodeUnavailable } = require('../shards');
+const { fakeCluster } = require('./fake_redis');
+
+const URLS = ['redis://a:6379', 'redis://b:6379', 'redis://c:6379'];
+const PREFIXES = Array.from({ length: 300 }, (_, i) => `telescopio-${i}`);
+
+// relógio manual para a carência
+function clock(t = 1000) { const now = () => t; now.advance = (ms) => { t += ms; }; return now; }
+
+function shards(opts = {}) {
+  const cluster = opts.cluster || fakeCluster();
+  const s = createShards({ urls: URLS, previousUrls: [], quorumMode: false, checkMs: 1e9, graceMs: 30000,
+                           createClient: cluster.createClient, ...opts });
+  s.stop();
+  return { s, cluster };
+}
+
+const urlsOf = (s, key) => s.groupsFor([key]).map((g) => g.node.url);
+
+test('hash ring moves only the keys of the removed node', () => {
+  const full = new HashRing(URLS), without = new HashRing(URLS.filter((u) => u !== URLS[1]));
+  const counts = {};
+  for (const p of PREFIXES) {
+    const owner = full.get(p);
+    counts[owner] = (counts[owner] || 0) + 1;
+    if (owner !== URLS[1]) assert.strictEqual(without.get(p), owner);
+    else assert.notStrictEqual(without.get(p), URLS[1]);
+  }
+  for (const u of URLS) assert.ok(counts[u] > 50, `${u} com ${counts[u]} de 300`);
+  assert.strictEqual(new HashRing([]).get('x'), null);
+});
+
+test('keys of one telescope go to one node, groups in node order', () => {
+  const { s } = shards();
+  assert.strictEqual(shardKey('telescopio-7_s15-2030-01-01T10:00Z'), 'telescopio-7');
+  const keys = PREFIXES.slice(0, 20).flatMap((p) => [`${p}_a`, `${p}_b`]);
+  const groups = s.groupsFor(keys);
+  assert.deepStrictEqual(groups.map((g) => g.node.index), [...groups.map((g) => g.node.index)].sort());
+  for (const g of groups) {
+    for (const k of g.keys) assert.deepStrictEqual(urlsOf(s, k), [g.node.url]);
+  }
+  assert.strictEqual(groups.reduce((n, g) => n + g.keys.length, 0), keys.length);
+});
+
+test('node down: moved prefixes unavailable during the grace, then on the new node', () => {
+  const now = clock();
+  const { s, cluster } = shards({ now });
+  const onB = PREFIXES.find((p) => urlsOf(s, `${p}_x`)[0] === URLS[1]);
+  const onA = PREFIXES.find((p) => urlsOf(s, `${p}_x`)[0] === URLS[0]);
+  cluster.clients.get(URLS[1]).down();
+  s.checkNodes();
+  assert.throws(() => s.groupsFor([`${onB}_x`]), NodeUnavailable);  // locks dele só no nó fora
+  assert.deepStrictEqual(urlsOf(s, `${onA}_x`), [URLS[0]]);  // quem não mudou segue normal
+  now.advance(30001);
+  assert.notDeepStrictEqual(urlsOf(s, `${onB}_x`), [URLS[1]]);
+  assert.strictEqual(urlsOf(s, `${onB}_x`).length, 1);
+  // o nó volta: o prefixo vale nos dois nós até o fim da nova carência
+  const moved = urlsOf(s, `${onB}_x`)[0];
+  cluster.clients.get(URLS[1]).up();
+  s.checkNodes();
+  assert.deepStrictEqual(urlsOf(s, `${onB}_x`).sort(), [moved, URLS[1]].sort());
+  now.advance(30001);
+  assert.deepStrictEqual(urlsOf(s, `${onB}_x`), [URLS[1]]);
+  assert.deepStrictEqual(s.status().nodes.map((n) => n.up), [true, true, true]);
+});
+
+test('REDIS_NODES_PREVIOUS keeps the old owner during the grace after a restart', () => {
+  const now = clock();
+  const before = new HashRing(URLS.slice(0, 2));
+  const { s } = shards({ now, previousUrls: URLS.slice(0, 2) });
+  const moved = PREFIXES.find((p) => new HashRing(URLS).get(p) !== before.get(p));
+  assert.deepStrictEqual(urlsOf(s, `${moved}_x`).sort(), [before.get(moved), URLS[2]].sort());
+  now.advance(30001);
+  assert.deepStrictEqual(urlsOf(s, `${moved}_x`), [URLS[2]]);
+  // nó retirado: continua conectado só para a carência
+  const { s: shrunk } = shards({ now, urls: URLS.slice(0, 2), previousUrls: URLS });
+  assert.deepStrictEqual(shrunk.status().nodes.map((n) => !!n.previous), [false, false, true]);
+  assert.strictEqual(shrunk.quorum, 2);
+});
@@ -1,31 +1,73 @@
 # flask/app.py
-from flask import Flask, request, jsonify, abort
+from flask import Flask, Response, request, jsonify, abort, g, make_response, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import CheckConstraint, and_
-from datetime import datetime, timezone
-import logging, json, os, requests, time
+from sqlalchemy import CheckConstraint, Index, and_, delete, func, or_, select, tuple_, update
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime, timedelta, timezone
+import base64, hashlib, heapq, logging, json, os, time
+from contextlib import contextmanager
 from functools import wraps
-from prometheus_client import Counter, generate_latest, CONTENT_TYPE_LATEST
+from itertools import islice
+from prometheus_client import Counter, Histogram, CollectorRegistry, generate_latest, multiprocess, CONTENT_TYPE_LATEST
+from coordinator_client import reset_client
+from conflict_cache import ConflictCache
+from availability import AvailabilityCache, DAY, join_days
+from lock_keys import lock_resources, key_time, TooManySlots
+from audit import get_writer as get_audit_writer
+import db_config
+from lock_providers import get_provider as get_lock_provider, fence_prefix, LOCK_KEY_PREFIX
+from lease import LeaseRenewer
+from group_commit import GroupCommitWriter, GROUP_COMMIT
+from idempotency import IdempotencyStore, StoredResponse, fingerprint, IDEMPOTENCY_REQUESTS, IDEMPOTENCY_WAIT_MS, MAX_KEY_LENGTH
+from storage import get_storage
+from read_model import ReadModel, READ_MODEL, READ_MODEL_PATH, READ_MODEL_READS
+from outbox_relay import OutboxRelay, OUTBOX_RELAY
+from db_shards import ShardRouter
 
 # ---------- CONFIG ----------
-COORDINATOR_URL = os.environ.get("COORDINATOR_URL", "http://coordenador:3000")
 ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "secret-token")  # replace in production
 SQLITE_PATH = os.environ.get("SQLITE_PATH", "sqlite:///agendamento.db")
-LOCK_TTL_MS = int(os.environ.get("LOCK_TTL_MS", "15000"))
+DATABASE_URL = os.environ.get("DATABASE_URL") or SQLITE_PATH  # ex.: postgresql+psycopg2://user:pw@host/db
+LOCK_TTL_MS = int(os.environ.get("LOCK_TTL_MS", "5000"))  # curto: o lease é renovado enquanto em uso
+LOCK_RENEW = os.environ.get("LOCK_RENEW", "1") == "1"  # renova o lease enquanto o lock está em uso (lease.py)
+LOCK_WAIT_MAX_MS = int(os.environ.get("LOCK_WAIT_MAX_MS", "5000"))  # teto do ?wait_ms= de POST /agendamentos
+LOCK_FENCE_RETENTION_S = int(os.environ.get("LOCK_FENCE_RETENTION_S", "3600"))  # lock_fences de horários já passados
+CONFLICT_CACHE = os.environ.get("CONFLICT_CACHE", "1") == "1"
+BATCH_MAX_ITEMS = int(os.environ.get("BATCH_MAX_ITEMS", "500"))
+LIST_DEFAULT_LIMIT = int(os.environ.get("LIST_DEFAULT_LIMIT", "100"))
+LIST_MAX_LIMIT = int(os.environ.get("LIST_MAX_LIMIT", "1000"))
+EXPORT_BATCH_SIZE = int(os.environ.get("EXPORT_BATCH_SIZE", "1000"))
+AVAILABILITY_MAX_DAYS = int(os.environ.get("AVAILABILITY_MAX_DAYS", "31"))
+AVAILABILITY_CACHE_DAYS = int(os.environ.get("AVAILABILITY_CACHE_DAYS", "4096"))
 
 # ---------- LOGGING ----------
 logging.basicConfig(level=logging.INFO, format="%(levelname)s:%(asctime)s:%(name)s:%(message)s", datefmt="%Y-%m-%dT%H:%M:%S")
 logger = logging.getLogger("servico-agendamento")
 
 # ---------- METRICS ----------
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
 REQ_COUNTER = Counter("app_requests_total", "Total HTTP requests", ["method", "endpoint", "status"])
+REQ_LATENCY = Histogram("app_request_duration_seconds", "HTTP request latency", ["method", "endpoint"], buckets=LATENCY_BUCKETS)
 SCHED_CREATED = Counter("agendamentos_created_total", "Total agendamentos created")
+BOOKING_PHASE = Histogram("agendamento_phase_duration_seconds", "Time spent in each phase of the booking path",
+                          ["phase"], buckets=LATENCY_BUCKETS)
+LOCK_WAIT = Histogram("lock_wait_seconds", "Time until the lock provider grants or refuses a lock", ["outcome"], buckets=LATENCY_BUCKETS)
+LOCK_HELD = Histogram("lock_held_seconds", "Time between lock grant and release", buckets=LATENCY_BUCKETS)
 
 # ---------- APP & DB ----------
 app = Flask(__name__)
-app.config["SQLALCHEMY_DATABASE_URI"] = SQLITE_PATH
+app.config["SQLALCHEMY_DATABASE_URI"] = DATABASE_URL
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 db = SQLAlchemy(app)
+with app.app_context():
+    db_config.configure_engine(db.engine)
+    storage = get_storage(db.engine.dialect.name)
+    # DB_SHARD_URLS: agendamentos particionados por telescópio (db_shards.py); sem ela, shard 0 = db
+    shards = ShardRouter(db.engine, db.session)
+
+@app.teardown_appcontext
+def _remove_shard_sessions(exc):
+    shards.remove()
 
 # ---------- MODELS ----------
 class Cientista(db.Model):
@@ -47,15 +89,304 @@ class Agendamento(db.Model):
     horario_inicio_utc = db.Column(db.DateTime, nullable=False)
     horario_fim_utc = db.Column(db.DateTime, nullable=False)
     status = db.Column(db.String, nullable=False, default="CONFIRMED")
-    __table_args__ = (CheckConstraint("horario_inicio_utc < horario_fim_utc", name="ck_horario"),)
+    __table_args__ = (
+        CheckConstraint("horario_inicio_utc < horario_fim_utc", name="ck_horario"),
+        # índice da verificação de conflito: igualdade em telescopio/status e faixa em horario_fim_utc > inicio,
+        # que só percorre reservas que terminam depois do início pedido (não todo o histórico).
+        # horario_inicio_utc entra como coluna de cobertura para o filtro "< fim" não precisar ler a tabela.
+        Index("ix_agendamentos_conflito", "telescopio_id", "status", "horario_fim_utc", "horario_inicio_utc"),
+        # paginação por chave (horario_inicio_utc, id), com e sem filtro de telescópio
+        Index("ix_agendamentos_inicio_id", "horario_inicio_utc", "id"),
+        Index("ix_agendamentos_telescopio_inicio_id", "telescopio_id", "horario_inicio_utc", "id"),
+    )
+
+# versão por telescópio, incrementada na mesma transação de cada create/cancel:
+# é o que invalida o ConflictCache dos outros workers
+class CacheVersion(db.Model):
+    __tablename__ = "cache_versions"
+    telescopio_id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+class LockFence(db.Model):
+    # maior token de fencing já gravado por chave de lock. O contador é por telescópio, mas a
+    # comparação é por chave: holders legítimos de chaves diferentes (reservas disjuntas) não se barram
+    __tablename__ = "lock_fences"
+    resource = db.Column(db.String, primary_key=True)
+    token = db.Column(db.BigInteger, nullable=False)
+    # horário da chave (key_time): uma linha por chave distinta, e as de horários que já passaram
+    # há mais de LOCK_FENCE_RETENTION_S são apagadas por advance_fence
+    slot_utc = db.Column(db.DateTime)
+    __table_args__ = (Index("ix_lock_fences_slot", "slot_utc"),)
+
+class OutboxEvent(db.Model):
+    # mudanças de agendamentos gravadas na mesma transação da alteração (record_change);
+    # o read model (read_model.py) é projetado a partir daqui, em ordem de id
+    __tablename__ = "outbox"
+    id = db.Column(db.Integer, primary_key=True)
+    event_type = db.Column(db.String, nullable=False)
+    agendamento_id = db.Column(db.Integer, nullable=False)
+    payload = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False)
+    # AUTOINCREMENT: no SQLite um id apagado nunca volta, então "id > checkpoint" não perde eventos
+    __table_args__ = ({"sqlite_autoincrement": True},)
 
 # ---------- HELPERS ----------
+def naive_utc(dt):
+    # as colunas DateTime do SQLite guardam UTC sem tzinfo
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
 def now_iso():
     return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
 
 def emit_audit(event_type, details):
-    # simple audit log to stdout (or file if you prefer)
-    logger.info(json.dumps({"timestamp": now_iso(), "event_type": event_type, "details": details}))
+    # só enfileira: formatação e escrita (stdout ou AUDIT_LOG_PATH) ficam na thread do AuditWriter
+    get_audit_writer().emit(event_type, details)
+
+def parse_agendamento(data):
+    # valida o corpo de um agendamento; devolve (inicio, fim) ou levanta ValueError
+    if not isinstance(data, dict):
+        raise ValueError("invalid body")
+    required = ["cientista_id","telescopio_id","horario_inicio_utc","horario_fim_utc"]
+    for r in required:
+        if r not in data:
+            raise ValueError(f"{r} required")
+    for r in ("cientista_id", "telescopio_id"):
+        # só inteiros: "1" e 1 virariam entradas diferentes nas chaves de lock e nas janelas do lote
+        if type(data[r]) is not int:
+            raise ValueError(f"{r} must be an integer")
+    try:
+        inicio = datetime.fromisoformat(data["horario_inicio_utc"].replace("Z","+00:00"))
+        fim = datetime.fromisoformat(data["horario_fim_utc"].replace("Z","+00:00"))
+    except Exception:
+        raise ValueError("invalid dates")
+    # comparados em UTC: uma data sem offset vale como UTC (como nas chaves de lock), e misturar
+    # com e sem offset não chega a comparar aware com naive (TypeError, 500)
+    if naive_utc(inicio) >= naive_utc(fim):
+        raise ValueError("horario_inicio_utc must be before horario_fim_utc")
+    return inicio, fim
+
+# session=None -> sessão do shard do telescópio (db.session sem DB_SHARD_URLS); o serviço ASGI
+# (asgi_app.py) passa a Session síncrona de AsyncSession.run_sync e reaproveita a mesma lógica de escrita
+def find_conflict(telescopio_id, inicio, fim, session=None):
+    inicio, fim = naive_utc(inicio), naive_utc(fim)
+    return (session or shards.for_telescope(telescopio_id)).query(Agendamento).filter(
+        Agendamento.telescopio_id==telescopio_id,
+        Agendamento.status=="CONFIRMED",
+        and_(Agendamento.horario_inicio_utc < fim, Agendamento.horario_fim_utc > inicio)
+    ).first()
+
+def cache_version(telescopio_id, session=None):
+    return (session or shards.for_telescope(telescopio_id)).execute(
+        select(CacheVersion.version).where(CacheVersion.telescopio_id==telescopio_id)
+    ).scalar() or 0
+
+def bump_cache_version(telescopio_id, session=None):
+    # chamada dentro da transação da alteração; devolve a nova versão. Um comando só (upsert):
+    # as primeiras reservas de um telescópio em chaves de lock diferentes podem criar a linha ao
+    # mesmo tempo, e com UPDATE seguido de INSERT a segunda receberia erro de chave primária
+    session = session or shards.for_telescope(telescopio_id)
+    stmt = storage.insert(CacheVersion).values(telescopio_id=telescopio_id, version=1)
+    stmt = stmt.on_conflict_do_update(index_elements=[CacheVersion.telescopio_id],
+                                      set_={"version": CacheVersion.version + 1})
+    return session.execute(stmt.returning(CacheVersion.version)).scalar_one()
+
+def public_id(a):
+    # id exposto na API, nos eventos e na auditoria: leva o shard (db_shards.py)
+    return shards.public_id(a.id, shards.shard_of(a.telescopio_id))
+
+def ensure_refs(session, rows):
+    # shards extras: cientistas e telescópios existem lá só para as FKs de agendamentos, copiados do
+    # shard 0. O que foi criado no shard 0 depois do init_shards é copiado na transação da primeira
+    # reserva que precisa dele. rows: [(cientista_id, telescopio_id)]
+    if session is shards.session(0):
+        return
+    for model, ids in ((Cientista, {c for c, _ in rows}), (Telescopio, {t for _, t in rows})):
+        missing = ids - set(session.scalars(select(model.id).where(model.id.in_(ids))))
+        if missing:
+            for row in db.session.scalars(select(model).where(model.id.in_(missing))):
+                session.merge(row)
+
+def change_payload(a, version):
+    return {"id": public_id(a), "cientista_id": a.cientista_id, "telescopio_id": a.telescopio_id,
+            "horario_inicio_utc": naive_utc(a.horario_inicio_utc).isoformat(),
+            "horario_fim_utc": naive_utc(a.horario_fim_utc).isoformat(),
+            "status": a.status, "version": version}
+
+def record_change(event_type, a, version, session=None):
+    # chamada na transação de todo create/cancel, depois do bump_cache_version: o evento leva a
+    # linha inteira e a versão nova do telescópio, o que basta para projetar sem consultar o BD
+    (session or db.session).add(OutboxEvent(event_type=event_type, agendamento_id=public_id(a),
+                                            payload=json.dumps(change_payload(a, version)),
+                                            created_at=naive_utc(datetime.now(timezone.utc))))
+
+class StaleLock(Exception):
+    pass
+
+def advance_fence(resource, token, session=None):
+    # dentro da transação da escrita: só avança se o token não for menor que o último gravado;
+    # um holder cujo lock expirou e foi concedido a outro tem token menor e é recusado.
+    # Devolve True quando a chave ainda não tinha linha
+    session = session or db.session
+    r = session.execute(
+        update(LockFence).where(LockFence.resource==resource, LockFence.token <= token).values(token=token)
+    )
+    if r.rowcount == 0:
+        if session.get(LockFence, resource) is not None:
+            raise StaleLock(f"token de fencing {token} velho para {resource}")
+        session.add(LockFence(resource=resource, token=token, slot_utc=key_time(resource)))
+        session.flush()
+        return True
+    return False
+
+def check_lock(owner, fences, resources, session=None):
+    # chamada logo antes do commit de quem escreve sob lock
+    if owner and lease_renewer.lost(owner):
+        raise StaleLock("lease do lock perdido")
+    keys = sorted(resources if isinstance(resources, (list, tuple)) else [resources])
+    inserted = False
+    for key in keys:
+        token = (fences or {}).get(fence_prefix(key))
+        if token is not None:
+            inserted = advance_fence(key, token, session) or inserted
+    if inserted:
+        # cada chave nova (no modo slots, várias por reserva) é uma linha: quem insere também poda
+        # as de horários passados, que ninguém mais disputa. As chaves deste commit ficam
+        cutoff = naive_utc(datetime.now(timezone.utc)) - timedelta(seconds=LOCK_FENCE_RETENTION_S)
+        (session or db.session).execute(delete(LockFence).where(LockFence.slot_utc < cutoff, LockFence.resource.not_in(keys)))
+
+def _load_confirmed(telescopio_id):
+    # só reservas que ainda não terminaram: o cache serve para novos pedidos, e o que ficar
+    # de fora apenas cai na verificação do BD
+    version = cache_version(telescopio_id)
+    rows = shards.for_telescope(telescopio_id).execute(
+        select(Agendamento.id, Agendamento.horario_inicio_utc, Agendamento.horario_fim_utc).where(
+            Agendamento.telescopio_id==telescopio_id,
+            Agendamento.status=="CONFIRMED",
+            Agendamento.horario_fim_utc > datetime.now(timezone.utc).replace(tzinfo=None),
+        )
+    ).all()
+    return version, rows
+
+conflict_cache = ConflictCache(_load_confirmed)
+
+def _load_busy(telescopio_id, lo, hi, session=None):
+    # varredura única, ordenada pelo início, das reservas CONFIRMED que tocam [lo, hi)
+    return (session or shards.for_telescope(telescopio_id)).execute(
+        select(Agendamento.horario_inicio_utc, Agendamento.horario_fim_utc).where(
+            Agendamento.telescopio_id==telescopio_id, Agendamento.status=="CONFIRMED",
+            Agendamento.horario_fim_utc > lo, Agendamento.horario_inicio_utc < hi,
+        ).order_by(Agendamento.horario_inicio_utc)
+    ).all()
+
+availability_cache = AvailabilityCache(_load_busy, AVAILABILITY_CACHE_DAYS)
+
+def _outbox_after(after_id, limit):
+    # roda nas threads do read model e do relay
+    with app.app_context():
+        rows = db.session.execute(
+            select(OutboxEvent.id, OutboxEvent.event_type, OutboxEvent.payload, OutboxEvent.created_at)
+            .where(OutboxEvent.id > after_id).order_by(OutboxEvent.id).limit(limit)
+        ).all()
+    return [(r.id, r.event_type, json.loads(r.payload), r.created_at.replace(tzinfo=timezone.utc).timestamp())
+            for r in rows]
+
+def _outbox_snapshot():
+    # primeiro start do read model. O último id da outbox é lido antes das linhas: um evento
+    # posterior que já esteja no snapshot é reaplicado em ordem e leva ao mesmo estado final
+    with app.app_context():
+        last = db.session.execute(select(func.max(OutboxEvent.id))).scalar() or 0
+        rows = db.session.execute(select(Agendamento.__table__)).all()
+        versions = dict(db.session.execute(select(CacheVersion.telescopio_id, CacheVersion.version)).all())
+    return last, [change_payload(r, None) for r in rows], versions
+
+def _outbox_prune(up_to_id, older_than):
+    # chamada pelo relay e pelo read model com o próprio offset: só sai o que passou da retenção e
+    # todos os consumidores ligados já leram. Um id apagado antes de o projetor aplicar seria
+    # pulado por contiguous() como buraco antigo
+    if READ_MODEL:
+        up_to_id = min(up_to_id, read_model.last_event())
+    if OUTBOX_RELAY:
+        up_to_id = min(up_to_id, outbox_relay.offset())
+    with app.app_context():
+        db.session.execute(delete(OutboxEvent).where(
+            OutboxEvent.id <= up_to_id,
+            OutboxEvent.created_at < datetime.fromtimestamp(older_than, timezone.utc).replace(tzinfo=None)))
+        db.session.commit()
+
+def _reference_rows(table):
+    # tabelas de referência do read model: ficam no BD principal (shard 0)
+    with app.app_context():
+        return [dict(r._mapping) for r in db.session.execute(select(table))]
+
+read_model = ReadModel(READ_MODEL_PATH, (Agendamento.__table__, CacheVersion.__table__), _outbox_after, _outbox_snapshot,
+                       _outbox_prune, reference_tables=(Telescopio.__table__,), load_reference=_reference_rows)
+
+outbox_relay = OutboxRelay(_outbox_after, _outbox_prune)
+
+@contextmanager
+def read_session():
+    # GETs: read model se READ_MODEL=1 e em dia (READ_MODEL_MAX_LAG_MS), senão None: BD principal,
+    # com os helpers escolhendo o shard pelo telescópio. O objeto devolvido só é usado com
+    # .execute(), que Session e Connection têm igual
+    if READ_MODEL:
+        read_model.ensure_started()
+        if read_model.fresh():
+            READ_MODEL_READS.labels(source="read_model").inc()
+            with read_model.connect() as conn:
+                yield conn
+            return
+        READ_MODEL_READS.labels(source="primary").inc()
+    yield None
+
+idempotency_store = IdempotencyStore()
+
+def _replay(stored, fp):
+    if stored.fingerprint != fp:
+        IDEMPOTENCY_REQUESTS.labels(outcome="mismatch").inc()
+        return jsonify({"error":"Unprocessable","message":"Idempotency-Key reutilizada com outro pedido"}), 422
+    IDEMPOTENCY_REQUESTS.labels(outcome="replayed").inc()
+    resp = Response(stored.body, status=stored.status, mimetype=stored.mimetype)
+    resp.headers["Idempotent-Replayed"] = "true"
+    return resp
+
+def idempotent(f):
+    # Idempotency-Key: a primeira resposta é guardada e os retries a recebem de volta; o retry que
+    # chega com o primeiro ainda em andamento (em qualquer worker, com IDEMPOTENCY_REDIS_URL) espera por ele.
+    # 409 (depende do estado de outras reservas) e 5xx (falha transitória) não são guardados.
+    @wraps(f)
+    def decorated(*a, **kw):
+        key = request.headers.get("Idempotency-Key")
+        if not key:
+            return f(*a, **kw)
+        if len(key) > MAX_KEY_LENGTH:
+            abort(400, f"Idempotency-Key too long (max {MAX_KEY_LENGTH})")
+        scope = f"{request.method} {request.path} {key}"
+        fp = fingerprint(request.method, request.path, request.get_data())
+        # um prazo só para as duas tentativas: a espera total fica em IDEMPOTENCY_WAIT_MS
+        deadline = time.monotonic() + IDEMPOTENCY_WAIT_MS / 1000.0
+        for _ in range(2):
+            stored = idempotency_store.get(scope)
+            if stored is not None:
+                return _replay(stored, fp)
+            if idempotency_store.begin(scope, deadline):
+                break
+        else:
+            IDEMPOTENCY_REQUESTS.labels(outcome="in_progress").inc()
+            return jsonify({"error":"Conflict","message":"pedido com esta Idempotency-Key em andamento"}), 409, {"Retry-After": "1"}
+        try:
+            resp = make_response(f(*a, **kw))
+            if resp.status_code < 500 and resp.status_code != 409:
+                idempotency_store.put(scope, StoredResponse(fp, resp.status_code, resp.get_data(), resp.mimetype,
+                                                            time.time() + idempotency_store.ttl_s))
+                IDEMPOTENCY_REQUESTS.labels(outcome="stored").inc()
+            else:
+                IDEMPOTENCY_REQUESTS.labels(outcome="not_stored").inc()
+            return resp
+        finally:
+            idempotency_store.finish(scope)
+    return decorated
 
 def require_token(f):
     @wraps(f)
@@ -69,33 +400,50 @@ def require_token(f):
         return f(*a, **kw)
     return decorated
 
-def acquire_lock(resource, ttl_ms=LOCK_TTL_MS):
-    url = f"{COORDINATOR_URL.rstrip('/')}/lock"
-    logger.info(f"[LOCK-TRY] resource={resource} url={url}")
+@contextmanager
+def phase(name):
+    # tempo de uma fase do caminho de agendamento (agendamento_phase_duration_seconds)
+    t0 = time.perf_counter()
     try:
-        r = requests.post(url, json={"resource": resource, "ttl_ms": ttl_ms}, timeout=3)
-        logger.info(f"[LOCK-RESP] status={r.status_code} body={r.text}")
-        if r.status_code == 200:
-            return True, r.json()
-        else:
-            return False, r.json()
-    except Exception as e:
-        logger.error(f"[LOCK-ERROR] {e}")
-        return False, {"error": "coordinator-unreachable", "detail": str(e)}
+        yield
+    finally:
+        BOOKING_PHASE.labels(phase=name).observe(time.perf_counter() - t0)
+
+lease_renewer = LeaseRenewer(lambda resource, owner, ttl_ms: get_lock_provider().extend(resource, owner, ttl_ms))
+
+def acquire_lock(resource, ttl_ms=LOCK_TTL_MS, wait_ms=0):
+    provider = get_lock_provider()
+    logger.info(f"[LOCK-TRY] resource={resource} provider={provider.name} wait_ms={wait_ms}")
+    t0 = time.perf_counter()
+    ok, info = provider.acquire(resource, ttl_ms, wait_ms)
+    if ok:
+        outcome = "granted"
+    elif str(info.get("error", "")).endswith("-unreachable"):
+        outcome = "error"
+    else:
+        outcome = "refused"
+    LOCK_WAIT.labels(outcome=outcome).observe(time.perf_counter() - t0)
+    if ok and LOCK_RENEW:
+        lease_renewer.track(resource, info.get("owner"), ttl_ms)
+    return ok, info
 
 def release_lock(resource, owner):
-    url = f"{COORDINATOR_URL.rstrip('/')}/unlock"
-    try:
-        requests.post(url, json={"resource": resource, "owner": owner}, timeout=2)
-    except Exception as e:
-        logger.warning(f"[UNLOCK-ERR] {e}")
+    lease_renewer.untrack(owner)
+    get_lock_provider().release(resource, owner)
 
 # ---------- ROUTES ----------
 @app.before_request
-def _count_req():
-    # increment basic metric
-    # endpoint may be None for 404s
-    pass
+def _start_timer():
+    g.t0 = time.perf_counter()
+
+@app.after_request
+def _count_req(resp):
+    # status real da resposta; url_rule é None para 404 de rota inexistente
+    endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+    REQ_COUNTER.labels(method=request.method, endpoint=endpoint, status=str(resp.status_code)).inc()
+    if "t0" in g:
+        REQ_LATENCY.labels(method=request.method, endpoint=endpoint).observe(time.perf_counter() - g.t0)
+    return resp
 
 @app.route("/health", methods=["GET"])
 def health():
@@ -103,6 +451,11 @@ def health():
 
 @app.route("/metrics")
 def metrics():
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        # vários workers (gunicorn): agrega os arquivos de métricas de todos os processos
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), 200, {"Content-Type": CONTENT_TYPE_LATEST}
     return generate_latest(), 200, {"Content-Type": CONTENT_TYPE_LATEST}
 
 @app.route("/openapi.yaml", methods=["GET"])
@@ -113,61 +466,499 @@ def openapi_spec():
 
 @app.route("/time", methods=["GET"])
 def get_time():
-    REQ_COUNTER.labels(method="GET", endpoint="/time", status="200").inc()
     return jsonify({"server_time_utc": now_iso()}), 200
 
+LIST_COLUMNS = (Agendamento.id, Agendamento.cientista_id, Agendamento.telescopio_id,
+                Agendamento.horario_inicio_utc, Agendamento.horario_fim_utc, Agendamento.status)
+
+def _iso(dt):
+    return dt.isoformat() + "Z"
+
+def _serialize_row(r):
+    return {
+        "id": r.id,
+        "cientista_id": r.cientista_id,
+        "telescopio_id": r.telescopio_id,
+        "horario_inicio_utc": _iso(r.horario_inicio_utc),
+        "horario_fim_utc": _iso(r.horario_fim_utc),
+        "status": r.status,
+    }
+
+def encode_cursor(inicio, ag_id):
+    return base64.urlsafe_b64encode(f"{inicio.isoformat()}|{ag_id}".encode()).decode().rstrip("=")
+
+def decode_cursor(cursor):
+    raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+    inicio, ag_id = raw.split("|")
+    return datetime.fromisoformat(inicio), int(ag_id)
+
+def _list_filters(args):
+    # filtros: telescopio, status, from/to (sobre horario_inicio_utc, intervalo [from, to))
+    filters = []
+    tel = args.get("telescopio", type=int)
+    if tel is not None:
+        filters.append(Agendamento.telescopio_id==tel)
+    if args.get("status"):
+        filters.append(Agendamento.status==args["status"].upper())
+    for name, op in (("from", "__ge__"), ("to", "__lt__")):
+        if args.get(name):
+            try:
+                dt = naive_utc(datetime.fromisoformat(args[name].replace("Z","+00:00")))
+            except ValueError:
+                abort(400, f"invalid {name}")
+            filters.append(getattr(Agendamento.horario_inicio_utc, op)(dt))
+    return filters
+
+def _page_query(filters, after, limit, columns=LIST_COLUMNS):
+    q = select(*columns).where(*filters)
+    if after is not None:
+        q = q.where(tuple_(Agendamento.horario_inicio_utc, Agendamento.id) > tuple_(*after))
+    return q.order_by(Agendamento.horario_inicio_utc, Agendamento.id).limit(limit)
+
+def _page(filters, after, limit, session=None, telescopio_id=None):
+    # after = (inicio, id público). Com shards e session=None: a página de cada shard (só o do
+    # telescópio, se filtrado) em paralelo, intercaladas pela mesma ordem (inicio, id público)
+    if session is not None or not shards.sharded:
+        return (session or db.session).execute(_page_query(filters, after, limit)).all()
+    def shard_page(shard):
+        # id local * n + shard cresce com o id local: a ordem por (inicio, id) do shard é a mesma
+        # da chave pública, e "id público > x" vira "id local > (x - shard) // n"
+        columns = LIST_COLUMNS[1:] + (shards.public_id(Agendamento.id, shard).label("id"),)
+        local_after = after and (after[0], (after[1] - shard) // shards.count)
+        with shards.engines[shard].connect() as conn:
+            return conn.execute(_page_query(filters, local_after, limit, columns)).all()
+    targets = [shards.shard_of(telescopio_id)] if telescopio_id is not None else None
+    pages = shards.gather(shard_page, targets)
+    return list(islice(heapq.merge(*pages, key=lambda r: (r.horario_inicio_utc, r.id)), limit))
+
+@app.route("/agendamentos", methods=["GET"])
+def list_agendamentos():
+    filters = _list_filters(request.args)
+    tel = request.args.get("telescopio", type=int)
+    after = None
+    if request.args.get("cursor"):
+        try:
+            after = decode_cursor(request.args["cursor"])
+        except Exception:
+            abort(400, "invalid cursor")
+
+    if request.args.get("format") == "ndjson" or request.accept_mimetypes.best == "application/x-ndjson":
+        # exportação: percorre tudo em lotes por chave, sem montar a lista em memória
+        def export(after=after):
+            with read_session() as rs:
+                while True:
+                    rows = _page(filters, after, EXPORT_BATCH_SIZE, rs, tel)
+                    for r in rows:
+                        yield json.dumps(_serialize_row(r)) + "\n"
+                    if len(rows) < EXPORT_BATCH_SIZE:
+                        return
+                    after = (rows[-1].horario_inicio_utc, rows[-1].id)
+        return Response(stream_with_context(export()), mimetype="application/x-ndjson")
+
+    limit = min(max(request.args.get("limit", LIST_DEFAULT_LIMIT, type=int), 1), LIST_MAX_LIMIT)
+    with read_session() as rs:
+        rows = _page(filters, after, limit + 1, rs, tel)
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].horario_inicio_utc, rows[-1].id)
+    resp = jsonify({"items": [_serialize_row(r) for r in rows], "next_cursor": next_cursor})
+    # ETag do conteúdo da página: If-None-Match igual -> 304 sem corpo
+    resp.add_etag()
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp.make_conditional(request)
+
 @app.route("/agendamentos", methods=["POST"])
+@idempotent
 def create_agendamento():
-    REQ_COUNTER.labels(method="POST", endpoint="/agendamentos", status="202").inc()
-    data = request.get_json(force=True)
-    required = ["cientista_id","telescopio_id","horario_inicio_utc","horario_fim_utc"]
-    for r in required:
-        if r not in data:
-            abort(400, f"{r} required")
-    try:
-        inicio = datetime.fromisoformat(data["horario_inicio_utc"].replace("Z","+00:00"))
-        fim = datetime.fromisoformat(data["horario_fim_utc"].replace("Z","+00:00"))
-    except:
-        abort(400, "invalid dates")
+    with phase("json_parse"):
+        data = request.get_json(force=True)
+        try:
+            inicio, fim = parse_agendamento(data)
+        except ValueError as e:
+            abort(400, str(e))
+
+    # rejeição antecipada de sobreposições conhecidas, sem ida ao coordenador
+    if CONFLICT_CACHE:
+        with phase("cache_check"):
+            cached = conflict_cache.overlap(data["telescopio_id"], cache_version(data["telescopio_id"]), inicio, fim)
+        if cached:
+            return jsonify({"error":"Conflict","message":"Conflito com agendamento confirmado"}), 409
+
+    if storage.native_exclusion:
+        return _create_native(data, inicio, fim)
 
-    resource = f"telescopio-{data['telescopio_id']}_{data['horario_inicio_utc']}"
-    ok, info = acquire_lock(resource)
+    # ?wait_ms=N: espera na fila do lock até N ms em vez de 409 imediato quando a chave está ocupada
+    wait_ms = min(max(request.args.get("wait_ms", 0, type=int), 0), LOCK_WAIT_MAX_MS)
+    try:
+        resources = lock_resources(data["telescopio_id"], inicio, fim)
+    except TooManySlots as e:
+        abort(400, str(e))
+    resource = resources if len(resources) > 1 else resources[0]
+    with phase("lock_acquire"):
+        ok, info = acquire_lock(resource, wait_ms=wait_ms)
     if not ok:
         return jsonify({"error":"Conflict","details":info}), 409
 
     owner = info.get("owner")
+    granted_at = time.perf_counter()
     try:
-        conflict = Agendamento.query.filter(
-            Agendamento.telescopio_id==data["telescopio_id"],
-            Agendamento.status=="CONFIRMED",
-            and_(Agendamento.horario_inicio_utc < fim, Agendamento.horario_fim_utc > inicio)
-        ).first()
+        with phase("conflict_query"):
+            conflict = find_conflict(data["telescopio_id"], inicio, fim)
         if conflict:
             return jsonify({"error":"Conflict","message":"Conflito no BD"}), 409
+        try:
+            if GROUP_COMMIT:
+                # o lock segue preso até o lote com esta reserva estar gravado. A conexão da sessão
+                # volta ao pool antes de esperar: com muitas requisições paradas no Future, a
+                # thread escritora ficaria sem conexão (pool esgotado) e ninguém andaria
+                shards.for_telescope(data["telescopio_id"]).close()
+                with phase("commit"):
+                    writer = group_writer_for(shards.shard_of(data["telescopio_id"]))
+                    ag_id = writer.submit((data, inicio, fim, (owner, info.get("fences"), resource))).result()
+            else:
+                ag_id = public_id(insert_agendamento(data, inicio, fim, lock=(owner, info.get("fences"), resource)))
+        except StaleLock as e:
+            return jsonify({"error":"Conflict","message":f"lock perdido antes do commit: {e}"}), 409
+        except BookingConflict:
+            return jsonify({"error":"Conflict","message":"Conflito no BD"}), 409
+        return jsonify({"id": ag_id, "status":"CONFIRMED"}), 201
+    finally:
+        with phase("lock_release"):
+            release_lock(resource, owner)
+        LOCK_HELD.observe(time.perf_counter() - granted_at)
 
-        a = Agendamento(
-            cientista_id=data["cientista_id"],
-            telescopio_id=data["telescopio_id"],
-            horario_inicio_utc=inicio,
-            horario_fim_utc=fim,
-            status="CONFIRMED"
+def insert_agendamento(data, inicio, fim, lock=None):
+    # linha e versão do cache do telescópio na mesma transação; lock=(owner, fences, chaves) confere
+    # lease e token de fencing antes do commit (StaleLock desfaz a transação). As datas são gravadas
+    # em UTC sem tzinfo, a mesma escala do ConflictCache e das chaves de lock: o SQLite descartaria o offset
+    session = shards.for_telescope(data["telescopio_id"])
+    inicio, fim = naive_utc(inicio), naive_utc(fim)
+    a = Agendamento(
+        cientista_id=data["cientista_id"],
+        telescopio_id=data["telescopio_id"],
+        horario_inicio_utc=inicio,
+        horario_fim_utc=fim,
+        status="CONFIRMED"
+    )
+    with phase("commit"):
+        ensure_refs(session, [(a.cientista_id, a.telescopio_id)])
+        session.add(a)
+        session.flush()
+        version = bump_cache_version(a.telescopio_id, session)
+        record_change("AGENDAMENTO_CRIADO", a, version, session)
+        if lock:
+            try:
+                check_lock(*lock, session=session)
+            except StaleLock:
+                session.rollback()
+                raise
+        session.commit()
+    conflict_cache.added(a.telescopio_id, version, a.id, inicio, fim)
+    SCHED_CREATED.inc()
+    with phase("audit_emit"):
+        emit_audit("AGENDAMENTO_CRIADO", {"id": public_id(a), "cientista": a.cientista_id, "telescopio": a.telescopio_id})
+    return a
+
+class BookingConflict(Exception):
+    pass
+
+def _commit_group(items, shard=0):
+    # roda na thread do GroupCommitWriter do shard: um commit (um fsync) para o lote inteiro.
+    # Cada item já passou por find_conflict sob o seu lock, mas a verificação é refeita aqui
+    # dentro da transação (autoflush: os itens anteriores do lote também contam), junto com
+    # lease e fencing; o item que falha vira exceção só no seu Future, sem derrubar os outros.
+    results, created = [], []
+    with app.app_context():
+        session = shards.session(shard)
+        ensure_refs(session, [(data["cientista_id"], data["telescopio_id"]) for data, _, _, _ in items])
+        for data, inicio, fim, lock in items:
+            inicio, fim = naive_utc(inicio), naive_utc(fim)  # como insert_agendamento: UTC sem tzinfo
+            try:
+                if find_conflict(data["telescopio_id"], inicio, fim, session):
+                    raise BookingConflict()
+                check_lock(*lock, session=session)
+            except (BookingConflict, StaleLock) as e:
+                results.append(e)
+                continue
+            a = Agendamento(cientista_id=data["cientista_id"], telescopio_id=data["telescopio_id"],
+                            horario_inicio_utc=inicio, horario_fim_utc=fim, status="CONFIRMED")
+            session.add(a)
+            session.flush()
+            version = bump_cache_version(a.telescopio_id, session)
+            record_change("AGENDAMENTO_CRIADO", a, version, session)
+            created.append((a, version, inicio, fim))
+            results.append(public_id(a))
+        session.commit()
+        for a, version, inicio, fim in created:
+            conflict_cache.added(a.telescopio_id, version, a.id, inicio, fim)
+            emit_audit("AGENDAMENTO_CRIADO", {"id": public_id(a), "cientista": a.cientista_id, "telescopio": a.telescopio_id})
+        SCHED_CREATED.inc(len(created))
+    return results
+
+# um escritor (uma thread, um commit por lote) por shard: shards diferentes gravam em paralelo
+group_writers = {}
+
+def group_writer_for(shard):
+    writer = group_writers.get(shard)
+    if writer is None:
+        writer = group_writers.setdefault(shard, GroupCommitWriter(lambda items: _commit_group(items, shard)))
+    return writer
+
+def _create_native(data, inicio, fim):
+    # STORAGE_MODE=native: sem lock no coordenador; a constraint/trigger do BD decide
+    try:
+        a = insert_agendamento(data, inicio, fim)
+    except IntegrityError as e:
+        shards.for_telescope(data["telescopio_id"]).rollback()
+        if not storage.is_overlap_error(e):
+            raise
+        return jsonify({"error":"Conflict","message":"Conflito no BD"}), 409
+    return jsonify({"id": public_id(a), "status":"CONFIRMED"}), 201
+
+def find_conflicts_batch(items, session=None):
+    # uma única consulta para o lote: por telescópio, as reservas CONFIRMED que tocam a janela
+    # [menor início, maior fim) dos itens; o casamento item a item é feito em memória
+    windows = {}
+    for it in items:
+        inicio, fim = it["naive"]
+        lo, hi = windows.get(it["telescopio_id"], (inicio, fim))
+        windows[it["telescopio_id"]] = (min(lo, inicio), max(hi, fim))
+    rows = (session or db.session).execute(
+        select(Agendamento.telescopio_id, Agendamento.horario_inicio_utc, Agendamento.horario_fim_utc).where(
+            Agendamento.status=="CONFIRMED",
+            or_(*[and_(Agendamento.telescopio_id==tel,
+                       Agendamento.horario_inicio_utc < hi, Agendamento.horario_fim_utc > lo)
+                  for tel, (lo, hi) in windows.items()])
         )
-        db.session.add(a)
-        db.session.commit()
-        SCHED_CREATED.inc()
-        emit_audit("AGENDAMENTO_CRIADO", {"id": a.id, "cientista": a.cientista_id, "telescopio": a.telescopio_id})
-        return jsonify({"id": a.id, "status":"CONFIRMED"}), 201
+    ).all()
+    existing = {}
+    for tel, a_inicio, a_fim in rows:
+        existing.setdefault(tel, []).append((a_inicio, a_fim))
+    return existing
+
+@app.route("/agendamentos/batch", methods=["POST"])
+def create_agendamentos_batch():
+    data = request.get_json(force=True)
+    items = data.get("items") if isinstance(data, dict) else None
+    mode = data.get("mode", "all_or_nothing") if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        abort(400, "items required")
+    if len(items) > BATCH_MAX_ITEMS:
+        abort(400, f"too many items (max {BATCH_MAX_ITEMS})")
+    if mode not in ("all_or_nothing", "best_effort"):
+        abort(400, "mode must be all_or_nothing or best_effort")
+    atomic = mode == "all_or_nothing"
+
+    results = [None] * len(items)
+    pending = []
+    for i, raw in enumerate(items):
+        try:
+            inicio, fim = parse_agendamento(raw)
+            keys = lock_resources(raw["telescopio_id"], inicio, fim)
+        except ValueError as e:  # inclui TooManySlots
+            results[i] = {"index": i, "status": 400, "error": "Bad Request", "message": str(e)}
+            continue
+        pending.append({"index": i, "cientista_id": raw["cientista_id"], "telescopio_id": raw["telescopio_id"],
+                        "inicio": inicio, "fim": fim, "naive": (naive_utc(inicio), naive_utc(fim)), "keys": keys})
+    if not pending or (atomic and len(pending) < len(items)):
+        return _batch_response(results, atomic=atomic, status=400)
+    if atomic and len({shards.shard_of(it["telescopio_id"]) for it in pending}) > 1:
+        # cada shard commita a sua parte numa transação própria: sem commit distribuído, o
+        # tudo-ou-nada só vale dentro de um shard
+        abort(400, "all_or_nothing batch must target telescopes of a single database shard")
+
+    if storage.native_exclusion:
+        return _batch_commit(pending, results, atomic)
+
+    def lock(batch):
+        return acquire_lock(sorted({k for it in batch for k in it["keys"]}))
+
+    ok, info = lock(pending)
+    if pending and not ok and not atomic and info.get("resources"):
+        # best-effort: descarta os itens que tocam chaves ocupadas e tenta o restante uma vez
+        held = set(info["resources"])
+        for it in pending:
+            if held & set(it["keys"]):
+                results[it["index"]] = {"index": it["index"], "status": 409, "error": "Conflict", "details": {"error": "locked"}}
+        pending = [it for it in pending if results[it["index"]] is None]
+        ok, info = lock(pending) if pending else (False, {})
+    if not ok:
+        for it in pending:
+            results[it["index"]] = {"index": it["index"], "status": 409, "error": "Conflict", "details": info}
+        return _batch_response(results, atomic=atomic)
+
+    owner = info.get("owner")
+    locked = sorted({k for it in pending for k in it["keys"]})
+    granted_at = time.perf_counter()
+    try:
+        return _batch_commit(pending, results, atomic, lock=(owner, info.get("fences"), locked))
     finally:
-        release_lock(resource, owner)
+        release_lock(locked, owner)
+        LOCK_HELD.observe(time.perf_counter() - granted_at)
+
+def _batch_commit(pending, results, atomic, lock=None):
+    # uma transação por shard; lock=(owner, fences, chaves) e cada shard confere só as suas chaves
+    by_shard = {}
+    for it in pending:
+        by_shard.setdefault(shards.shard_of(it["telescopio_id"]), []).append(it)
+    for shard, items in sorted(by_shard.items()):
+        shard_lock = lock and (lock[0], lock[1], sorted({k for it in items for k in it["keys"]}))
+        _batch_commit_shard(items, results, atomic, shard_lock, shards.session(shard))
+    return _batch_response(results, atomic=atomic)
+
+def _batch_commit_shard(pending, results, atomic, lock, session):
+    existing = find_conflicts_batch(pending, session)
+    accepted = []
+    for it in pending:
+        inicio, fim = it["naive"]
+        taken = existing.setdefault(it["telescopio_id"], [])
+        if any(a_inicio < fim and a_fim > inicio for a_inicio, a_fim in taken):
+            results[it["index"]] = {"index": it["index"], "status": 409, "error": "Conflict", "message": "Conflito no BD"}
+            continue
+        taken.append((inicio, fim))  # sobreposição entre itens do próprio lote
+        accepted.append(it)
+    if not accepted or (atomic and len(accepted) < len(pending)):
+        return
+
+    rows = []
+    try:
+        ensure_refs(session, [(it["cientista_id"], it["telescopio_id"]) for it in accepted])
+        for it in accepted:
+            a = Agendamento(cientista_id=it["cientista_id"], telescopio_id=it["telescopio_id"],
+                            horario_inicio_utc=it["inicio"], horario_fim_utc=it["fim"], status="CONFIRMED")
+            session.add(a)
+            rows.append((it, a))
+        session.flush()
+        versions = {tel: bump_cache_version(tel, session) for tel in {it["telescopio_id"] for it in accepted}}
+        for _, a in rows:
+            record_change("AGENDAMENTO_CRIADO", a, versions[a.telescopio_id], session)
+        if lock:
+            check_lock(*lock, session=session)
+        session.commit()
+    except StaleLock as e:
+        session.rollback()
+        for it in accepted:
+            results[it["index"]] = {"index": it["index"], "status": 409, "error": "Conflict",
+                                    "message": f"lock perdido antes do commit: {e}"}
+        return
+    except IntegrityError as e:
+        # só no modo native: outra escrita entrou entre a verificação e o INSERT
+        session.rollback()
+        if not storage.is_overlap_error(e):
+            raise
+        if atomic:
+            for it in accepted:
+                results[it["index"]] = {"index": it["index"], "status": 409, "error": "Conflict", "message": "Conflito no BD"}
+            return
+        for it in accepted:
+            try:
+                a = insert_agendamento(it, it["inicio"], it["fim"])
+                results[it["index"]] = {"index": it["index"], "status": 201, "id": public_id(a)}
+            except IntegrityError as e:
+                session.rollback()
+                if not storage.is_overlap_error(e):
+                    raise
+                results[it["index"]] = {"index": it["index"], "status": 409, "error": "Conflict", "message": "Conflito no BD"}
+        return
+    for tel in {it["telescopio_id"] for it in accepted}:
+        conflict_cache.invalidate(tel)
+    SCHED_CREATED.inc(len(rows))
+    for it, a in rows:
+        emit_audit("AGENDAMENTO_CRIADO", {"id": public_id(a), "cientista": a.cientista_id, "telescopio": a.telescopio_id})
+        results[it["index"]] = {"index": it["index"], "status": 201, "id": public_id(a)}
+
+def _batch_response(results, atomic, status=None):
+    created = sum(1 for r in results if r and r["status"] == 201)
+    if atomic and created < len(results):
+        # nada foi gravado: os itens sem erro próprio são marcados como abortados
+        for i, r in enumerate(results):
+            if r is None or r["status"] == 201:
+                results[i] = {"index": i, "status": 409, "error": "Conflict", "message": "batch aborted"}
+    if status is None:
+        status = 201 if created == len(results) else (207 if created else 409)
+    return jsonify({"created": created, "results": results}), status
+
+@app.route("/agendamentos/<int:ag_id>/cancel", methods=["POST"])
+@idempotent
+def cancel_agendamento(ag_id):
+    # o id público diz o shard
+    shard, local_id = shards.locate(ag_id)
+    session = shards.session(shard)
+    a = session.get(Agendamento, local_id)
+    if a is None or shards.shard_of(a.telescopio_id) != shard:
+        abort(404)
+    if a.status != "CANCELLED":
+        a.status = "CANCELLED"
+        version = bump_cache_version(a.telescopio_id, session)
+        record_change("AGENDAMENTO_CANCELADO", a, version, session)
+        session.commit()
+        conflict_cache.removed(a.telescopio_id, version, a.id, a.horario_inicio_utc)
+        emit_audit("AGENDAMENTO_CANCELADO", {"id": ag_id, "telescopio": a.telescopio_id})
+    return jsonify({"id": ag_id, "status":"CANCELLED"}), 200
+
+@app.route("/telescopios/<int:tel_id>/disponibilidade", methods=["GET"])
+def disponibilidade(tel_id):
+    # janelas livres em [from, to) com pelo menos min_duration minutos; padrão: próximos 7 dias
+    try:
+        lo = naive_utc(datetime.fromisoformat(request.args["from"].replace("Z","+00:00"))) if request.args.get("from") \
+            else naive_utc(datetime.now(timezone.utc)).replace(second=0, microsecond=0)
+        hi = naive_utc(datetime.fromisoformat(request.args["to"].replace("Z","+00:00"))) if request.args.get("to") \
+            else lo + timedelta(days=7)
+    except ValueError:
+        abort(400, "invalid from/to")
+    min_duration = request.args.get("min_duration", 0, type=int)
+    if hi <= lo or min_duration < 0:
+        abort(400, "from must be before to and min_duration >= 0")
+    if hi - lo > timedelta(days=AVAILABILITY_MAX_DAYS):
+        abort(400, f"range too large (max {AVAILABILITY_MAX_DAYS} days)")
+
+    # ETag da versão do telescópio + parâmetros: If-None-Match igual responde 304 sem calcular nada
+    # (a versão do read model é a mesma do BD principal para o mesmo estado: ETag e cache valem para os dois)
+    with read_session() as rs:
+        if (rs or db.session).execute(select(Telescopio.id).where(Telescopio.id == tel_id)).first() is None:
+            abort(404)
+        version = cache_version(tel_id, rs)
+        etag = hashlib.sha1(f"{tel_id}|{version}|{lo}|{hi}|{min_duration}".encode()).hexdigest()[:20]
+        if request.if_none_match.contains(etag):
+            per_day = None
+        else:
+            first_day = lo.replace(hour=0, minute=0, second=0, microsecond=0)
+            n_days = -(-(hi - first_day) // DAY)
+            per_day = availability_cache.days(tel_id, version, first_day, n_days,
+                                              loader=lambda tel, a, b: _load_busy(tel, a, b, rs))
+    if per_day is None:
+        resp = Response(status=304)
+    else:
+        livres = join_days(per_day, lo, hi, timedelta(minutes=min_duration))
+        resp = jsonify({"telescopio_id": tel_id, "from": _iso(lo), "to": _iso(hi), "min_duration": min_duration,
+                        "livres": [[_iso(i), _iso(f)] for i, f in livres]})
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp
 
 # admin-only listing example
 @app.route("/admin/locks", methods=["GET"])
 @require_token
 def admin_locks():
-    r = requests.get(f"{COORDINATOR_URL.rstrip('/')}/locks", timeout=3)
-    return r.json(), r.status_code
+    # repassa a paginação do provedor: ?cursor= é o next_cursor da página anterior
+    prefix = request.args.get("prefix")
+    if prefix is not None and not prefix.startswith(LOCK_KEY_PREFIX):
+        abort(400, f"prefix must start with {LOCK_KEY_PREFIX}")
+    limit = min(max(request.args.get("limit", LIST_DEFAULT_LIMIT, type=int), 1), LIST_MAX_LIMIT)
+    try:
+        body, status = get_lock_provider().list_locks(request.args.get("cursor"), limit, prefix)
+    except ValueError:
+        abort(400, "invalid cursor")
+    return jsonify(body), status
 
 # ---------- INIT ----------
+def ensure_indexes(engine=None):
+    # create_all() não altera tabelas existentes: cria os índices declarados que faltam em bancos antigos
+    for table in db.metadata.sorted_tables:
+        for ix in table.indexes:
+            ix.create(engine or db.engine, checkfirst=True)
+
 def seed():
     if Telescopio.query.count()==0:
         db.session.add(Telescopio(nome="Hubble-Acad"))
@@ -175,8 +966,57 @@ def seed():
         db.session.add(Cientista(nome="Teste", email="teste@example.com"))
     db.session.commit()
 
-if __name__ == "__main__":
+def init_shards():
+    # shards extras: mesmo schema; cientistas e telescópios são mantidos no shard 0 e copiados para
+    # os demais, onde só existem para as FKs de agendamentos (os criados depois: ensure_refs)
+    for shard in range(1, shards.count):
+        engine, session = shards.engines[shard], shards.session(shard)
+        db.metadata.create_all(engine)
+        ensure_indexes(engine)
+        storage.install(engine)
+        for model in (Cientista, Telescopio):
+            for row in db.session.query(model):
+                session.merge(row)
+        session.commit()
+
+_initialized = False
+
+def init_db():
+    global _initialized
+    if shards.sharded and (READ_MODEL or OUTBOX_RELAY):
+        # read model e relay seguem a outbox de um BD só
+        raise RuntimeError("READ_MODEL/OUTBOX_RELAY não suportam DB_SHARD_URLS")
     with app.app_context():
+        db_config.report(db.engine)
         db.create_all()
+        ensure_indexes()
+        storage.install(db.engine)
         seed()
+        init_shards()
+    _initialized = True
+
+def reset_after_fork():
+    # estado de módulo herdado do processo pai que não pode ser compartilhado entre workers:
+    # conexões abertas do pool do SQLAlchemy e do cliente do coordenador
+    with app.app_context():
+        db.engine.dispose(close=False)
+    shards.dispose()
+    reset_client()
+    conflict_cache.clear()
+    availability_cache.clear()
+
+def create_app():
+    # ponto de entrada de produção (wsgi.py); o schema é criado uma vez por processo,
+    # ou antes do fork pelo hook on_starting do gunicorn
+    if not _initialized:
+        init_db()
+    if READ_MODEL:
+        read_model.ensure_started()
+    if OUTBOX_RELAY:
+        outbox_relay.ensure_started()
+    return app
+
+if __name__ == "__main__":
+    # servidor de desenvolvimento; em produção use gunicorn -c gunicorn.conf.py wsgi:app
+    init_db()
     app.run(host="0.0.0.0", port=int(os.environ.get("PORT",5000)))
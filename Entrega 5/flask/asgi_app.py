@@ -0,0 +1,316 @@
+# flask/asgi_app.py
+# Variante assíncrona (Starlette/ASGI) da API de agendamento:
+#   uvicorn asgi_app:app --host 0.0.0.0 --port 5000 --workers 4
+# Mesmo schema, modelos e regras do app.py: a transação de escrita roda com as mesmas funções
+# (find_conflict, bump_cache_version, check_lock) via AsyncSession.run_sync. A diferença é que a
+# espera pelo lock (até LOCK_WAIT_MAX_MS no coordenador) e pelo BD não prende uma thread: cada
+# requisição em espera é uma corrotina, e a memória fica limitada pelos pools (COORDINATOR_POOL_SIZE
+# conexões com o coordenador, ASYNC_DB_POOL_SIZE + ASYNC_DB_MAX_OVERFLOW com o BD).
+# Rotas: /health, /time, /metrics, GET/POST /agendamentos, POST /agendamentos/<id>/cancel, /admin/locks.
+# GET /agendamentos como no Flask: read model (READ_MODEL=1), exportação NDJSON em lotes e ETag.
+# Idempotency-Key, ConflictCache, GROUP_COMMIT, /batch e /disponibilidade continuam só no Flask.
+import asyncio, json, logging, os, time
+from http import HTTPStatus
+from contextlib import asynccontextmanager
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from werkzeug.datastructures import MIMEAccept, MultiDict
+from werkzeug.exceptions import HTTPException
+from werkzeug.http import generate_etag, parse_accept_header, parse_etags, quote_etag
+from prometheus_client import CollectorRegistry, generate_latest, multiprocess, CONTENT_TYPE_LATEST
+import app as core
+import db_config
+from async_locks import get_async_provider, close_async_provider
+from lock_keys import lock_resources, TooManySlots
+
+# ---------- CONFIG ----------
+ASYNC_DB_POOL_SIZE = int(os.environ.get("ASYNC_DB_POOL_SIZE", "10"))
+ASYNC_DB_MAX_OVERFLOW = int(os.environ.get("ASYNC_DB_MAX_OVERFLOW", "10"))
+ASYNC_DB_POOL_TIMEOUT = float(os.environ.get("ASYNC_DB_POOL_TIMEOUT", "30"))
+
+logger = logging.getLogger("servico-agendamento")
+
+# ---------- DB ----------
+ASYNC_DRIVERS = {"sqlite": "aiosqlite", "postgresql": "asyncpg"}
+
+def async_url(url):
+    # mesma DATABASE_URL do Flask com o driver assíncrono do banco
+    u = make_url(url)
+    backend = u.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"sem driver assíncrono para {backend}")
+    return u.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}")
+
+# pool explícito: para arquivo SQLite o padrão do aiosqlite é NullPool (uma conexão e os PRAGMAs
+# a cada sessão)
+engine = create_async_engine(async_url(core.DATABASE_URL), poolclass=AsyncAdaptedQueuePool,
+                             pool_size=ASYNC_DB_POOL_SIZE, max_overflow=ASYNC_DB_MAX_OVERFLOW,
+                             pool_timeout=ASYNC_DB_POOL_TIMEOUT)
+db_config.configure_engine(engine.sync_engine)
+Session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+def _write_booking(session, data, inicio, fim, lock=None):
+    # roda dentro de AsyncSession.run_sync. Com lock=(owner, fences, chaves) refaz a verificação
+    # de conflito no BD e confere lease/fencing antes do commit, como insert_agendamento; sem lock
+    # (STORAGE_MODE=native) quem decide é a constraint do BD. Devolve o id ou None (conflito).
+    inicio, fim = core.naive_utc(inicio), core.naive_utc(fim)  # UTC sem tzinfo, como no app.py
+    if lock is not None:
+        with core.phase("conflict_query"):
+            if core.find_conflict(data["telescopio_id"], inicio, fim, session):
+                return None
+    a = core.Agendamento(cientista_id=data["cientista_id"], telescopio_id=data["telescopio_id"],
+                         horario_inicio_utc=inicio, horario_fim_utc=fim, status="CONFIRMED")
+    with core.phase("commit"):
+        session.add(a)
+        session.flush()
+        version = core.bump_cache_version(a.telescopio_id, session)
+        core.record_change("AGENDAMENTO_CRIADO", a, version, session)
+        if lock is not None:
+            try:
+                core.check_lock(*lock, session=session)
+            except core.StaleLock:
+                session.rollback()
+                raise
+        session.commit()
+    core.SCHED_CREATED.inc()
+    with core.phase("audit_emit"):
+        core.emit_audit("AGENDAMENTO_CRIADO", {"id": core.public_id(a), "cientista": a.cientista_id, "telescopio": a.telescopio_id})
+    return core.public_id(a)
+
+# ---------- LOCKS ----------
+async def acquire_lock(resource, ttl_ms=core.LOCK_TTL_MS, wait_ms=0):
+    provider = get_async_provider()
+    logger.info(f"[LOCK-TRY] resource={resource} provider={provider.name} wait_ms={wait_ms} async=1")
+    t0 = time.perf_counter()
+    ok, info = await provider.acquire(resource, ttl_ms, wait_ms)
+    if ok:
+        outcome = "granted"
+    elif str(info.get("error", "")).endswith("-unreachable"):
+        outcome = "error"
+    else:
+        outcome = "refused"
+    core.LOCK_WAIT.labels(outcome=outcome).observe(time.perf_counter() - t0)
+    if ok and core.LOCK_RENEW:
+        # a renovação é a mesma thread do Flask (lease.py), com o provedor síncrono
+        core.lease_renewer.track(resource, info.get("owner"), ttl_ms)
+    return ok, info
+
+async def release_lock(resource, owner):
+    core.lease_renewer.untrack(owner)
+    await get_async_provider().release(resource, owner)
+
+# ---------- HELPERS ----------
+def error(status, message):
+    return JSONResponse({"error": HTTPStatus(status).phrase, "message": message}, status)
+
+def query_args(request):
+    # MultiDict do werkzeug: permite reaproveitar os parsers do app.py (args.get(..., type=int))
+    return MultiDict(request.query_params.multi_items())
+
+def require_token(request):
+    token = request.headers.get("Authorization")
+    if not token or not token.startswith("Bearer "):
+        return error(401, "Missing token")
+    if token.split(" ", 1)[1] != core.ADMIN_TOKEN:
+        return error(403, "Invalid token")
+    return None
+
+def _read_model_page(filters, after, limit, tel):
+    # read model: SQLite local e síncrono, lido numa thread; None se atrasado (vai ao BD principal)
+    with core.read_session() as rs:
+        return None if rs is None else core._page(filters, after, limit, rs, tel)
+
+async def page(filters, after, limit, tel):
+    rows = await asyncio.to_thread(_read_model_page, filters, after, limit, tel) if core.READ_MODEL else None
+    if rows is None:
+        async with Session() as s:
+            rows = await s.run_sync(lambda ss: core._page(filters, after, limit, ss, tel))
+    return rows
+
+# ---------- ROUTES ----------
+async def health(request):
+    return JSONResponse({"status": "ok", "time": core.now_iso()})
+
+async def get_time(request):
+    return JSONResponse({"server_time_utc": core.now_iso()})
+
+async def metrics(request):
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return Response(generate_latest(registry), headers={"Content-Type": CONTENT_TYPE_LATEST})
+    return Response(generate_latest(), headers={"Content-Type": CONTENT_TYPE_LATEST})
+
+async def list_agendamentos(request):
+    args = query_args(request)
+    try:
+        filters = core._list_filters(args)
+    except HTTPException as e:  # abort(400) de _list_filters
+        return error(e.code, e.description)
+    after = None
+    if args.get("cursor"):
+        try:
+            after = core.decode_cursor(args["cursor"])
+        except Exception:
+            return error(400, "invalid cursor")
+    tel = args.get("telescopio", type=int)
+
+    accept = parse_accept_header(request.headers.get("accept"), MIMEAccept)
+    if args.get("format") == "ndjson" or accept.best == "application/x-ndjson":
+        # exportação em lotes por chave, sem montar a lista em memória
+        async def export(after=after):
+            while True:
+                rows = await page(filters, after, core.EXPORT_BATCH_SIZE, tel)
+                for r in rows:
+                    yield json.dumps(core._serialize_row(r)) + "\n"
+                if len(rows) < core.EXPORT_BATCH_SIZE:
+                    return
+                after = (rows[-1].horario_inicio_utc, rows[-1].id)
+        return StreamingResponse(export(), media_type="application/x-ndjson")
+
+    limit = min(max(args.get("limit", core.LIST_DEFAULT_LIMIT, type=int), 1), core.LIST_MAX_LIMIT)
+    rows = await page(filters, after, limit + 1, tel)
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = core.encode_cursor(rows[-1].horario_inicio_utc, rows[-1].id)
+    resp = JSONResponse({"items": [core._serialize_row(r) for r in rows], "next_cursor": next_cursor})
+    # ETag do conteúdo da página: If-None-Match igual -> 304 sem corpo
+    etag = generate_etag(resp.body)
+    headers = {"ETag": quote_etag(etag), "Cache-Control": "no-cache"}
+    if parse_etags(request.headers.get("if-none-match")).contains(etag):
+        return Response(status_code=304, headers=headers)
+    resp.headers.update(headers)
+    return resp
+
+async def create_agendamento(request):
+    with core.phase("json_parse"):
+        try:
+            data = json.loads(await request.body())
+            inicio, fim = core.parse_agendamento(data)
+        except ValueError as e:  # inclui JSON inválido
+            return error(400, str(e))
+
+    if core.storage.native_exclusion:
+        async with Session() as s:
+            try:
+                ag_id = await s.run_sync(_write_booking, data, inicio, fim)
+            except IntegrityError as e:
+                await s.rollback()
+                if not core.storage.is_overlap_error(e):
+                    raise
+                return JSONResponse({"error":"Conflict","message":"Conflito no BD"}, 409)
+        return JSONResponse({"id": ag_id, "status":"CONFIRMED"}, 201)
+
+    wait_ms = min(max(query_args(request).get("wait_ms", 0, type=int), 0), core.LOCK_WAIT_MAX_MS)
+    try:
+        resources = lock_resources(data["telescopio_id"], inicio, fim)
+    except TooManySlots as e:
+        return error(400, str(e))
+    resource = resources if len(resources) > 1 else resources[0]
+    with core.phase("lock_acquire"):
+        ok, info = await acquire_lock(resource, wait_ms=wait_ms)
+    if not ok:
+        return JSONResponse({"error":"Conflict","details":info}, 409)
+
+    owner = info.get("owner")
+    granted_at = time.perf_counter()
+    try:
+        # a sessão só pega conexão do pool aqui, depois do lock
+        async with Session() as s:
+            try:
+                ag_id = await s.run_sync(_write_booking, data, inicio, fim, (owner, info.get("fences"), resource))
+            except core.StaleLock as e:
+                return JSONResponse({"error":"Conflict","message":f"lock perdido antes do commit: {e}"}, 409)
+        if ag_id is None:
+            return JSONResponse({"error":"Conflict","message":"Conflito no BD"}, 409)
+        return JSONResponse({"id": ag_id, "status":"CONFIRMED"}, 201)
+    finally:
+        with core.phase("lock_release"):
+            await release_lock(resource, owner)
+        core.LOCK_HELD.observe(time.perf_counter() - granted_at)
+
+async def cancel_agendamento(request):
+    ag_id = request.path_params["ag_id"]
+    async with Session() as s:
+        a = await s.get(core.Agendamento, ag_id)
+        if a is None:
+            return error(404, "Not Found")
+        if a.status != "CANCELLED":
+            a.status = "CANCELLED"
+            await s.run_sync(lambda ss: core.record_change("AGENDAMENTO_CANCELADO", a,
+                                                           core.bump_cache_version(a.telescopio_id, ss), ss))
+            await s.commit()
+            core.emit_audit("AGENDAMENTO_CANCELADO", {"id": ag_id, "telescopio": a.telescopio_id})
+    return JSONResponse({"id": ag_id, "status":"CANCELLED"})
+
+async def admin_locks(request):
+    denied = require_token(request)
+    if denied is not None:
+        return denied
+    args = query_args(request)
+    prefix = args.get("prefix")
+    if prefix is not None and not prefix.startswith(core.LOCK_KEY_PREFIX):
+        return error(400, f"prefix must start with {core.LOCK_KEY_PREFIX}")
+    limit = min(max(args.get("limit", core.LIST_DEFAULT_LIMIT, type=int), 1), core.LIST_MAX_LIMIT)
+    try:
+        body, status = await get_async_provider().list_locks(args.get("cursor"), limit, prefix)
+    except ValueError:
+        return error(400, "invalid cursor")
+    return JSONResponse(body, status)
+
+routes = [
+    Route("/health", health, methods=["GET"]),
+    Route("/time", get_time, methods=["GET"]),
+    Route("/metrics", metrics, methods=["GET"]),
+    Route("/agendamentos", list_agendamentos, methods=["GET"]),
+    Route("/agendamentos", create_agendamento, methods=["POST"]),
+    Route("/agendamentos/{ag_id:int}/cancel", cancel_agendamento, methods=["POST"]),
+    Route("/admin/locks", admin_locks, methods=["GET"]),
+]
+
+# ---------- METRICS MIDDLEWARE ----------
+class RequestMetrics:
+    # app_requests_total / app_request_duration_seconds com o mesmo rótulo de endpoint do Flask
+    # (o template da rota; "unmatched" quando nenhuma rota casou)
+    def __init__(self, app):
+        self.app = app
+        self.templates = {r.endpoint: r.path.replace("{ag_id:int}", "<int:ag_id>") for r in routes}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        t0 = time.perf_counter()
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            endpoint = self.templates.get(scope.get("endpoint"), "unmatched")
+            core.REQ_COUNTER.labels(method=scope["method"], endpoint=endpoint, status=str(status[0])).inc()
+            core.REQ_LATENCY.labels(method=scope["method"], endpoint=endpoint).observe(time.perf_counter() - t0)
+
+# ---------- APP ----------
+@asynccontextmanager
+async def lifespan(_app):
+    # schema/seed como no create_app() do Flask; no fim fecha os pools ligados a este loop.
+    # Um engine só (DATABASE_URL): os agendamentos particionados (DB_SHARD_URLS) ficam no serviço Flask
+    if core.shards.sharded:
+        raise RuntimeError("asgi_app não suporta DB_SHARD_URLS")
+    if not core._initialized:
+        core.init_db()
+    yield
+    await close_async_provider()
+    await engine.dispose()
+
+app = RequestMetrics(Starlette(routes=routes, lifespan=lifespan))
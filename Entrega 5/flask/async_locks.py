@@ -0,0 +1,259 @@
+# flask/async_locks.py
+# Versões assíncronas dos provedores de lock (lock_providers.py) para o serviço ASGI (asgi_app.py).
+# Mesma interface, com corrotinas: acquire/release/extend/list_locks devolvem o mesmo que a versão
+# síncrona, então o caminho de escrita trata (ok, info) exatamente como no Flask.
+#   http  -> httpx.AsyncClient com pool keep-alive limitado (COORDINATOR_POOL_SIZE) e o mesmo retry
+#            com backoff + jitter do CoordinatorClient; esperar o coordenador não prende thread
+#   redis -> redis.asyncio com os scripts Lua de lock_providers
+#   local -> o provedor síncrono numa thread (asyncio.to_thread): nó único e testes
+# O renovador de lease (lease.py) continua numa thread com o provedor síncrono.
+import asyncio, logging, random, re, time, uuid
+import httpx
+import coordinator_client as cc
+import lock_providers as lp
+from lock_providers import _keys, _lock_args, _parse_grant, _queued_lock_args
+
+logger = logging.getLogger("servico-agendamento")
+
+def _body(resource):
+    # lista de chaves -> um único acquire/release multi-chave no coordenador
+    if isinstance(resource, (list, tuple)):
+        return {"resources": list(resource)}
+    return {"resource": resource}
+
+class AsyncCoordinatorClient:
+    # espelha CoordinatorClient.request: retry só para falha de conexão e 502/503/504 (POST /lock só
+    # se não conectou, ou com 502/503); read timeout não é repetido (o coordenador pode ter concedido o lock)
+    def __init__(self, base_url=cc.COORDINATOR_URL, pool_size=cc.POOL_SIZE, connect_timeout=cc.CONNECT_TIMEOUT,
+                 read_timeout=cc.READ_TIMEOUT, max_retries=cc.MAX_RETRIES,
+                 backoff_base_ms=cc.BACKOFF_BASE_MS, backoff_max_ms=cc.BACKOFF_MAX_MS):
+        self.base_url = base_url.rstrip("/")
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff_base_ms = backoff_base_ms
+        self.backoff_max_ms = backoff_max_ms
+        # pool_size é o teto de conexões abertas: pedidos além disso esperam na fila do pool
+        self.client = httpx.AsyncClient(
+            base_url=self.base_url,
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout, pool=read_timeout))
+
+    async def _backoff(self, attempt):
+        cap = min(self.backoff_max_ms, self.backoff_base_ms * (2 ** attempt))
+        await asyncio.sleep(random.uniform(0, cap) / 1000.0)  # full jitter
+
+    async def request(self, method, path, timeout=None, **kw):
+        timeout = httpx.Timeout(timeout if timeout is not None else self.read_timeout,
+                                connect=self.connect_timeout, pool=self.read_timeout)
+        statuses = cc.retry_status(path)
+        attempt = 0
+        while True:
+            try:
+                r = await self.client.request(method, path, timeout=timeout, **kw)
+            except httpx.ReadTimeout:
+                cc.COORD_REQUESTS.labels(path=path, outcome="timeout").inc()
+                raise
+            except httpx.TransportError as e:
+                # ConnectError/ConnectTimeout/PoolTimeout: o pedido não saiu
+                sent = not isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout))
+                if attempt >= self.max_retries or (path in cc.NON_IDEMPOTENT_PATHS and sent):
+                    cc.COORD_REQUESTS.labels(path=path, outcome="error").inc()
+                    raise
+                cc.COORD_RETRIES.labels(path=path).inc()
+                await self._backoff(attempt)
+                attempt += 1
+                continue
+            if r.status_code in statuses and attempt < self.max_retries:
+                cc.COORD_RETRIES.labels(path=path).inc()
+                await self._backoff(attempt)
+                attempt += 1
+                continue
+            cc.COORD_REQUESTS.labels(path=path, outcome=str(r.status_code)).inc()
+            return r
+
+    async def post(self, path, payload, timeout=None):
+        return await self.request("POST", path, json=payload, timeout=timeout)
+
+    async def get(self, path, params=None, timeout=None):
+        return await self.request("GET", path, params=params, timeout=timeout)
+
+    async def aclose(self):
+        await self.client.aclose()
+
+class AsyncHttpCoordinatorProvider:
+    name = "http"
+
+    def __init__(self):
+        self.coord = AsyncCoordinatorClient()
+        logger.info(f"[COORD-POOL] url={self.coord.base_url} pool_size={cc.POOL_SIZE} retries={cc.MAX_RETRIES} async=1")
+
+    async def acquire(self, resource, ttl_ms, wait_ms=0):
+        body = {**_body(resource), "ttl_ms": ttl_ms}
+        timeout = None
+        if wait_ms:
+            body["wait_ms"] = wait_ms
+            timeout = self.coord.read_timeout + wait_ms / 1000.0
+        try:
+            r = await self.coord.post("/lock", body, timeout=timeout)
+            logger.info(f"[LOCK-RESP] status={r.status_code} body={r.text}")
+            return r.status_code == 200, r.json()
+        except Exception as e:
+            logger.error(f"[LOCK-ERROR] {e}")
+            return False, {"error": "coordinator-unreachable", "detail": str(e)}
+
+    async def release(self, resource, owner):
+        try:
+            r = await self.coord.post("/unlock", {**_body(resource), "owner": owner}, timeout=2)
+            return r.status_code == 200
+        except Exception as e:
+            logger.warning(f"[UNLOCK-ERR] {e}")
+            return False
+
+    async def extend(self, resource, owner, ttl_ms):
+        try:
+            r = await self.coord.post("/extend", {**_body(resource), "owner": owner, "ttl_ms": ttl_ms}, timeout=2)
+        except Exception as e:
+            logger.warning(f"[EXTEND-ERR] {e}")
+            return None
+        return r.status_code == 200
+
+    async def list_locks(self, cursor=None, limit=100, prefix=None):
+        params = {"limit": limit, "cursor": cursor, "prefix": prefix}
+        try:
+            r = await self.coord.get("/locks", params={k: v for k, v in params.items() if v is not None}, timeout=3)
+            return r.json(), r.status_code
+        except (httpx.HTTPError, ValueError) as e:
+            logger.warning(f"[LOCKS-ERR] {e}")
+            return {"error": "coordinator-unreachable", "detail": str(e)}, 503
+
+    async def aclose(self):
+        await self.coord.aclose()
+
+class AsyncRedisLockProvider:
+    name = "redis"
+
+    def __init__(self, url=lp.REDIS_URL, pool_size=lp.REDIS_POOL_SIZE):
+        import redis.asyncio as aioredis  # dependência opcional: só com LOCK_PROVIDER=redis
+        self.pool = aioredis.BlockingConnectionPool.from_url(
+            url, max_connections=pool_size, timeout=lp.REDIS_SOCKET_TIMEOUT, decode_responses=True,
+            socket_connect_timeout=lp.REDIS_CONNECT_TIMEOUT, socket_timeout=lp.REDIS_SOCKET_TIMEOUT)
+        self.redis = aioredis.Redis(connection_pool=self.pool)
+        self._lock_many = self.redis.register_script(lp.LOCK_MANY_SCRIPT)
+        self._extend = self.redis.register_script(lp.EXTEND_SCRIPT)
+        self._unlock = self.redis.register_script(lp.UNLOCK_SCRIPT)
+        self._unlock_many = self.redis.register_script(lp.UNLOCK_MANY_SCRIPT)
+        self._queued_lock = self.redis.register_script(lp.QUEUED_LOCK_SCRIPT)
+        self._cancel_wait = self.redis.register_script(lp.CANCEL_WAIT_SCRIPT)
+
+    async def acquire(self, resource, ttl_ms, wait_ms=0):
+        keys = _keys(resource)
+        owner = str(uuid.uuid4())
+        try:
+            if wait_ms:
+                fences, held = await self._wait(keys, owner, ttl_ms, wait_ms)
+            else:
+                fences, held = _parse_grant(await self._lock_many(keys=keys, args=_lock_args(owner, ttl_ms)))
+        except Exception as e:
+            logger.error(f"[LOCK-ERROR] {e}")
+            return False, {"error": "redis-unreachable", "detail": str(e)}
+        if held:
+            return False, {"error": "locked", "resources": held}
+        return True, {"owner": owner, "resources": keys, "expiresAt": int(time.time() * 1000) + ttl_ms, "fences": fences}
+
+    async def _wait(self, keys, owner, ttl_ms, wait_ms):
+        ticket = str(uuid.uuid4())
+        deadline = time.monotonic() + wait_ms / 1000.0
+        while True:
+            left_ms = max(int((deadline - time.monotonic()) * 1000), 0)
+            fences, held = _parse_grant(await self._queued_lock(keys=keys, args=_queued_lock_args(owner, ttl_ms, ticket, left_ms)))
+            if not held:
+                return fences, []
+            if left_ms <= 0:
+                await self._cancel_wait(keys=keys, args=[ticket])
+                await self.redis.publish(lp.RELEASE_CHANNEL, "\n".join(keys))
+                return None, held
+            await asyncio.sleep(min(lp.LOCK_WAIT_POLL_MS, left_ms) / 1000.0)
+
+    async def release(self, resource, owner):
+        keys = _keys(resource)
+        try:
+            if len(keys) == 1:
+                released = await self._unlock(keys=keys, args=[owner]) == 1
+            else:
+                released = await self._unlock_many(keys=keys, args=[owner]) > 0
+            if released:
+                await self.redis.publish(lp.RELEASE_CHANNEL, "\n".join(keys))
+            return released
+        except Exception as e:
+            logger.warning(f"[UNLOCK-ERR] {e}")
+            return False
+
+    async def extend(self, resource, owner, ttl_ms):
+        try:
+            return await self._extend(keys=_keys(resource), args=[owner, ttl_ms]) == 1
+        except Exception as e:
+            logger.warning(f"[EXTEND-ERR] {e}")
+            return None
+
+    async def list_locks(self, cursor=None, limit=100, prefix=None):
+        match = re.sub(r"([*?\[\]\\])", r"\\\1", prefix or lp.LOCK_KEY_PREFIX) + "*"
+        cursor, keys = int(cursor or 0), []
+        while True:
+            cursor, page = await self.redis.scan(cursor, match=match, count=limit)
+            keys.extend(page)
+            if cursor == 0 or len(keys) >= limit:
+                break
+        pipe = self.redis.pipeline(transaction=False)
+        for k in keys:
+            pipe.get(k)
+            pipe.pttl(k)
+        replies = await pipe.execute() if keys else []
+        items = [{"resource": k, "owner": replies[2 * i], "ttl_ms": replies[2 * i + 1]} for i, k in enumerate(keys)
+                 if replies[2 * i] is not None and replies[2 * i + 1] != -2]
+        return {"items": items, "next_cursor": str(cursor) if cursor else None}, 200
+
+    async def aclose(self):
+        await self.redis.aclose()
+
+class AsyncThreadProvider:
+    # provedor síncrono (ex.: local) rodando no executor padrão do loop
+    def __init__(self, sync):
+        self.sync = sync
+        self.name = sync.name
+
+    async def acquire(self, resource, ttl_ms, wait_ms=0):
+        return await asyncio.to_thread(self.sync.acquire, resource, ttl_ms, wait_ms)
+
+    async def release(self, resource, owner):
+        return await asyncio.to_thread(self.sync.release, resource, owner)
+
+    async def extend(self, resource, owner, ttl_ms):
+        return await asyncio.to_thread(self.sync.extend, resource, owner, ttl_ms)
+
+    async def list_locks(self, cursor=None, limit=100, prefix=None):
+        return await asyncio.to_thread(self.sync.list_locks, cursor, limit, prefix)
+
+    async def aclose(self):
+        pass
+
+_provider = None
+
+def get_async_provider():
+    # um por processo, criado dentro do loop que vai usá-lo (clientes httpx/redis.asyncio são do loop)
+    global _provider
+    if _provider is None:
+        if lp.LOCK_PROVIDER == "http":
+            _provider = AsyncHttpCoordinatorProvider()
+        elif lp.LOCK_PROVIDER == "redis":
+            _provider = AsyncRedisLockProvider()
+        else:
+            _provider = AsyncThreadProvider(lp.get_provider())
+        logger.info(f"[LOCK-PROVIDER] {_provider.name} async=1")
+    return _provider
+
+async def close_async_provider():
+    global _provider
+    if _provider is not None:
+        provider, _provider = _provider, None
+        await provider.aclose()
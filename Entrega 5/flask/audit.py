@@ -0,0 +1,155 @@
+# flask/audit.py
+# Escrita assíncrona do log de auditoria: emit() só enfileira o evento; uma thread de fundo
+# formata as linhas JSON (formato de Entrega 1/Logging.md) e grava em grupo.
+import atexit, json, logging, os, queue, sys, threading, time
+from datetime import datetime, timezone
+from prometheus_client import Counter, Gauge
+
+# ---------- CONFIG ----------
+AUDIT_LOG_PATH = os.environ.get("AUDIT_LOG_PATH", "")          # vazio -> stdout
+AUDIT_QUEUE_SIZE = int(os.environ.get("AUDIT_QUEUE_SIZE", "10000"))
+AUDIT_BATCH_SIZE = int(os.environ.get("AUDIT_BATCH_SIZE", "256"))
+AUDIT_FLUSH_MS = int(os.environ.get("AUDIT_FLUSH_MS", "50"))
+AUDIT_FSYNC = os.environ.get("AUDIT_FSYNC", "batch")            # always | batch | never
+SERVICE_NAME = "servico-agendamento"
+
+logger = logging.getLogger(SERVICE_NAME)
+
+# ---------- METRICS ----------
+AUDIT_QUEUE_DEPTH = Gauge("audit_queue_depth", "Audit events waiting to be written", multiprocess_mode="livesum")
+AUDIT_WRITTEN = Counter("audit_events_written_total", "Audit events written")
+AUDIT_DROPPED = Counter("audit_events_dropped_total", "Audit events dropped because the queue was full")
+AUDIT_FLUSHES = Counter("audit_flushes_total", "Group flushes of the audit log")
+
+def _iso_ms(ts):
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+def format_event(ts, event_type, details):
+    return json.dumps({
+        "timestamp_utc": _iso_ms(ts),
+        "level": "AUDIT",
+        "event_type": event_type,
+        "service": SERVICE_NAME,
+        "details": details,
+    })
+
+class AuditWriter:
+    # fsync: "always" sincroniza a cada evento, "batch" uma vez por grupo, "never" deixa para o SO.
+    # Com a fila cheia o evento é descartado e contado (não bloqueia a requisição).
+    def __init__(self, path=AUDIT_LOG_PATH, queue_size=AUDIT_QUEUE_SIZE, batch_size=AUDIT_BATCH_SIZE,
+                 flush_ms=AUDIT_FLUSH_MS, fsync=AUDIT_FSYNC):
+        if fsync not in ("always", "batch", "never"):
+            raise ValueError(f"AUDIT_FSYNC inválido: {fsync}")
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_s = flush_ms / 1000.0
+        self.fsync = fsync
+        self.queue_size = queue_size
+        self._q = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = os.getpid()
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        with self._start_lock:
+            if self._pid != os.getpid():
+                # processo filho (fork): a thread do pai não existe aqui e a fila pode ter
+                # herdado locks em uso; começa com fila e thread novas
+                self._q = queue.Queue(maxsize=self.queue_size)
+                self._stop = threading.Event()
+                self._thread = None
+                self._pid = os.getpid()
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+                self._thread.start()
+
+    def emit(self, event_type, details):
+        if self._thread is None or self._pid != os.getpid():
+            self.start()
+        try:
+            self._q.put_nowait((time.time(), event_type, details))
+            AUDIT_QUEUE_DEPTH.inc()
+            return True
+        except queue.Full:
+            AUDIT_DROPPED.inc()
+            return False
+
+    def depth(self):
+        return self._q.qsize()
+
+    def _open(self):
+        # stdout é resolvido a cada escrita (pode ser trocado depois que a thread começa)
+        if not self.path:
+            return None, False
+        return open(self.path, "a", encoding="utf-8"), True
+
+    def _drain(self, first):
+        # agrupa o que chegar em até flush_ms depois do primeiro evento (ou batch_size eventos)
+        batch = [first]
+        deadline = time.monotonic() + self.flush_s
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._q.get(timeout=remaining) if remaining > 0 else self._q.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, fh, batch):
+        fh = fh if fh is not None else sys.stdout
+        if self.fsync == "always":
+            for ev in batch:
+                fh.write(format_event(*ev) + "\n")
+                self._sync(fh)
+        else:
+            fh.write("".join(format_event(*ev) + "\n" for ev in batch))
+            if self.fsync == "batch":
+                self._sync(fh)
+            else:
+                fh.flush()
+        AUDIT_QUEUE_DEPTH.dec(len(batch))
+        AUDIT_WRITTEN.inc(len(batch))
+        AUDIT_FLUSHES.inc()
+
+    def _sync(self, fh):
+        fh.flush()
+        try:
+            os.fsync(fh.fileno())
+        except (OSError, ValueError):
+            pass  # stdout em pipe/terminal não suporta fsync
+
+    def _run(self):
+        fh, owned = self._open()
+        try:
+            while True:
+                try:
+                    first = self._q.get(timeout=0.1)
+                except queue.Empty:
+                    if self._stop.is_set():
+                        break
+                    continue
+                batch = self._drain(first)
+                try:
+                    self._write(fh, batch)
+                except Exception as e:
+                    logger.error(f"[AUDIT-ERR] {e}")
+                    AUDIT_QUEUE_DEPTH.dec(len(batch))
+                    AUDIT_DROPPED.inc(len(batch))
+        finally:
+            if owned:
+                fh.close()
+
+    def close(self, timeout=5.0):
+        # sinaliza a thread e espera a fila esvaziar (flush garantido no shutdown)
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+_writer = AuditWriter()
+atexit.register(_writer.close)
+
+def get_writer():
+    return _writer
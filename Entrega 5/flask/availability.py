@@ -0,0 +1,95 @@
+# flask/availability.py
+# Janelas livres por telescópio (GET /telescopios/<id>/disponibilidade). Os intervalos livres de
+# cada dia UTC ficam em cache por (telescópio, dia) junto com a versão de cache_versions; create e
+# cancel incrementam a versão, então qualquer worker percebe a mudança na próxima consulta.
+# Dias que faltam no cache são calculados juntos: uma consulta ordenada por horario_inicio_utc
+# para o trecho contíguo e uma passada que emite os buracos entre as reservas.
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+from prometheus_client import Counter
+
+DAY = timedelta(days=1)
+
+AVAILABILITY_DAYS = Counter("availability_days_total", "Days served by the availability endpoint", ["source"])
+
+def free_gaps(busy, lo, hi):
+    # busy: [(inicio, fim)] ordenado por inicio (pode se sobrepor/ultrapassar [lo, hi))
+    gaps, cursor = [], lo
+    for inicio, fim in busy:
+        if inicio >= hi:
+            break
+        if inicio > cursor:
+            gaps.append((cursor, inicio))
+        if fim > cursor:
+            cursor = fim
+    if cursor < hi:
+        gaps.append((cursor, hi))
+    return gaps
+
+def split_by_day(gaps, first_day, n_days):
+    # buracos de um trecho contíguo -> listas por dia, cortando na meia-noite
+    days = [[] for _ in range(n_days)]
+    for inicio, fim in gaps:
+        while inicio < fim:
+            i = (inicio - first_day) // DAY
+            day_end = first_day + (i + 1) * DAY
+            days[i].append((inicio, min(fim, day_end)))
+            inicio = day_end
+    return days
+
+def join_days(per_day, lo, hi, min_duration):
+    # junta os dias (buracos que se encostam na meia-noite viram um só), recorta em [lo, hi)
+    out = []
+    for gaps in per_day:
+        for inicio, fim in gaps:
+            if out and out[-1][1] == inicio:
+                out[-1] = (out[-1][0], fim)
+            else:
+                out.append((inicio, fim))
+    clipped = [(max(i, lo), min(f, hi)) for i, f in out if f > lo and i < hi]
+    return [(i, f) for i, f in clipped if f - i >= min_duration]
+
+class AvailabilityCache:
+    # loader(telescopio_id, lo, hi) -> [(inicio, fim)] CONFIRMED que tocam [lo, hi), ordenado por inicio
+    def __init__(self, loader, max_days=4096):
+        self._loader = loader
+        self.max_days = max_days
+        self._days = OrderedDict()  # (telescopio_id, dia) -> (versão, buracos)
+        self._lock = threading.Lock()
+
+    def days(self, telescopio_id, version, first_day, n_days, loader=None):
+        # loader: substitui o do construtor nesta chamada (ex.: consulta no read model)
+        loader = loader or self._loader
+        result = [None] * n_days
+        with self._lock:
+            for i in range(n_days):
+                entry = self._days.get((telescopio_id, first_day + i * DAY))
+                if entry is not None and entry[0] == version:
+                    self._days.move_to_end((telescopio_id, first_day + i * DAY))
+                    result[i] = entry[1]
+        AVAILABILITY_DAYS.labels(source="cache").inc(sum(r is not None for r in result))
+        i = 0
+        while i < n_days:
+            if result[i] is not None:
+                i += 1
+                continue
+            j = i
+            while j < n_days and result[j] is None:
+                j += 1
+            lo, hi = first_day + i * DAY, first_day + j * DAY
+            computed = split_by_day(free_gaps(loader(telescopio_id, lo, hi), lo, hi), lo, j - i)
+            result[i:j] = computed
+            AVAILABILITY_DAYS.labels(source="db").inc(j - i)
+            with self._lock:
+                for k, gaps in enumerate(computed):
+                    self._days[(telescopio_id, lo + k * DAY)] = (version, gaps)
+                    self._days.move_to_end((telescopio_id, lo + k * DAY))
+                while len(self._days) > self.max_days:
+                    self._days.popitem(last=False)
+            i = j
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._days.clear()
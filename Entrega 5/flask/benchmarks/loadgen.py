@@ -0,0 +1,312 @@
+# benchmarks/loadgen.py
+# Gerador de carga reproduzível para o serviço de agendamento.
+#
+#   # em processo: test client do Flask + coordenador falso (HTTP local, locks em memória)
+#   python benchmarks/loadgen.py --target inproc --mix overlapping --concurrency 16 --requests 2000
+#   # em processo com a tabela de locks local (LOCK_PROVIDER=local) no lugar do coordenador
+#   python benchmarks/loadgen.py --target inproc --lock-provider local
+#   # contra o serviço rodando (docker compose up)
+#   python benchmarks/loadgen.py --target http --url http://localhost:5000 --mix disjoint --rate 200 --duration 30
+#   # diferença entre duas execuções (ex.: antes/depois de um commit)
+#   python benchmarks/loadgen.py --compare antes.json depois.json
+#
+# Modo fechado (padrão): --concurrency clientes enviam o próximo pedido assim que recebem a resposta.
+# Modo aberto (--rate N): chegadas a taxa constante, independente das respostas; a latência é
+# medida a partir do horário agendado de cada chegada, então fila no cliente também aparece.
+import argparse, collections, itertools, json, os, platform, random, subprocess, sys, tempfile, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BASE = datetime(2040, 1, 1, tzinfo=timezone.utc)
+PERCENTILES = (50, 95, 99, 99.9)
+
+# ---------- MIXES ----------
+def _payload(tel, inicio, minutes):
+    fim = inicio + timedelta(minutes=minutes)
+    return {"cientista_id": 1, "telescopio_id": tel,
+            "horario_inicio_utc": inicio.isoformat().replace("+00:00", "Z"),
+            "horario_fim_utc": fim.isoformat().replace("+00:00", "Z")}
+
+class Mix:
+    # next_request(i, rng) -> ("POST", path, body); um gerador por execução, chamado de várias threads
+    def __init__(self, name, telescopios):
+        self.name = name
+        self.telescopios = telescopios
+        self.created = collections.deque(maxlen=100000)
+        self._lock = threading.Lock()
+
+    def next_request(self, i, rng):
+        if self.name == "same-slot":
+            return "POST", "/agendamentos", _payload(1, BASE, 60)
+        if self.name == "overlapping":
+            # poucos telescópios e janela curta: a maioria dos pedidos disputa o mesmo horário
+            tel = rng.randint(1, self.telescopios)
+            inicio = BASE + timedelta(minutes=15 * rng.randint(0, 31))
+            return "POST", "/agendamentos", _payload(tel, inicio, 60)
+        if self.name == "disjoint":
+            return "POST", "/agendamentos", self._disjoint(i)
+        if self.name == "cancel-heavy":
+            if rng.random() < 0.5:
+                with self._lock:
+                    ag_id = self.created.popleft() if self.created else None
+                if ag_id is not None:
+                    return "POST", f"/agendamentos/{ag_id}/cancel", None
+            return "POST", "/agendamentos", self._disjoint(i)
+        raise ValueError(f"mix desconhecido: {self.name}")
+
+    def _disjoint(self, i):
+        return _payload(i % self.telescopios + 1, BASE + timedelta(hours=2 * (i // self.telescopios)), 60)
+
+    def observe(self, path, status, body):
+        if self.name == "cancel-heavy" and path == "/agendamentos" and status == 201 and body:
+            with self._lock:
+                self.created.append(body["id"])
+
+MIXES = ("overlapping", "disjoint", "same-slot", "cancel-heavy")
+
+# ---------- TARGETS ----------
+class _FakeCoordinatorHandler(BaseHTTPRequestHandler):
+    # mesmo contrato de coordenador/server.js (/lock, /extend e /unlock, chave única ou multi-chave), em memória
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # cabeçalho e corpo saem em writes separados: evita o atraso de ~40ms do ACK
+    locks = {}
+    mutex = threading.Lock()
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        keys = body.get("resources") or [body.get("resource")]
+        now = time.monotonic()
+        with self.mutex:
+            if self.path == "/lock":
+                held = [k for k in keys if self.locks.get(k, (None, 0))[1] > now]
+                if held:
+                    return self._reply(409, {"error": "locked", "resources": held})
+                owner = f"{threading.get_ident()}-{now}"
+                for k in keys:
+                    self.locks[k] = (owner, now + body.get("ttl_ms", 30000) / 1000.0)
+                return self._reply(200, {"owner": owner})
+            if self.path == "/extend":
+                if any(self.locks.get(k, (None, 0))[0] != body.get("owner") or self.locks[k][1] <= now for k in keys):
+                    return self._reply(409, {"error": "lost"})
+                for k in keys:
+                    self.locks[k] = (body["owner"], now + body.get("ttl_ms", 30000) / 1000.0)
+                return self._reply(200, {"result": "extended"})
+            for k in keys:
+                if self.locks.get(k, (None,))[0] == body.get("owner"):
+                    del self.locks[k]
+            return self._reply(200, {"result": "unlocked"})
+
+    def _reply(self, status, obj):
+        data = json.dumps(obj).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *a):
+        pass
+
+class InProcessTarget:
+    def __init__(self, lock_provider="http"):
+        tmp = tempfile.mkdtemp(prefix="loadgen-")
+        self.coordinator = None
+        if lock_provider == "http":
+            self.coordinator = ThreadingHTTPServer(("127.0.0.1", 0), _FakeCoordinatorHandler)
+            threading.Thread(target=self.coordinator.serve_forever, daemon=True).start()
+            os.environ["COORDINATOR_URL"] = f"http://127.0.0.1:{self.coordinator.server_port}"
+        os.environ["LOCK_PROVIDER"] = lock_provider
+        os.environ.setdefault("LOCAL_LOCK_PATH", os.path.join(tmp, "locks.db"))
+        os.environ.setdefault("SQLITE_PATH", f"sqlite:///{os.path.join(tmp, 'loadgen.db')}")
+        os.environ.setdefault("AUDIT_LOG_PATH", os.path.join(tmp, "audit.log"))
+        sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        import logging
+        logging.disable(logging.INFO)
+        from app import create_app
+        self.app = create_app()
+        self._local = threading.local()
+
+    def request(self, method, path, body):
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        r = client.open(path, method=method, json=body)
+        return r.status_code, (r.get_json(silent=True) if r.status_code == 201 else None)
+
+    def close(self):
+        if self.coordinator:
+            self.coordinator.shutdown()
+
+class HttpTarget:
+    def __init__(self, url, timeout):
+        import requests
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=512))
+
+    def request(self, method, path, body):
+        try:
+            r = self.session.request(method, self.url + path, json=body, timeout=self.timeout)
+        except Exception:
+            return 0, None  # 0 = erro de transporte
+        return r.status_code, (r.json() if r.status_code == 201 else None)
+
+    def close(self):
+        self.session.close()
+
+# ---------- RUN ----------
+class Recorder:
+    def __init__(self, measure_from):
+        self.measure_from = measure_from
+        self.latencies = []
+        self.statuses = collections.Counter()
+        self.warmup = 0
+        self.first = None
+        self.last = None
+        self._lock = threading.Lock()
+
+    def record(self, started, finished, status):
+        with self._lock:
+            if started < self.measure_from:
+                self.warmup += 1
+                return
+            self.latencies.append(finished - started)
+            self.statuses[str(status)] += 1
+            self.first = started if self.first is None else min(self.first, started)
+            self.last = finished if self.last is None else max(self.last, finished)
+
+def percentile(sorted_values, p):
+    # nearest-rank
+    if not sorted_values:
+        return None
+    k = max(0, min(len(sorted_values) - 1, int(round(p / 100.0 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[k]
+
+def run(args):
+    target = InProcessTarget(args.lock_provider) if args.target == "inproc" else HttpTarget(args.url, args.timeout)
+    mix = Mix(args.mix, args.telescopios)
+    counter = itertools.count()
+    start = time.perf_counter()
+    rec = Recorder(measure_from=start + args.warmup)
+    deadline = start + args.warmup + args.duration if args.duration else None
+    total = args.requests + (0 if args.duration else args.warmup_requests)
+    measured_from_index = args.warmup_requests
+
+    def one(i, scheduled):
+        rng = random.Random(args.seed * 1_000_003 + i)
+        method, path, body = mix.next_request(i, rng)
+        status, resp = target.request(method, path, body)
+        finished = time.perf_counter()
+        mix.observe(path, status, resp)
+        if i < measured_from_index:
+            with rec._lock:
+                rec.warmup += 1
+            return
+        rec.record(scheduled, finished, status)
+
+    def more(i):
+        if deadline is not None:
+            return time.perf_counter() < deadline
+        return i < total
+
+    if args.rate:
+        # laço aberto: o despachante agenda chegadas a cada 1/rate s; no máx. --concurrency em voo
+        interval = 1.0 / args.rate
+        with ThreadPoolExecutor(max_workers=args.concurrency) as ex:
+            i = 0
+            while more(i):
+                scheduled = start + i * interval
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                ex.submit(one, i, scheduled)
+                i += 1
+    else:
+        def worker():
+            while True:
+                i = next(counter)
+                if not more(i):
+                    return
+                one(i, time.perf_counter())
+        threads = [threading.Thread(target=worker) for _ in range(args.concurrency)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    target.close()
+    return summarize(args, rec)
+
+def summarize(args, rec):
+    lat = sorted(rec.latencies)
+    elapsed = (rec.last - rec.first) if lat else 0.0
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "config": {k: v for k, v in sorted(vars(args).items()) if k not in ("out", "compare")},
+        "env": {"commit": commit, "python": platform.python_version(),
+                "timestamp_utc": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")},
+        "requests": len(lat),
+        "warmup_requests": rec.warmup,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(lat) / elapsed, 1) if elapsed else 0.0,
+        "status": dict(sorted(rec.statuses.items())),
+        "latency_ms": {
+            **{f"p{str(p).replace('.', '')}": round(percentile(lat, p) * 1000, 3) if lat else None for p in PERCENTILES},
+            "mean": round(sum(lat) / len(lat) * 1000, 3) if lat else None,
+            "max": round(lat[-1] * 1000, 3) if lat else None,
+        },
+    }
+
+def print_report(res):
+    c = res["config"]
+    mode = f"aberto {c['rate']}/s" if c["rate"] else f"fechado x{c['concurrency']}"
+    print(f"target={c['target']} mix={c['mix']} modo={mode} commit={res['env']['commit']}")
+    print(f"pedidos={res['requests']} (aquecimento {res['warmup_requests']})  "
+          f"throughput={res['throughput_rps']} req/s  status={res['status']}")
+    print("latência ms  " + "  ".join(f"{k}={v}" for k, v in res["latency_ms"].items()))
+
+def compare(a_path, b_path):
+    with open(a_path) as fa, open(b_path) as fb:
+        a, b = json.load(fa), json.load(fb)
+    print(f"{'métrica':<16}{'A':>12}{'B':>12}{'Δ%':>9}   A={a['env']['commit']} B={b['env']['commit']}")
+    rows = [("throughput_rps", a["throughput_rps"], b["throughput_rps"])]
+    rows += [(k, a["latency_ms"][k], b["latency_ms"][k]) for k in a["latency_ms"]]
+    for name, va, vb in rows:
+        delta = f"{(vb - va) / va * 100:+.1f}" if va and vb is not None else "-"
+        print(f"{name:<16}{va!s:>12}{vb!s:>12}{delta:>9}")
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--target", choices=("inproc", "http"), default="inproc")
+    ap.add_argument("--url", default="http://localhost:5000")
+    ap.add_argument("--lock-provider", choices=("http", "local", "redis"), default="http",
+                    help="inproc: coordenador falso via HTTP, tabela de locks local ou Redis direto (REDIS_URL)")
+    ap.add_argument("--mix", choices=MIXES, default="overlapping")
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--requests", type=int, default=1000, help="pedidos medidos (ignorado com --duration)")
+    ap.add_argument("--duration", type=float, default=0, help="segundos medidos (em vez de --requests)")
+    ap.add_argument("--rate", type=float, default=0, help="chegadas/s em laço aberto (0 = laço fechado)")
+    ap.add_argument("--warmup", type=float, default=0, help="segundos iniciais descartados")
+    ap.add_argument("--warmup-requests", type=int, default=50, help="pedidos iniciais descartados")
+    ap.add_argument("--telescopios", type=int, default=4)
+    ap.add_argument("--timeout", type=float, default=10)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--out", help="grava o resultado em JSON")
+    ap.add_argument("--compare", nargs=2, metavar=("A.json", "B.json"))
+    args = ap.parse_args()
+    if args.compare:
+        return compare(*args.compare)
+    res = run(args)
+    print_report(res)
+    if args.out:
+        with open(args.out, "w") as fh:
+            json.dump(res, fh, indent=2, sort_keys=True)
+            fh.write("\n")
+
+if __name__ == "__main__":
+    main()
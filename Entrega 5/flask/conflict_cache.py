@@ -0,0 +1,126 @@
+# flask/conflict_cache.py
+# Cache em memória das reservas CONFIRMED por telescópio para rejeitar sobreposições óbvias
+# antes de ir ao coordenador. O BD continua sendo a autoridade: o cache só pode recusar.
+import bisect, threading
+from datetime import timedelta, timezone
+from prometheus_client import Counter
+
+CACHE_REJECTIONS = Counter("conflict_cache_rejections_total", "Bookings rejected by the in-process conflict cache before locking")
+CACHE_RELOADS = Counter("conflict_cache_reloads_total", "Per-telescope conflict cache reloads from the database")
+
+def _naive_utc(dt):
+    # as colunas DateTime guardam UTC sem tzinfo; as datas da requisição chegam com offset
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+class IntervalIndex:
+    # Intervalos ordenados pelo início + maior duração já inserida. Uma busca de sobreposição
+    # com [inicio, fim) faz bisect para achar os que começam antes de fim e volta só até
+    # início >= inicio - max_len: nenhum intervalo anterior a isso alcança inicio.
+    def __init__(self):
+        self._keys = []   # (inicio, id) ordenado
+        self._fim = {}    # id -> fim
+        self._max_len = timedelta(0)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def add(self, inicio, fim, ag_id):
+        inicio, fim = _naive_utc(inicio), _naive_utc(fim)
+        if ag_id in self._fim:
+            return
+        bisect.insort(self._keys, (inicio, ag_id))
+        self._fim[ag_id] = fim
+        self._max_len = max(self._max_len, fim - inicio)
+
+    def remove(self, ag_id, inicio):
+        inicio = _naive_utc(inicio)
+        i = bisect.bisect_left(self._keys, (inicio, ag_id))
+        if i < len(self._keys) and self._keys[i] == (inicio, ag_id):
+            del self._keys[i]
+            del self._fim[ag_id]
+
+    def overlap(self, inicio, fim):
+        inicio, fim = _naive_utc(inicio), _naive_utc(fim)
+        lower = inicio - self._max_len
+        i = bisect.bisect_left(self._keys, (fim,))  # primeiro que começa em >= fim
+        while i > 0:
+            i -= 1
+            start, ag_id = self._keys[i]
+            if start < lower:
+                break
+            if self._fim[ag_id] > inicio:
+                return ag_id
+        return None
+
+class _Entry:
+    __slots__ = ("version", "index")
+
+    def __init__(self, version, index):
+        self.version = version
+        self.index = index
+
+class ConflictCache:
+    # loader(telescopio_id) -> (version, [(id, inicio, fim), ...]) lido do BD numa mesma transação.
+    # A versão vem de um contador por telescópio incrementado junto com cada create/cancel, então
+    # alterações feitas por outros workers invalidam a entrada na próxima consulta.
+    def __init__(self, loader):
+        self._loader = loader
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def overlap(self, telescopio_id, version, inicio, fim):
+        with self._lock:
+            entry = self._entries.get(telescopio_id)
+            fresh = entry is not None and entry.version == version
+            if fresh:
+                conflict = entry.index.overlap(inicio, fim)
+        if not fresh:
+            # consulta ao BD fora do lock: um telescópio lento não segura os acertos dos outros.
+            # Só entra no cache se ninguém guardou uma versão mais nova enquanto isso
+            entry = self._load(telescopio_id)
+            with self._lock:
+                current = self._entries.get(telescopio_id)
+                if current is None or current.version < entry.version:
+                    self._entries[telescopio_id] = entry
+                conflict = entry.index.overlap(inicio, fim)
+        if conflict is not None:
+            CACHE_REJECTIONS.inc()
+        return conflict
+
+    def _load(self, telescopio_id):
+        loaded_version, rows = self._loader(telescopio_id)
+        index = IntervalIndex()
+        for ag_id, a_inicio, a_fim in rows:
+            index.add(a_inicio, a_fim, ag_id)
+        CACHE_RELOADS.inc()
+        return _Entry(loaded_version, index)
+
+    # new_version é o valor gravado pela própria transação; se a entrada estava exatamente uma
+    # versão atrás, ninguém mais alterou o telescópio e a mudança pode ser aplicada no lugar.
+    def added(self, telescopio_id, new_version, ag_id, inicio, fim):
+        with self._lock:
+            entry = self._entries.get(telescopio_id)
+            if entry is not None and entry.version == new_version - 1:
+                entry.index.add(inicio, fim, ag_id)
+                entry.version = new_version
+            else:
+                self._entries.pop(telescopio_id, None)
+
+    def removed(self, telescopio_id, new_version, ag_id, inicio):
+        with self._lock:
+            entry = self._entries.get(telescopio_id)
+            if entry is not None and entry.version == new_version - 1:
+                entry.index.remove(ag_id, inicio)
+                entry.version = new_version
+            else:
+                self._entries.pop(telescopio_id, None)
+
+    def invalidate(self, telescopio_id):
+        with self._lock:
+            self._entries.pop(telescopio_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,159 @@
+# flask/coordinator_client.py
+# Cliente HTTP do coordenador de locks com pool de conexões keep-alive compartilhado.
+import logging, os, random, threading, time
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import NewConnectionError
+from prometheus_client import Counter
+
+# ---------- CONFIG ----------
+COORDINATOR_URL = os.environ.get("COORDINATOR_URL", "http://coordenador:3000")
+POOL_SIZE = int(os.environ.get("COORDINATOR_POOL_SIZE", "20"))
+POOL_BLOCK = os.environ.get("COORDINATOR_POOL_BLOCK", "0") == "1"
+CONNECT_TIMEOUT = float(os.environ.get("COORDINATOR_CONNECT_TIMEOUT", "1.0"))
+READ_TIMEOUT = float(os.environ.get("COORDINATOR_READ_TIMEOUT", "3.0"))
+MAX_RETRIES = int(os.environ.get("COORDINATOR_RETRIES", "2"))
+BACKOFF_BASE_MS = int(os.environ.get("COORDINATOR_BACKOFF_MS", "25"))
+BACKOFF_MAX_MS = int(os.environ.get("COORDINATOR_BACKOFF_MAX_MS", "250"))
+
+# respostas que indicam falha passageira do coordenador (ou de um proxy na frente dele)
+TRANSIENT_STATUS = {502, 503, 504}
+# POST /lock não é idempotente: um 504 (o proxy desistiu de esperar) ou uma conexão caída depois do
+# envio podem vir de um lock já concedido, então ele só é repetido se o pedido nem saiu (falha ao
+# conectar) ou com 502/503; os demais caminhos (GET, /unlock e /extend do owner) podem ser repetidos
+NON_IDEMPOTENT_PATHS = {"/lock"}
+NON_IDEMPOTENT_RETRY_STATUS = {502, 503}
+
+logger = logging.getLogger("servico-agendamento")
+
+# ---------- METRICS ----------
+COORD_REQUESTS = Counter("coordinator_requests_total", "Requests sent to the coordinator", ["path", "outcome"])
+COORD_RETRIES = Counter("coordinator_retries_total", "Coordinator requests retried after a transient error", ["path"])
+POOL_HITS = Counter("coordinator_pool_hits_total", "Coordinator requests served by a connection taken from the pool")
+POOL_CONN_REUSED = Counter("coordinator_connection_reuse_total", "Coordinator requests sent over an already open keep-alive connection")
+POOL_CONN_OPENED = Counter("coordinator_connections_opened_total", "New TCP connections opened to the coordinator")
+
+# ---------- POOL ----------
+class _CountingPoolMixin:
+    # _get_conn devolve uma conexão da fila do pool (ou cria uma nova); marcamos as conexões
+    # já entregues para distinguir hit de pool e reuso efetivo do socket keep-alive.
+    def _new_conn(self):
+        POOL_CONN_OPENED.inc()
+        return super()._new_conn()
+
+    def _get_conn(self, timeout=None):
+        conn = super()._get_conn(timeout=timeout)
+        if getattr(conn, "_coord_used", False):
+            POOL_HITS.inc()
+            if conn.sock is not None:  # conexões derrubadas pelo servidor são fechadas no _get_conn
+                POOL_CONN_REUSED.inc()
+        conn._coord_used = True
+        return conn
+
+class _CountingHTTPConnectionPool(_CountingPoolMixin, HTTPConnectionPool):
+    pass
+
+class _CountingHTTPSConnectionPool(_CountingPoolMixin, HTTPSConnectionPool):
+    pass
+
+class _CountingAdapter(HTTPAdapter):
+    def init_poolmanager(self, *a, **kw):
+        super().init_poolmanager(*a, **kw)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _CountingHTTPConnectionPool,
+            "https": _CountingHTTPSConnectionPool,
+        }
+
+def retry_status(path):
+    return NON_IDEMPOTENT_RETRY_STATUS if path in NON_IDEMPOTENT_PATHS else TRANSIENT_STATUS
+
+def _not_sent(e):
+    # ConnectTimeout ou conexão recusada (NewConnectionError): o coordenador não recebeu nada
+    if isinstance(e, requests.exceptions.ConnectTimeout):
+        return True
+    return isinstance(getattr(e.args[0] if e.args else None, "reason", None), NewConnectionError)
+
+# ---------- CLIENT ----------
+# Cliente thread-safe do coordenador: uma Session com pool keep-alive e retry com
+# backoff exponencial + jitter apenas para erros transitórios (falha de conexão, 502/503/504;
+# para POST /lock só falha ao conectar e 502/503, ver NON_IDEMPOTENT_PATHS).
+class CoordinatorClient:
+    def __init__(self, base_url=COORDINATOR_URL, pool_size=POOL_SIZE, pool_block=POOL_BLOCK,
+                 connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT,
+                 max_retries=MAX_RETRIES, backoff_base_ms=BACKOFF_BASE_MS, backoff_max_ms=BACKOFF_MAX_MS):
+        self.base_url = base_url.rstrip("/")
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff_base_ms = backoff_base_ms
+        self.backoff_max_ms = backoff_max_ms
+        # o retry do urllib3 fica desligado: a política de retry é feita aqui para controlar o que é transitório
+        adapter = _CountingAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=pool_block, max_retries=0)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _backoff(self, attempt):
+        cap = min(self.backoff_max_ms, self.backoff_base_ms * (2 ** attempt))
+        time.sleep(random.uniform(0, cap) / 1000.0)  # full jitter
+
+    def request(self, method, path, timeout=None, **kw):
+        url = f"{self.base_url}{path}"
+        timeout = (self.connect_timeout, timeout if timeout is not None else self.read_timeout)
+        statuses = retry_status(path)
+        attempt = 0
+        while True:
+            try:
+                r = self.session.request(method, url, timeout=timeout, **kw)
+            except requests.exceptions.ReadTimeout:
+                # o coordenador pode ter processado o pedido (ex.: lock concedido); repetir não é seguro
+                COORD_REQUESTS.labels(path=path, outcome="timeout").inc()
+                raise
+            except requests.exceptions.ConnectionError as e:
+                # inclui ConnectTimeout e conexões keep-alive fechadas pelo servidor antes da resposta;
+                # estas só são repetidas fora de NON_IDEMPOTENT_PATHS
+                if attempt >= self.max_retries or (path in NON_IDEMPOTENT_PATHS and not _not_sent(e)):
+                    COORD_REQUESTS.labels(path=path, outcome="error").inc()
+                    raise
+                COORD_RETRIES.labels(path=path).inc()
+                self._backoff(attempt)
+                attempt += 1
+                continue
+            if r.status_code in statuses and attempt < self.max_retries:
+                COORD_RETRIES.labels(path=path).inc()
+                self._backoff(attempt)
+                attempt += 1
+                continue
+            COORD_REQUESTS.labels(path=path, outcome=str(r.status_code)).inc()
+            return r
+
+    def post(self, path, payload, timeout=None):
+        return self.request("POST", path, json=payload, timeout=timeout)
+
+    def get(self, path, params=None, timeout=None):
+        return self.request("GET", path, params=params, timeout=timeout)
+
+    def close(self):
+        self.session.close()
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+def get_client():
+    # cliente compartilhado do processo (criado na primeira chamada). Depois de um fork o
+    # worker não reaproveita os sockets do pai: um pid diferente cria um cliente novo.
+    global _client, _client_pid
+    if _client is None or _client_pid != os.getpid():
+        with _client_lock:
+            if _client is None or _client_pid != os.getpid():
+                _client = CoordinatorClient()
+                _client_pid = os.getpid()
+                logger.info(f"[COORD-POOL] url={_client.base_url} pool_size={POOL_SIZE} retries={MAX_RETRIES}")
+    return _client
+
+def reset_client():
+    global _client
+    with _client_lock:
+        _client = None
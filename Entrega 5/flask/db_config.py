@@ -0,0 +1,48 @@
+# flask/db_config.py
+# PRAGMAs do SQLite aplicados em cada conexão nova do pool (evento "connect" do engine).
+# WAL deixa leituras seguirem durante um commit e synchronous=NORMAL faz fsync só no
+# checkpoint, o que tira a maior parte dos "database is locked" de create/cancel concorrentes.
+import logging, os
+from sqlalchemy import event, text
+
+logger = logging.getLogger("servico-agendamento")
+
+# (pragma, variável de ambiente, padrão)
+SQLITE_PRAGMAS = [
+    ("journal_mode", "SQLITE_JOURNAL_MODE", "WAL"),
+    ("synchronous", "SQLITE_SYNCHRONOUS", "NORMAL"),
+    ("busy_timeout", "SQLITE_BUSY_TIMEOUT_MS", "5000"),
+    ("mmap_size", "SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)),
+    ("cache_size", "SQLITE_CACHE_SIZE", "-65536"),  # negativo = KiB (64 MiB)
+]
+
+def pragmas_from_env():
+    if os.environ.get("SQLITE_PRAGMAS", "1") == "0":
+        return {}
+    return {name: os.environ.get(env, default) for name, env, default in SQLITE_PRAGMAS}
+
+def configure_engine(engine, pragmas=None):
+    if engine.dialect.name != "sqlite":
+        return
+    pragmas = pragmas_from_env() if pragmas is None else pragmas
+
+    @event.listens_for(engine, "connect")
+    def _set_pragmas(dbapi_conn, _record):
+        cur = dbapi_conn.cursor()
+        try:
+            for name, value in pragmas.items():
+                cur.execute(f"PRAGMA {name}={value}")
+        finally:
+            cur.close()
+
+def effective_pragmas(engine):
+    if engine.dialect.name != "sqlite":
+        return {}
+    with engine.connect() as conn:
+        return {name: conn.execute(text(f"PRAGMA {name}")).scalar() for name, _, _ in SQLITE_PRAGMAS}
+
+def report(engine):
+    values = effective_pragmas(engine)
+    if values:
+        logger.info("[SQLITE] " + " ".join(f"{k}={v}" for k, v in values.items()))
+    return values
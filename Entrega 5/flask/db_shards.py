@@ -0,0 +1,83 @@
+# flask/db_shards.py
+# Particionamento horizontal dos agendamentos por telescópio (DB_SHARD_URLS=url1,url2,...).
+# O shard 0 é o BD de DATABASE_URL, onde também ficam cientistas e telescópios; DB_SHARD_URLS lista
+# os demais. Cada telescópio vive inteiro num shard (telescopio_id % número de shards): reservas,
+# cache_versions, lock_fences e outbox dele, então a escrita de um telescópio é uma transação num
+# BD só e telescópios de shards diferentes não disputam o mesmo arquivo (lock de escrita do SQLite).
+# Ids públicos levam o shard: id local * número de shards + shard (com um shard só, o próprio id).
+# Mudar o número de shards muda telescópios de lugar e o significado dos ids: exige migrar os dados.
+# Caminhos SQLite relativos em DB_SHARD_URLS são relativos ao diretório de trabalho.
+import os, threading
+from concurrent.futures import ThreadPoolExecutor
+from flask.globals import app_ctx
+from sqlalchemy import create_engine
+from sqlalchemy.orm import scoped_session, sessionmaker
+import db_config
+
+DB_SHARD_URLS = [u.strip() for u in os.environ.get("DB_SHARD_URLS", "").split(",") if u.strip()]
+
+def _ctx_id():
+    # uma sessão por app context, como a db.session do Flask-SQLAlchemy
+    return id(app_ctx._get_current_object())
+
+class ShardRouter:
+    # main_engine/main_session: db.engine e db.session (shard 0)
+    def __init__(self, main_engine, main_session, urls=DB_SHARD_URLS):
+        self.urls = list(urls)
+        self.count = 1 + len(self.urls)
+        self.engines = [main_engine]
+        for url in self.urls:
+            engine = create_engine(url)
+            db_config.configure_engine(engine)
+            self.engines.append(engine)
+        self.sessions = [main_session] + [scoped_session(sessionmaker(bind=e), scopefunc=_ctx_id) for e in self.engines[1:]]
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def sharded(self):
+        return self.count > 1
+
+    def shard_of(self, telescopio_id):
+        return int(telescopio_id) % self.count
+
+    def session(self, shard):
+        return self.sessions[shard]
+
+    def for_telescope(self, telescopio_id):
+        return self.sessions[self.shard_of(telescopio_id)]
+
+    def public_id(self, local_id, shard):
+        # também serve para colunas: Agendamento.id * n + shard vira expressão SQL
+        return local_id * self.count + shard if self.sharded else local_id
+
+    def locate(self, public_id):
+        # (shard, id local)
+        return public_id % self.count, public_id // self.count
+
+    def gather(self, fn, shards=None):
+        # scatter-gather: fn(shard) em paralelo, resultados na ordem dos shards. fn roda fora do app
+        # context: usa self.engines[shard].connect(), não as sessões
+        shards = list(range(self.count)) if shards is None else list(shards)
+        if len(shards) == 1:
+            return [fn(shards[0])]
+        return list(self._pool().map(fn, shards))
+
+    def _pool(self):
+        if self._executor is None or self._pid != os.getpid():
+            with self._lock:
+                if self._executor is None or self._pid != os.getpid():
+                    # processo filho (fork): as threads do pai não existem aqui
+                    self._executor = ThreadPoolExecutor(max_workers=self.count, thread_name_prefix="db-shard")
+                    self._pid = os.getpid()
+        return self._executor
+
+    def remove(self):
+        # fim do app context: devolve as conexões dos shards extras (a do shard 0 é do Flask-SQLAlchemy)
+        for s in self.sessions[1:]:
+            s.remove()
+
+    def dispose(self):
+        for e in self.engines[1:]:
+            e.dispose(close=False)
@@ -0,0 +1,78 @@
+# flask/group_commit.py
+# Commit em grupo dos INSERTs de agendamento (GROUP_COMMIT=1). A requisição, ainda com o lock,
+# entrega a reserva a uma única thread escritora e espera o Future; a thread junta o que chegar
+# em até GROUP_COMMIT_MAX_DELAY_MS (ou GROUP_COMMIT_MAX_BATCH itens) e grava tudo num commit só,
+# ou seja, um fsync por lote e não por reserva. O Future só é resolvido depois do commit, então o
+# lock continua cobrindo a escrita até ela ser durável.
+import logging, os, queue, threading, time
+from concurrent.futures import Future
+from prometheus_client import Counter, Histogram
+
+GROUP_COMMIT = os.environ.get("GROUP_COMMIT", "0") == "1"
+GROUP_COMMIT_MAX_DELAY_MS = float(os.environ.get("GROUP_COMMIT_MAX_DELAY_MS", "2"))
+GROUP_COMMIT_MAX_BATCH = int(os.environ.get("GROUP_COMMIT_MAX_BATCH", "64"))
+
+logger = logging.getLogger("servico-agendamento")
+
+GROUP_COMMIT_BATCH = Histogram("group_commit_batch_size", "Bookings per group commit",
+                               buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256))
+GROUP_COMMIT_FAILURES = Counter("group_commit_failures_total", "Group commits that failed as a whole")
+
+class GroupCommitWriter:
+    # commit_batch(items) -> lista de resultados na mesma ordem (valor ou instância de Exception),
+    # tudo numa transação; se commit_batch levanta, todos os Futures do lote recebem a exceção
+    def __init__(self, commit_batch, max_delay_ms=GROUP_COMMIT_MAX_DELAY_MS, max_batch=GROUP_COMMIT_MAX_BATCH):
+        self._commit_batch = commit_batch
+        self.max_delay_s = max_delay_ms / 1000.0
+        self.max_batch = max_batch
+        self._q = queue.Queue()
+        self._thread = None
+        self._pid = os.getpid()
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        with self._start_lock:
+            if self._pid != os.getpid():
+                # processo filho (fork): fila e thread novas, como no AuditWriter
+                self._q = queue.Queue()
+                self._thread = None
+                self._pid = os.getpid()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="group-commit", daemon=True)
+                self._thread.start()
+
+    def submit(self, item):
+        if self._thread is None or self._pid != os.getpid():
+            self.start()
+        fut = Future()
+        self._q.put((item, fut))
+        return fut
+
+    def _drain(self, first):
+        batch = [first]
+        deadline = time.monotonic() + self.max_delay_s
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._q.get(timeout=remaining) if remaining > 0 else self._q.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._drain(self._q.get())
+            GROUP_COMMIT_BATCH.observe(len(batch))
+            try:
+                results = self._commit_batch([item for item, _ in batch])
+            except Exception as e:
+                logger.error(f"[GROUP-COMMIT-ERR] {e}")
+                GROUP_COMMIT_FAILURES.inc()
+                for _, fut in batch:
+                    fut.set_exception(e)
+                continue
+            for (_, fut), res in zip(batch, results):
+                if isinstance(res, Exception):
+                    fut.set_exception(res)
+                else:
+                    fut.set_result(res)
@@ -0,0 +1,32 @@
+# flask/gunicorn.conf.py
+# gunicorn -c gunicorn.conf.py wsgi:app
+import multiprocessing, os, shutil
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+workers = int(os.environ.get("GUNICORN_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get("GUNICORN_THREADS", "4"))
+worker_class = "gthread"
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "30"))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", "10"))
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", "5"))
+accesslog = os.environ.get("GUNICORN_ACCESSLOG", None)
+
+# métricas Prometheus em modo multiprocesso: precisa estar no ambiente antes do primeiro
+# import de prometheus_client (o arquivo de config é lido antes do app)
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/prometheus-multiproc")
+
+def on_starting(server):
+    d = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(d, ignore_errors=True)
+    os.makedirs(d, exist_ok=True)
+    # schema, índices e seed uma única vez, no master, antes dos workers existirem
+    from app import init_db
+    init_db()
+
+def post_fork(server, worker):
+    from app import reset_after_fork
+    reset_after_fork()
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
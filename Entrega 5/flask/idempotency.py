@@ -0,0 +1,162 @@
+# flask/idempotency.py
+# Respostas guardadas por Idempotency-Key: o retry de um cliente que perdeu a resposta por
+# timeout recebe a mesma resposta sem nova ida ao coordenador nem ao BD.
+#   - LRU em memória com TTL (por processo), limitado a IDEMPOTENCY_MAX_ITEMS entradas
+#   - camada opcional no Redis (IDEMPOTENCY_REDIS_URL) para o retry que cai em outro worker/réplica
+# Pedidos repetidos enquanto o primeiro ainda roda esperam por ele (begin/finish): no mesmo
+# processo por um Event; com Redis, a chave é reservada (SET NX PX IDEMPOTENCY_RESERVE_MS) antes de
+# executar, e o retry que cai em outro worker consulta o Redis até a resposta aparecer.
+import hashlib, json, logging, os, threading, time, uuid
+from collections import OrderedDict
+from prometheus_client import Counter
+
+IDEMPOTENCY_TTL_S = int(os.environ.get("IDEMPOTENCY_TTL_S", "86400"))
+IDEMPOTENCY_MAX_ITEMS = int(os.environ.get("IDEMPOTENCY_MAX_ITEMS", "10000"))
+IDEMPOTENCY_REDIS_URL = os.environ.get("IDEMPOTENCY_REDIS_URL", "")  # vazio -> só memória
+IDEMPOTENCY_WAIT_MS = int(os.environ.get("IDEMPOTENCY_WAIT_MS", "10000"))
+# duração da reserva no Redis: cobre o pedido mais longo (espera do lock + commit); se o worker
+# morre no meio, a chave fica presa só até aqui
+IDEMPOTENCY_RESERVE_MS = int(os.environ.get("IDEMPOTENCY_RESERVE_MS", "30000"))
+IDEMPOTENCY_POLL_MS = int(os.environ.get("IDEMPOTENCY_POLL_MS", "50"))
+MAX_KEY_LENGTH = 255
+IN_PROGRESS = b"in-progress:"  # valor da reserva em idem:<key>, até a resposta ser gravada por cima
+
+# apaga a reserva só se ainda é a deste pedido (não a resposta gravada, nem a reserva de outro)
+RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end
+return 0
+"""
+
+logger = logging.getLogger("servico-agendamento")
+
+IDEMPOTENCY_REQUESTS = Counter("idempotency_requests_total", "Requests carrying an Idempotency-Key by outcome", ["outcome"])
+
+def fingerprint(method, path, body):
+    # a mesma chave com outro pedido é erro do cliente, não replay
+    return hashlib.sha256(method.encode() + b" " + path.encode() + b"\n" + body).hexdigest()
+
+class StoredResponse:
+    __slots__ = ("fingerprint", "status", "body", "mimetype", "expires")
+
+    def __init__(self, fingerprint, status, body, mimetype, expires):
+        self.fingerprint, self.status, self.body, self.mimetype, self.expires = fingerprint, status, body, mimetype, expires
+
+    def to_json(self):
+        return json.dumps({"fingerprint": self.fingerprint, "status": self.status,
+                           "body": self.body.decode("utf-8"), "mimetype": self.mimetype, "expires": self.expires})
+
+    @classmethod
+    def from_json(cls, raw):
+        d = json.loads(raw)
+        return cls(d["fingerprint"], d["status"], d["body"].encode("utf-8"), d["mimetype"], d["expires"])
+
+class IdempotencyStore:
+    def __init__(self, ttl_s=IDEMPOTENCY_TTL_S, max_items=IDEMPOTENCY_MAX_ITEMS, redis_url=IDEMPOTENCY_REDIS_URL):
+        self.ttl_s = ttl_s
+        self.max_items = max_items
+        self._items = OrderedDict()
+        self._inflight = {}
+        self._reserved = {}  # chave -> valor da reserva no Redis feita por este processo
+        self._lock = threading.Lock()
+        self._redis = None
+        if redis_url:
+            import redis  # dependência opcional: só com IDEMPOTENCY_REDIS_URL
+            self._redis = redis.Redis.from_url(redis_url, socket_timeout=0.5, socket_connect_timeout=0.5)
+            self._release = self._redis.register_script(RELEASE_SCRIPT)
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                if item.expires > now:
+                    self._items.move_to_end(key)
+                    return item
+                del self._items[key]
+        if self._redis is not None:
+            try:
+                raw = self._redis.get(f"idem:{key}")
+            except Exception as e:
+                logger.warning(f"[IDEM-REDIS-ERR] {e}")
+                return None
+            if raw is not None and not raw.startswith(IN_PROGRESS):
+                item = StoredResponse.from_json(raw)
+                self._put_local(key, item)
+                return item
+        return None
+
+    def put(self, key, item):
+        self._put_local(key, item)
+        if self._redis is not None:
+            try:
+                self._redis.set(f"idem:{key}", item.to_json(), ex=self.ttl_s)
+            except Exception as e:
+                logger.warning(f"[IDEM-REDIS-ERR] {e}")
+
+    def _put_local(self, key, item):
+        with self._lock:
+            self._items[key] = item
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def begin(self, key, deadline=None):
+        # True: este pedido executa; senão espera o que está em andamento terminar (no máximo até
+        # deadline, em time.monotonic(); padrão IDEMPOTENCY_WAIT_MS a partir de agora) e devolve False
+        if deadline is None:
+            deadline = time.monotonic() + IDEMPOTENCY_WAIT_MS / 1000.0
+        with self._lock:
+            ev = self._inflight.get(key)
+            if ev is None:
+                self._inflight[key] = threading.Event()
+        if ev is not None:
+            ev.wait(max(deadline - time.monotonic(), 0))
+            return False
+        if self._redis is None or self._reserve(key):
+            return True
+        self.finish(key)
+        self._wait_remote(key, deadline)
+        return False
+
+    def _reserve(self, key):
+        # reserva entre workers; sem Redis acessível segue só com a espera local
+        token = IN_PROGRESS + uuid.uuid4().hex.encode()
+        try:
+            if not self._redis.set(f"idem:{key}", token, nx=True, px=IDEMPOTENCY_RESERVE_MS):
+                return False
+        except Exception as e:
+            logger.warning(f"[IDEM-REDIS-ERR] {e}")
+            return True
+        with self._lock:
+            self._reserved[key] = token
+        return True
+
+    def _wait_remote(self, key, deadline):
+        # outro worker executa: até a resposta ser gravada ou a reserva sumir (pedido sem resposta
+        # guardada, como 409/5xx) ou o prazo de begin
+        while time.monotonic() < deadline:
+            try:
+                raw = self._redis.get(f"idem:{key}")
+            except Exception as e:
+                logger.warning(f"[IDEM-REDIS-ERR] {e}")
+                return
+            if raw is None or not raw.startswith(IN_PROGRESS):
+                return
+            time.sleep(IDEMPOTENCY_POLL_MS / 1000.0)
+
+    def finish(self, key):
+        # depois do put(): a resposta guardada já substituiu a reserva, que só é apagada se sobrou
+        with self._lock:
+            ev = self._inflight.pop(key, None)
+            token = self._reserved.pop(key, None)
+        if token is not None:
+            try:
+                self._release(keys=[f"idem:{key}"], args=[token])
+            except Exception as e:
+                logger.warning(f"[IDEM-REDIS-ERR] {e}")
+        if ev is not None:
+            ev.set()
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
@@ -0,0 +1,90 @@
+# flask/lease.py
+# Renovação dos leases de lock em segundo plano. Enquanto a seção crítica roda, uma thread por
+# processo chama provider.extend a cada LOCK_RENEW_FRACTION do TTL; assim LOCK_TTL_MS pode ser
+# curto (locks de um worker que morreu somem logo) sem expirar no meio de um commit lento.
+# Se o provedor recusa a renovação (outro owner ou chave já expirada) o lease fica perdido e
+# o caminho de escrita desiste antes do commit (lost()).
+import logging, os, threading, time
+from prometheus_client import Counter
+
+LOCK_RENEW_FRACTION = float(os.environ.get("LOCK_RENEW_FRACTION", "0.33"))
+LOCK_RENEW_RETRY_MS = int(os.environ.get("LOCK_RENEW_RETRY_MS", "200"))
+
+logger = logging.getLogger("servico-agendamento")
+
+LEASE_RENEWALS = Counter("lock_lease_renewals_total", "Lock lease renewals by outcome", ["outcome"])
+
+class Lease:
+    __slots__ = ("resource", "owner", "ttl_ms", "due", "expires", "lost")
+
+    def __init__(self, resource, owner, ttl_ms, due, expires):
+        self.resource, self.owner, self.ttl_ms = resource, owner, ttl_ms
+        self.due, self.expires, self.lost = due, expires, False
+
+class LeaseRenewer:
+    # extend(resource, owner, ttl_ms) -> True (renovado), False (perdido) ou None (erro, tenta de novo)
+    def __init__(self, extend, fraction=LOCK_RENEW_FRACTION, retry_ms=LOCK_RENEW_RETRY_MS):
+        self._extend = extend
+        self.fraction = fraction
+        self.retry_s = retry_ms / 1000.0
+        self._leases = {}
+        self._cond = threading.Condition()
+        self._thread = None
+        self._pid = os.getpid()
+
+    def _ensure_thread(self):
+        if self._pid != os.getpid():
+            # processo filho (fork): leases e thread do pai não valem aqui
+            self._leases, self._cond, self._thread, self._pid = {}, threading.Condition(), None, os.getpid()
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="lease-renewer", daemon=True)
+            self._thread.start()
+
+    def track(self, resource, owner, ttl_ms):
+        now = time.monotonic()
+        lease = Lease(resource, owner, ttl_ms, now + ttl_ms * self.fraction / 1000.0, now + ttl_ms / 1000.0)
+        self._ensure_thread()
+        with self._cond:
+            self._leases[owner] = lease
+            self._cond.notify()
+        return lease
+
+    def untrack(self, owner):
+        with self._cond:
+            self._leases.pop(owner, None)
+
+    def lost(self, owner):
+        # sem lease registrado (renovação desligada) só o TTL original vale: conta como válido
+        lease = self._leases.get(owner)
+        return lease is not None and (lease.lost or time.monotonic() >= lease.expires)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                now = time.monotonic()
+                due = [l for l in self._leases.values() if not l.lost and l.due <= now]
+                if not due:
+                    pending = [l.due for l in self._leases.values() if not l.lost]
+                    self._cond.wait(min(pending) - now if pending else None)
+                    continue
+            for lease in due:
+                self._renew(lease)
+
+    def _renew(self, lease):
+        # a chamada ao provedor fica fora do lock: track/untrack não esperam a rede
+        t0 = time.monotonic()
+        ok = self._extend(lease.resource, lease.owner, lease.ttl_ms)
+        with self._cond:
+            if self._leases.get(lease.owner) is not lease:
+                return  # liberado enquanto renovava
+            if ok:
+                lease.expires = t0 + lease.ttl_ms / 1000.0
+                lease.due = t0 + lease.ttl_ms * self.fraction / 1000.0
+                LEASE_RENEWALS.labels(outcome="renewed").inc()
+            elif ok is None and time.monotonic() < lease.expires:
+                lease.due = time.monotonic() + self.retry_s
+                LEASE_RENEWALS.labels(outcome="error").inc()
+            else:
+                lease.lost = True
+                LEASE_RENEWALS.labels(outcome="lost").inc()
+                logger.warning(f"[LEASE-LOST] resource={lease.resource} owner={lease.owner}")
@@ -0,0 +1,53 @@
+# flask/lock_keys.py
+# Chaves de lock de um agendamento.
+#   start -> uma chave por horário de início: telescopio-{id}_{inicio}
+#   slots -> uma chave por fatia fixa de tempo coberta por [inicio, fim): telescopio-{id}_s{min}-{fatia}
+# No modo slots dois pedidos que se sobrepõem sempre disputam ao menos uma chave em comum,
+# então a serialização das sobreposições é feita pelo lock e não só pela verificação no BD.
+import os
+from datetime import datetime, timedelta, timezone
+
+LOCK_MODE = os.environ.get("LOCK_MODE", "start")
+LOCK_SLOT_MINUTES = int(os.environ.get("LOCK_SLOT_MINUTES", "15"))
+LOCK_MAX_SLOTS = int(os.environ.get("LOCK_MAX_SLOTS", "1024"))
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+class TooManySlots(ValueError):
+    pass
+
+def normalize_utc(dt):
+    # datas sem offset são tratadas como UTC
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc)
+
+def iso_z(dt):
+    return normalize_utc(dt).isoformat().replace("+00:00", "Z")
+
+def key_time(key):
+    # horário (UTC sem tzinfo) de uma chave de lock_resources, ou None para outro formato
+    rest = key.split("_", 1)[-1]
+    if rest.startswith("s") and "-" in rest:
+        rest = rest.split("-", 1)[1]
+    try:
+        return normalize_utc(datetime.fromisoformat(rest.replace("Z", "+00:00"))).replace(tzinfo=None)
+    except ValueError:
+        return None
+
+def lock_resources(telescopio_id, inicio, fim, mode=None, slot_minutes=None):
+    mode = mode or LOCK_MODE
+    inicio, fim = normalize_utc(inicio), normalize_utc(fim)
+    if mode != "slots":
+        return [f"telescopio-{telescopio_id}_{iso_z(inicio)}"]
+    slot_minutes = slot_minutes or LOCK_SLOT_MINUTES
+    step = timedelta(minutes=slot_minutes)
+    first = (inicio - EPOCH) // step
+    last = -((EPOCH - fim) // step)  # teto: a fatia que contém fim-ε
+    if last - first > LOCK_MAX_SLOTS:
+        raise TooManySlots(f"intervalo cobre {last - first} fatias (máx {LOCK_MAX_SLOTS})")
+    keys = []
+    for n in range(first, last):
+        slot = (EPOCH + n * step).strftime("%Y-%m-%dT%H:%MZ")
+        keys.append(f"telescopio-{telescopio_id}_s{slot_minutes}-{slot}")
+    return sorted(keys)
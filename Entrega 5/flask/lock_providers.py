@@ -0,0 +1,423 @@
+# flask/lock_providers.py
+# Provedores de lock por trás de acquire_lock/release_lock (LOCK_PROVIDER):
+#   http  -> coordenador Node (POST /lock, /unlock, GET /locks) — padrão
+#   local -> tabela de locks com TTL num arquivo SQLite: seguro entre threads e entre processos
+#            (BEGIN IMMEDIATE serializa pelo lock de escrita do arquivo); para nó único e testes
+#   redis -> direto no Redis, sem o salto HTTP até o coordenador: mesmas chaves e mesmos scripts Lua,
+#            então Flask e coordenador podem dividir o Redis durante a migração (só com o coordenador
+#            num nó só: com REDIS_NODES as chaves ficam espalhadas pelos nós, use http)
+# Todos devolvem (ok, info) como o coordenador: info = {"owner", "fences", ...} ou {"error": "locked", "resources": [...]}.
+# fences = {prefixo: token}: token de fencing por telescópio (prefixo = chave até o primeiro "_"),
+# crescente a cada concessão; o BD recusa escrita com token menor que o último visto.
+# extend(resource, owner, ttl_ms) renova o lease se o owner ainda tem todas as chaves.
+# acquire(..., wait_ms) espera até wait_ms pelo lock em vez de recusar na hora (ver coordenador/server.js).
+# list_locks(cursor, limit, prefix) pagina como GET /locks: ({"items": [...], "next_cursor": ...}, status).
+import logging, os, re, sqlite3, threading, time, uuid
+
+LOCK_PROVIDER = os.environ.get("LOCK_PROVIDER", "http")
+LOCAL_LOCK_PATH = os.environ.get("LOCAL_LOCK_PATH", "locks.db")
+REDIS_URL = os.environ.get("REDIS_URL", "redis://redis:6379")
+LOCK_KEY_PREFIX = os.environ.get("LOCK_KEY_PREFIX", "telescopio-")  # mesmo prefixo de lock_keys e do coordenador
+LOCK_WAIT_POLL_MS = int(os.environ.get("LOCK_WAIT_POLL_MS", "200"))
+LOCAL_LOCK_POLL_MS = int(os.environ.get("LOCAL_LOCK_POLL_MS", "20"))
+REDIS_POOL_SIZE = int(os.environ.get("REDIS_POOL_SIZE", "50"))
+REDIS_CONNECT_TIMEOUT = float(os.environ.get("REDIS_CONNECT_TIMEOUT", "1.0"))
+REDIS_SOCKET_TIMEOUT = float(os.environ.get("REDIS_SOCKET_TIMEOUT", "2.0"))
+
+logger = logging.getLogger("servico-agendamento")
+
+def _keys(resource):
+    if isinstance(resource, (list, tuple)):
+        return sorted(set(resource))
+    return [resource]
+
+def fence_prefix(key):
+    return key.split("_", 1)[0]
+
+def _parse_grant(reply):
+    # resposta de LOCK_MANY_SCRIPT/QUEUED_LOCK_SCRIPT: [0, ocupadas...] ou [1, prefixo, token, ...]
+    if reply[0] != 1:
+        return None, list(reply[1:])
+    return dict(zip(reply[1::2], reply[2::2])), []
+
+class LockProvider:
+    name = None
+
+    def acquire(self, resource, ttl_ms, wait_ms=0):
+        raise NotImplementedError
+
+    def release(self, resource, owner):
+        raise NotImplementedError
+
+    def extend(self, resource, owner, ttl_ms):
+        raise NotImplementedError
+
+    def list_locks(self, cursor=None, limit=100, prefix=None):
+        raise NotImplementedError
+
+class HttpCoordinatorProvider(LockProvider):
+    name = "http"
+
+    def _body(self, resource):
+        # lista de chaves -> um único acquire/release multi-chave no coordenador
+        if isinstance(resource, (list, tuple)):
+            return {"resources": list(resource)}
+        return {"resource": resource}
+
+    def acquire(self, resource, ttl_ms, wait_ms=0):
+        from coordinator_client import get_client
+        body = {**self._body(resource), "ttl_ms": ttl_ms}
+        timeout = None
+        if wait_ms:
+            # o coordenador segura a resposta até wait_ms: o read timeout tem que cobrir a espera
+            body["wait_ms"] = wait_ms
+            timeout = get_client().read_timeout + wait_ms / 1000.0
+        try:
+            r = get_client().post("/lock", body, timeout=timeout)
+            logger.info(f"[LOCK-RESP] status={r.status_code} body={r.text}")
+            # um 5xx de proxy pode vir em HTML: JSONDecodeError (ValueError) também é indisponibilidade
+            return r.status_code == 200, r.json()
+        except Exception as e:
+            logger.error(f"[LOCK-ERROR] {e}")
+            return False, {"error": "coordinator-unreachable", "detail": str(e)}
+
+    def release(self, resource, owner):
+        from coordinator_client import get_client
+        try:
+            r = get_client().post("/unlock", {**self._body(resource), "owner": owner}, timeout=2)
+            return r.status_code == 200
+        except Exception as e:
+            logger.warning(f"[UNLOCK-ERR] {e}")
+            return False
+
+    def extend(self, resource, owner, ttl_ms):
+        from coordinator_client import get_client
+        try:
+            r = get_client().post("/extend", {**self._body(resource), "owner": owner, "ttl_ms": ttl_ms}, timeout=2)
+        except Exception as e:
+            logger.warning(f"[EXTEND-ERR] {e}")
+            return None  # indeterminado: o renovador tenta de novo antes do TTL acabar
+        return r.status_code == 200
+
+    def list_locks(self, cursor=None, limit=100, prefix=None):
+        import requests
+        from coordinator_client import get_client
+        params = {"limit": limit, "cursor": cursor, "prefix": prefix}
+        try:
+            r = get_client().get("/locks", params={k: v for k, v in params.items() if v is not None}, timeout=3)
+            return r.json(), r.status_code
+        except (requests.RequestException, ValueError) as e:
+            logger.warning(f"[LOCKS-ERR] {e}")
+            return {"error": "coordinator-unreachable", "detail": str(e)}, 503
+
+class LocalLockProvider(LockProvider):
+    name = "local"
+
+    def __init__(self, path=LOCAL_LOCK_PATH):
+        self.path = path
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS locks (resource TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS fences (prefix TEXT PRIMARY KEY, token INTEGER NOT NULL)")
+
+    def _conn(self):
+        # uma conexão por thread (e por processo: depois de um fork o pid muda)
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def acquire(self, resource, ttl_ms, wait_ms=0):
+        # espera por polling até o prazo; sem fila, então sem ordem FIFO entre os que esperam
+        deadline = time.monotonic() + wait_ms / 1000.0
+        while True:
+            ok, info = self._try_acquire(resource, ttl_ms)
+            if ok or time.monotonic() >= deadline:
+                return ok, info
+            time.sleep(min(LOCAL_LOCK_POLL_MS / 1000.0, max(deadline - time.monotonic(), 0)))
+
+    def _try_acquire(self, resource, ttl_ms):
+        keys = _keys(resource)
+        now = time.time()
+        marks = ",".join("?" * len(keys))
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(f"DELETE FROM locks WHERE resource IN ({marks}) AND expires_at <= ?", (*keys, now))
+            held = [r for (r,) in conn.execute(f"SELECT resource FROM locks WHERE resource IN ({marks})", keys)]
+            if held:
+                conn.execute("COMMIT")
+                return False, {"error": "locked", "resources": held}
+            owner = str(uuid.uuid4())
+            expires = now + ttl_ms / 1000.0
+            conn.executemany("INSERT INTO locks (resource, owner, expires_at) VALUES (?, ?, ?)",
+                             [(k, owner, expires) for k in keys])
+            fences = {}
+            for p in sorted({fence_prefix(k) for k in keys}):
+                conn.execute("INSERT INTO fences (prefix, token) VALUES (?, 1) "
+                             "ON CONFLICT(prefix) DO UPDATE SET token = token + 1", (p,))
+                fences[p] = conn.execute("SELECT token FROM fences WHERE prefix = ?", (p,)).fetchone()[0]
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return True, {"owner": owner, "resources": keys, "expiresAt": int(expires * 1000), "fences": fences}
+
+    def release(self, resource, owner):
+        keys = _keys(resource)
+        cur = self._conn().execute(
+            f"DELETE FROM locks WHERE resource IN ({','.join('?' * len(keys))}) AND owner = ?", (*keys, owner))
+        return cur.rowcount > 0
+
+    def extend(self, resource, owner, ttl_ms):
+        keys = _keys(resource)
+        now = time.time()
+        marks = ",".join("?" * len(keys))
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            mine = conn.execute(f"SELECT COUNT(*) FROM locks WHERE resource IN ({marks}) AND owner = ? AND expires_at > ?",
+                                (*keys, owner, now)).fetchone()[0]
+            if mine == len(keys):
+                conn.execute(f"UPDATE locks SET expires_at = ? WHERE resource IN ({marks})", (now + ttl_ms / 1000.0, *keys))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return mine == len(keys)
+
+    def list_locks(self, cursor=None, limit=100, prefix=None):
+        # cursor = último resource da página anterior (paginação pela chave primária)
+        now = time.time()
+        prefix = prefix or LOCK_KEY_PREFIX
+        like = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        rows = self._conn().execute(
+            "SELECT resource, owner, expires_at FROM locks WHERE resource LIKE ? ESCAPE '\\' AND resource > ? "
+            "AND expires_at > ? ORDER BY resource LIMIT ?", (like, cursor or "", now, limit + 1)).fetchall()
+        items = [{"resource": r, "owner": o, "ttl_ms": int((e - now) * 1000)} for r, o, e in rows[:limit]]
+        return {"items": items, "next_cursor": items[-1]["resource"] if len(rows) > limit else None}, 200
+
+# mesmos scripts de coordenador/server.js e locks.js (tests/test_lock_providers.py confere que não divergiram).
+# O último argumento de LOCK_MANY_SCRIPT/QUEUED_LOCK_SCRIPT é o piso do token de fencing (_fence_floor)
+LOCK_MANY_SCRIPT = """
+local held = {0}
+for i, k in ipairs(KEYS) do
+  if redis.call("exists", k) == 1 then table.insert(held, k) end
+end
+if #held > 1 then return held end
+local floor = tonumber(ARGV[3] or "0")
+local fences, seen = {1}, {}
+for i, k in ipairs(KEYS) do
+  redis.call("set", k, ARGV[1], "PX", ARGV[2])
+  local p = string.match(k, "^(.-)_") or k
+  if not seen[p] then
+    seen[p] = true
+    local f = redis.call("incr", "fence:" .. p)
+    if f < floor then
+      redis.call("set", "fence:" .. p, ARGV[3])
+      f = floor
+    end
+    table.insert(fences, p)
+    table.insert(fences, f)
+  end
+end
+return fences
+"""
+
+EXTEND_SCRIPT = """
+for i, k in ipairs(KEYS) do
+  if redis.call("get", k) ~= ARGV[1] then return 0 end
+end
+for i, k in ipairs(KEYS) do
+  redis.call("pexpire", k, ARGV[2])
+end
+return 1
+"""
+
+UNLOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+  return redis.call("del", KEYS[1])
+else
+  return 0
+end
+"""
+
+UNLOCK_MANY_SCRIPT = """
+local n = 0
+for i, k in ipairs(KEYS) do
+  if redis.call("get", k) == ARGV[1] then n = n + redis.call("del", k) end
+end
+return n
+"""
+
+# fila FIFO de espera por chave (wait_ms); detalhes no comentário de coordenador/server.js
+RELEASE_CHANNEL = "lock-released"
+
+QUEUED_LOCK_SCRIPT = """
+local owner, ttl, ticket, wait_ttl = ARGV[1], ARGV[2], ARGV[3], tonumber(ARGV[4])
+redis.call("set", "lockticket:" .. ticket, 1, "PX", wait_ttl)
+local blocked = {0}
+for i, k in ipairs(KEYS) do
+  local q = "lockqueue:" .. k
+  if not redis.call("lpos", q, ticket) then redis.call("rpush", q, ticket) end
+  if redis.call("pttl", q) < wait_ttl then redis.call("pexpire", q, wait_ttl) end
+  while true do
+    local head = redis.call("lindex", q, 0)
+    if (not head) or head == ticket or redis.call("exists", "lockticket:" .. head) == 1 then break end
+    redis.call("lpop", q)
+  end
+  if redis.call("lindex", q, 0) ~= ticket or redis.call("exists", k) == 1 then table.insert(blocked, k) end
+end
+if #blocked > 1 then return blocked end
+for i, k in ipairs(KEYS) do
+  redis.call("lrem", "lockqueue:" .. k, 1, ticket)
+end
+redis.call("del", "lockticket:" .. ticket)
+local floor = tonumber(ARGV[5] or "0")
+local fences, seen = {1}, {}
+for i, k in ipairs(KEYS) do
+  redis.call("set", k, ARGV[1], "PX", ARGV[2])
+  local p = string.match(k, "^(.-)_") or k
+  if not seen[p] then
+    seen[p] = true
+    local f = redis.call("incr", "fence:" .. p)
+    if f < floor then
+      redis.call("set", "fence:" .. p, ARGV[5])
+      f = floor
+    end
+    table.insert(fences, p)
+    table.insert(fences, f)
+  end
+end
+return fences
+"""
+
+CANCEL_WAIT_SCRIPT = """
+for i, k in ipairs(KEYS) do
+  redis.call("lrem", "lockqueue:" .. k, 1, ARGV[1])
+end
+return redis.call("del", "lockticket:" .. ARGV[1])
+"""
+
+def _fence_floor():
+    # relógio em ms * 1000, como fenceFloor do coordenador: os tokens daqui e dos coordenadores
+    # continuam crescendo juntos mesmo que o contador do telescópio tenha ficado para trás
+    return int(time.time() * 1000) * 1000
+
+# argumentos de LOCK_MANY_SCRIPT e QUEUED_LOCK_SCRIPT, com o piso por último; usados também pelo
+# provedor assíncrono (async_locks.py), para os dois nunca divergirem
+def _lock_args(owner, ttl_ms):
+    return [owner, ttl_ms, _fence_floor()]
+
+def _queued_lock_args(owner, ttl_ms, ticket, left_ms):
+    # a ficha na fila vive um pouco além da espera restante
+    return [owner, ttl_ms, ticket, left_ms + 1000, _fence_floor()]
+
+class RedisLockProvider(LockProvider):
+    name = "redis"
+
+    def __init__(self, url=REDIS_URL, pool_size=REDIS_POOL_SIZE):
+        import redis  # dependência opcional: só é necessária com LOCK_PROVIDER=redis
+        # pool bloqueante compartilhado pelas threads do worker; o redis-py recria as conexões
+        # sozinho quando percebe que o pid mudou (fork do gunicorn)
+        self.pool = redis.BlockingConnectionPool.from_url(
+            url, max_connections=pool_size, timeout=REDIS_SOCKET_TIMEOUT, decode_responses=True,
+            socket_connect_timeout=REDIS_CONNECT_TIMEOUT, socket_timeout=REDIS_SOCKET_TIMEOUT,
+            health_check_interval=30)
+        self.redis = redis.Redis(connection_pool=self.pool)
+        # register_script: EVALSHA com o hash do script e SCRIPT LOAD automático no NOSCRIPT
+        self._lock_many = self.redis.register_script(LOCK_MANY_SCRIPT)
+        self._extend = self.redis.register_script(EXTEND_SCRIPT)
+        self._unlock = self.redis.register_script(UNLOCK_SCRIPT)
+        self._unlock_many = self.redis.register_script(UNLOCK_MANY_SCRIPT)
+        self._queued_lock = self.redis.register_script(QUEUED_LOCK_SCRIPT)
+        self._cancel_wait = self.redis.register_script(CANCEL_WAIT_SCRIPT)
+
+    def acquire(self, resource, ttl_ms, wait_ms=0):
+        keys = _keys(resource)
+        owner = str(uuid.uuid4())
+        try:
+            if wait_ms:
+                fences, held = self._wait(keys, owner, ttl_ms, wait_ms)
+            else:
+                # também para chave única (em vez de SET NX): o token de fencing sai na mesma operação
+                fences, held = _parse_grant(self._lock_many(keys=keys, args=_lock_args(owner, ttl_ms)))
+        except Exception as e:
+            logger.error(f"[LOCK-ERROR] {e}")
+            return False, {"error": "redis-unreachable", "detail": str(e)}
+        if held:
+            return False, {"error": "locked", "resources": held}
+        return True, {"owner": owner, "resources": keys, "expiresAt": int(time.time() * 1000) + ttl_ms, "fences": fences}
+
+    def _wait(self, keys, owner, ttl_ms, wait_ms):
+        # mesma fila do coordenador; aqui a re-tentativa é só por polling (sem SUBSCRIBE por pedido)
+        ticket = str(uuid.uuid4())
+        deadline = time.monotonic() + wait_ms / 1000.0
+        while True:
+            left_ms = max(int((deadline - time.monotonic()) * 1000), 0)
+            fences, held = _parse_grant(self._queued_lock(keys=keys, args=_queued_lock_args(owner, ttl_ms, ticket, left_ms)))
+            if not held:
+                return fences, []
+            if left_ms <= 0:
+                self._cancel_wait(keys=keys, args=[ticket])
+                self.redis.publish(RELEASE_CHANNEL, "\n".join(keys))
+                return None, held
+            time.sleep(min(LOCK_WAIT_POLL_MS, left_ms) / 1000.0)
+
+    def release(self, resource, owner):
+        keys = _keys(resource)
+        try:
+            if len(keys) == 1:
+                released = self._unlock(keys=keys, args=[owner]) == 1
+            else:
+                released = self._unlock_many(keys=keys, args=[owner]) > 0
+            if released:
+                # acorda quem espera na fila pelo coordenador
+                self.redis.publish(RELEASE_CHANNEL, "\n".join(keys))
+            return released
+        except Exception as e:
+            logger.warning(f"[UNLOCK-ERR] {e}")
+            return False
+
+    def extend(self, resource, owner, ttl_ms):
+        try:
+            return self._extend(keys=_keys(resource), args=[owner, ttl_ms]) == 1
+        except Exception as e:
+            logger.warning(f"[EXTEND-ERR] {e}")
+            return None
+
+    def list_locks(self, cursor=None, limit=100, prefix=None):
+        # mesmo algoritmo do GET /locks do coordenador: SCAN com MATCH no prefixo + GET/PTTL num pipeline
+        match = re.sub(r"([*?\[\]\\])", r"\\\1", prefix or LOCK_KEY_PREFIX) + "*"
+        cursor, keys = int(cursor or 0), []
+        while True:
+            cursor, page = self.redis.scan(cursor, match=match, count=limit)
+            keys.extend(page)
+            if cursor == 0 or len(keys) >= limit:
+                break
+        pipe = self.redis.pipeline(transaction=False)
+        for k in keys:
+            pipe.get(k)
+            pipe.pttl(k)
+        replies = pipe.execute() if keys else []
+        items = [{"resource": k, "owner": replies[2 * i], "ttl_ms": replies[2 * i + 1]} for i, k in enumerate(keys)
+                 if replies[2 * i] is not None and replies[2 * i + 1] != -2]
+        return {"items": items, "next_cursor": str(cursor) if cursor else None}, 200
+
+PROVIDERS = {cls.name: cls for cls in (HttpCoordinatorProvider, LocalLockProvider, RedisLockProvider)}
+
+_provider = None
+_provider_lock = threading.Lock()
+
+def get_provider():
+    global _provider
+    if _provider is None:
+        with _provider_lock:
+            if _provider is None:
+                if LOCK_PROVIDER not in PROVIDERS:
+                    raise ValueError(f"LOCK_PROVIDER inválido: {LOCK_PROVIDER}")
+                _provider = PROVIDERS[LOCK_PROVIDER]()
+                logger.info(f"[LOCK-PROVIDER] {_provider.name}")
+    return _provider
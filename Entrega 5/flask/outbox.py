@@ -0,0 +1,23 @@
+# flask/outbox.py
+# Leitura da tabela outbox (app.OutboxEvent) pelos seus consumidores: o read model (read_model.py)
+# e o relay para Redis Streams (outbox_relay.py). Cada um guarda o próprio offset (último id
+# aplicado/publicado) e pede os eventos seguintes com fetch_events(after_id, limit).
+# Os dois podam a tabela (prune) a cada OUTBOX_PRUNE_INTERVAL_S: sai o que todos os consumidores
+# ligados já leram e é mais velho que OUTBOX_RETENTION_S (_outbox_prune em app.py).
+import os, time
+
+OUTBOX_RETENTION_S = int(os.environ.get("OUTBOX_RETENTION_S", "86400"))
+OUTBOX_PRUNE_INTERVAL_S = 60
+
+def contiguous(events, last, gap_s):
+    # prefixo de events que pode ser consumido depois do offset last. Um buraco na sequência de ids
+    # pode ser uma transação que ainda vai commitar (BDs com sequence); ela ganha gap_s segundos
+    # contados do created_at do evento seguinte, depois disso o id é dado como descartado (rollback)
+    out = []
+    for event in events:
+        event_id, created_at = event[0], event[-1]
+        if event_id != last + 1 and time.time() - created_at < gap_s:
+            break
+        out.append(event)
+        last = event_id
+    return out
@@ -0,0 +1,152 @@
+# flask/outbox_relay.py
+# Relay da outbox para Redis Streams (OUTBOX_RELAY=1). Uma thread por worker lê os eventos da
+# tabela outbox depois do offset do relay e publica o lote no stream OUTBOX_STREAM com um script
+# Lua que confere e avança o offset (guardado no Redis, em "<stream>:relay-offset") na mesma
+# operação: cada evento entra no stream uma vez, com id "<id da outbox>-0", mesmo com vários
+# workers rodando o relay. Consumidores usam grupos do Redis Streams (StreamConsumer), que guardam
+# o offset de cada grupo no próprio Redis; eventos sem XACK são reentregues.
+# O que já foi publicado (e aplicado pelo read model, se ligado) e é mais velho que
+# OUTBOX_RETENTION_S sai da tabela outbox.
+import json, logging, os, threading, time
+from prometheus_client import Counter, Gauge
+from outbox import contiguous, OUTBOX_RETENTION_S, OUTBOX_PRUNE_INTERVAL_S
+
+OUTBOX_RELAY = os.environ.get("OUTBOX_RELAY", "0") == "1"
+OUTBOX_REDIS_URL = os.environ.get("OUTBOX_REDIS_URL") or os.environ.get("REDIS_URL", "redis://redis:6379")
+OUTBOX_STREAM = os.environ.get("OUTBOX_STREAM", "agendamentos:eventos")
+OUTBOX_STREAM_MAXLEN = int(os.environ.get("OUTBOX_STREAM_MAXLEN", "1000000"))  # aproximado (MAXLEN ~)
+OUTBOX_RELAY_BATCH = int(os.environ.get("OUTBOX_RELAY_BATCH", "200"))
+OUTBOX_RELAY_POLL_MS = int(os.environ.get("OUTBOX_RELAY_POLL_MS", "50"))
+OUTBOX_GAP_MS = int(os.environ.get("OUTBOX_GAP_MS", "5000"))
+
+logger = logging.getLogger("servico-agendamento")
+
+OUTBOX_PUBLISHED = Counter("outbox_events_published_total", "Outbox events published to the Redis stream")
+OUTBOX_RELAY_LAG = Gauge("outbox_relay_lag_seconds", "Time since the relay last had every committed outbox event published",
+                         multiprocess_mode="livemin")
+OUTBOX_RELAY_ERRORS = Counter("outbox_relay_errors_total", "Relay iterations that failed (Redis or database error)")
+
+# KEYS[1] = offset do relay, KEYS[2] = stream; ARGV[1] = offset lido, ARGV[2] = MAXLEN, depois
+# (id, tipo, payload, created_at) por evento. Se outro relay já avançou o offset, não publica nada
+PUBLISH_SCRIPT = """
+local cur = tonumber(redis.call("get", KEYS[1]) or "0")
+if cur ~= tonumber(ARGV[1]) then
+  return {0, cur}
+end
+local last = cur
+for i = 3, #ARGV, 4 do
+  redis.call("xadd", KEYS[2], "MAXLEN", "~", ARGV[2], ARGV[i] .. "-0",
+             "type", ARGV[i + 1], "payload", ARGV[i + 2], "created_at", ARGV[i + 3])
+  last = tonumber(ARGV[i])
+end
+redis.call("set", KEYS[1], last)
+return {1, last}
+"""
+
+class OutboxRelay:
+    # fetch_events(after_id, limit) como no read model; prune(up_to_id, older_than_epoch) apaga da
+    # outbox o que já foi publicado
+    def __init__(self, fetch_events, prune=None, redis_url=OUTBOX_REDIS_URL, stream=OUTBOX_STREAM,
+                 batch=OUTBOX_RELAY_BATCH, poll_ms=OUTBOX_RELAY_POLL_MS, gap_ms=OUTBOX_GAP_MS,
+                 maxlen=OUTBOX_STREAM_MAXLEN, retention_s=OUTBOX_RETENTION_S):
+        self._fetch = fetch_events
+        self._prune = prune
+        self.redis_url = redis_url
+        self.stream = stream
+        self.offset_key = f"{stream}:relay-offset"
+        self.batch = batch
+        self.poll_s = poll_ms / 1000.0
+        self.gap_s = gap_ms / 1000.0
+        self.maxlen = maxlen
+        self.retention_s = retention_s
+        self._redis = None
+        self._pid = None
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._caught_up_at = time.time()
+        self._next_prune = 0.0
+
+    def _client(self):
+        # (cliente, script de publicação), recriados se o pid mudou (fork)
+        if self._redis is None or self._pid != os.getpid():
+            import redis  # dependência opcional: só com OUTBOX_RELAY=1
+            client = redis.Redis.from_url(self.redis_url, decode_responses=True,
+                                          socket_connect_timeout=1.0, socket_timeout=2.0)
+            self._redis = (client, client.register_script(PUBLISH_SCRIPT))
+            self._pid, self._thread = os.getpid(), None
+        return self._redis
+
+    @property
+    def redis(self):
+        return self._client()[0]
+
+    def offset(self):
+        return int(self.redis.get(self.offset_key) or 0)
+
+    def run_once(self):
+        # publica um lote; devolve quantos eventos entraram no stream
+        started = time.time()
+        offset = self.offset()
+        fetched = self._fetch(offset, self.batch)
+        events = contiguous(fetched, offset, self.gap_s)
+        if events:
+            args = [offset, self.maxlen]
+            for event_id, event_type, payload, created_at in events:
+                args += [event_id, event_type, json.dumps(payload), repr(created_at)]
+            ok, offset = self._client()[1](keys=[self.offset_key, self.stream], args=args)
+            if not ok:
+                return 0  # outro worker publicou este trecho; a próxima volta lê o offset novo
+            OUTBOX_PUBLISHED.inc(len(events))
+        if len(events) == len(fetched) < self.batch:
+            self._caught_up_at = started
+        OUTBOX_RELAY_LAG.set(time.time() - self._caught_up_at)
+        if self._prune is not None and started >= self._next_prune:
+            self._next_prune = started + OUTBOX_PRUNE_INTERVAL_S
+            self._prune(offset, started - self.retention_s)
+        return len(events)
+
+    def ensure_started(self):
+        self.redis  # recria cliente/thread se o pid mudou (fork)
+        if self._thread is None or not self._thread.is_alive():
+            with self._start_lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name="outbox-relay", daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                n = self.run_once()
+            except Exception as e:
+                OUTBOX_RELAY_ERRORS.inc()
+                logger.error(f"[OUTBOX-RELAY-ERR] {e}")
+                n = 0
+            if n < self.batch:
+                time.sleep(self.poll_s)
+
+class StreamConsumer:
+    # consumidor downstream num grupo: o Redis guarda o offset do grupo e os pendentes de cada
+    # consumidor. read() devolve primeiro o que este consumidor recebeu e não confirmou (queda
+    # antes do ack), depois eventos novos; ack() confirma. Eventos: (id da outbox, tipo, payload, created_at)
+    def __init__(self, redis_client, group, name, stream=OUTBOX_STREAM, start_id="0"):
+        self.redis, self.group, self.name, self.stream = redis_client, group, name, stream
+        try:
+            self.redis.xgroup_create(stream, group, id=start_id, mkstream=True)
+        except Exception as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    def read(self, count=100, block_ms=1000):
+        entries = self._read("0", count, None)
+        if not entries:
+            entries = self._read(">", count, block_ms)
+        return [(int(entry_id.split("-")[0]), f["type"], json.loads(f["payload"]), float(f["created_at"]))
+                for entry_id, f in entries]
+
+    def _read(self, start, count, block_ms):
+        resp = self.redis.xreadgroup(self.group, self.name, {self.stream: start}, count=count, block=block_ms)
+        return resp[0][1] if resp else []
+
+    def ack(self, event_ids):
+        if event_ids:
+            self.redis.xack(self.stream, self.group, *[f"{i}-0" for i in event_ids])
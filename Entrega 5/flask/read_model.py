@@ -0,0 +1,199 @@
+# flask/read_model.py
+# Read model das consultas (READ_MODEL=1): cópia das tabelas agendamentos e cache_versions num
+# arquivo SQLite separado (READ_MODEL_PATH), alimentada pela tabela outbox do BD principal. Cada
+# create/cancel grava o evento na outbox na mesma transação (record_change em app.py); uma thread
+# por worker aplica os eventos em ordem de id, junto com o checkpoint, numa transação do read model.
+# Os GETs leem daqui enquanto o atraso (read_model_lag_seconds) ficar abaixo de READ_MODEL_MAX_LAG_MS;
+# acima disso voltam para o BD principal. Assim relatórios pesados não disputam o arquivo de escrita.
+# O schema é o mesmo do BD principal, então as consultas de app.py (_page, _load_busy, cache_version)
+# rodam aqui sem mudança.
+# Tabelas de referência (telescopios, para o 404 da disponibilidade) não passam pela outbox: são
+# copiadas inteiras no snapshot e de novo a cada READ_MODEL_REFERENCE_REFRESH_S pelo projetor, então
+# um telescópio novo aparece aqui com até esse atraso.
+import logging, os, threading, time
+from datetime import datetime
+from sqlalchemy import Column, Float, Integer, MetaData, Table, create_engine, select
+from sqlalchemy.dialects.sqlite import insert
+from prometheus_client import Counter, Gauge
+import db_config
+from outbox import contiguous, OUTBOX_RETENTION_S, OUTBOX_PRUNE_INTERVAL_S
+
+READ_MODEL = os.environ.get("READ_MODEL", "0") == "1"
+READ_MODEL_PATH = os.environ.get("READ_MODEL_PATH", "read_model.db")
+READ_MODEL_POLL_MS = int(os.environ.get("READ_MODEL_POLL_MS", "50"))
+READ_MODEL_BATCH = int(os.environ.get("READ_MODEL_BATCH", "500"))
+READ_MODEL_MAX_LAG_MS = int(os.environ.get("READ_MODEL_MAX_LAG_MS", "1000"))
+READ_MODEL_GAP_MS = int(os.environ.get("READ_MODEL_GAP_MS", "5000"))
+READ_MODEL_REFERENCE_REFRESH_S = float(os.environ.get("READ_MODEL_REFERENCE_REFRESH_S", "60"))
+
+logger = logging.getLogger("servico-agendamento")
+
+READ_MODEL_LAG = Gauge("read_model_lag_seconds", "Age of the newest outbox state known to be in the read model",
+                       multiprocess_mode="livemax")
+READ_MODEL_APPLIED = Counter("read_model_events_applied_total", "Outbox events applied to the read model")
+READ_MODEL_READS = Counter("read_model_reads_total", "GET queries by the store that served them", ["source"])
+
+_meta = MetaData()
+# uma linha: último evento aplicado e quando (relógio de parede) o read model estava em dia
+checkpoint = Table("read_model_checkpoint", _meta,
+                   Column("id", Integer, primary_key=True),
+                   Column("last_event", Integer, nullable=False),
+                   Column("caught_up_at", Float, nullable=False))
+
+def _dt(s):
+    return datetime.fromisoformat(s) if s else None
+
+class ReadModel:
+    # fetch_events(after_id, limit) -> [(id, tipo, payload, created_at em epoch)] em ordem de id,
+    #   payload com a linha inteira do agendamento + "version" do telescópio depois da mudança
+    # snapshot() -> (último id da outbox, [linhas], {telescopio_id: versão}) para o primeiro start
+    # prune(up_to_id, older_than_epoch) apaga da outbox o que já foi aplicado (sem ele, com o relay
+    # desligado, a outbox cresceria para sempre)
+    # reference_tables + load_reference(tabela) -> [linhas]: tabelas copiadas inteiras do BD principal
+    def __init__(self, path, tables, fetch_events, snapshot, prune=None, poll_ms=READ_MODEL_POLL_MS, batch=READ_MODEL_BATCH,
+                 max_lag_ms=READ_MODEL_MAX_LAG_MS, gap_ms=READ_MODEL_GAP_MS, retention_s=OUTBOX_RETENTION_S,
+                 reference_tables=(), load_reference=None, reference_refresh_s=READ_MODEL_REFERENCE_REFRESH_S):
+        self.path = path
+        self.agendamentos, self.versions = tables
+        self.reference_tables = tuple(reference_tables)
+        self._load_reference = load_reference
+        self.reference_refresh_s = reference_refresh_s
+        self._next_reference = 0.0
+        self._fetch = fetch_events
+        self._snapshot = snapshot
+        self._prune = prune
+        self.retention_s = retention_s
+        self._next_prune = 0.0
+        self.poll_s = poll_ms / 1000.0
+        self.batch = batch
+        self.max_lag_s = max_lag_ms / 1000.0
+        self.gap_s = gap_ms / 1000.0
+        self._engine = None
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    @property
+    def engine(self):
+        if self._engine is None or self._pid != os.getpid():
+            engine = create_engine(f"sqlite:///{self.path}")
+            db_config.configure_engine(engine)
+            for t in (self.agendamentos, self.versions, checkpoint, *self.reference_tables):
+                t.create(engine, checkfirst=True)
+            self._engine, self._pid, self._thread = engine, os.getpid(), None
+        return self._engine
+
+    def connect(self):
+        return self.engine.connect()
+
+    def lag_s(self):
+        # tudo o que foi gravado no BD principal antes de caught_up_at já está aqui
+        with self.engine.connect() as conn:
+            caught_up_at = conn.execute(select(checkpoint.c.caught_up_at)).scalar()
+        return float("inf") if caught_up_at is None else max(time.time() - caught_up_at, 0.0)
+
+    def last_event(self):
+        # último id da outbox já aplicado (0 antes do snapshot)
+        with self.engine.connect() as conn:
+            return conn.execute(select(checkpoint.c.last_event)).scalar() or 0
+
+    def fresh(self):
+        return self.lag_s() <= self.max_lag_s
+
+    def run_once(self):
+        # aplica um lote; devolve quantos eventos entraram. BEGIN IMMEDIATE serializa os projetores
+        # dos vários workers: quem chega depois vê o checkpoint novo e não repete nada
+        started = time.time()
+        with self.engine.connect() as conn:
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+            last = conn.execute(select(checkpoint.c.last_event)).scalar()
+            if last is None:
+                return self._bootstrap(conn, started)
+            events = self._fetch(last, self.batch)
+            applied = contiguous(events, last, self.gap_s)
+            self._apply(conn, [payload for _, _, payload, _ in applied])
+            values = {"last_event": applied[-1][0] if applied else last}
+            if len(applied) == len(events) < self.batch:
+                values["caught_up_at"] = started
+            conn.execute(checkpoint.update().values(**values))
+            conn.commit()
+            lag = time.time() - conn.execute(select(checkpoint.c.caught_up_at)).scalar()
+        READ_MODEL_LAG.set(lag)
+        READ_MODEL_APPLIED.inc(len(applied))
+        if self._prune is not None and started >= self._next_prune:
+            self._next_prune = started + OUTBOX_PRUNE_INTERVAL_S
+            self._prune(values["last_event"], started - self.retention_s)
+        if started >= self._next_reference:
+            self.refresh_reference()
+        return len(applied)
+
+    def refresh_reference(self):
+        # troca o conteúdo de cada tabela de referência numa transação: quem lê vê a cópia velha ou a nova
+        self._next_reference = time.time() + self.reference_refresh_s
+        if self._load_reference is None:
+            return
+        rows = {t: self._load_reference(t) for t in self.reference_tables}
+        with self.engine.begin() as conn:
+            for t, table_rows in rows.items():
+                conn.execute(t.delete())
+                if table_rows:
+                    conn.execute(t.insert(), table_rows)
+
+    def _bootstrap(self, conn, started):
+        last, rows, versions = self._snapshot()
+        self._apply(conn, [{**r, "version": None} for r in rows])
+        self._apply_versions(conn, versions)
+        conn.execute(checkpoint.insert().values(id=1, last_event=last, caught_up_at=started))
+        conn.commit()
+        self.refresh_reference()
+        logger.info(f"[READ-MODEL] snapshot rows={len(rows)} last_event={last}")
+        return len(rows)
+
+    def _apply(self, conn, payloads):
+        if not payloads:
+            return
+        # o id dos eventos é crescente, então o último estado de cada agendamento vence
+        rows = {}
+        versions = {}
+        for p in payloads:
+            rows[p["id"]] = {"id": p["id"], "cientista_id": p["cientista_id"], "telescopio_id": p["telescopio_id"],
+                             "horario_inicio_utc": _dt(p["horario_inicio_utc"]),
+                             "horario_fim_utc": _dt(p["horario_fim_utc"]), "status": p["status"]}
+            if p.get("version") is not None:
+                versions[p["telescopio_id"]] = p["version"]
+        stmt = insert(self.agendamentos)
+        conn.execute(stmt.on_conflict_do_update(index_elements=["id"], set_={
+            c: stmt.excluded[c] for c in ("cientista_id", "telescopio_id", "horario_inicio_utc", "horario_fim_utc", "status")
+        }), list(rows.values()))
+        self._apply_versions(conn, versions)
+
+    def _apply_versions(self, conn, versions):
+        if not versions:
+            return
+        stmt = insert(self.versions)
+        conn.execute(stmt.on_conflict_do_update(index_elements=["telescopio_id"], set_={"version": stmt.excluded.version}),
+                     [{"telescopio_id": t, "version": v} for t, v in versions.items()])
+
+    def ensure_started(self):
+        self.engine  # recria engine/thread se o pid mudou (fork)
+        if self._thread is None or not self._thread.is_alive():
+            with self._start_lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name="read-model", daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                n = self.run_once()
+            except Exception as e:
+                logger.error(f"[READ-MODEL-ERR] {e}")
+                n = 0
+            if n < self.batch:
+                time.sleep(self.poll_s)
+
+    def reset(self):
+        # apaga o read model (testes): o próximo run_once refaz o snapshot
+        with self.engine.begin() as conn:
+            for t in (self.agendamentos, self.versions, checkpoint, *self.reference_tables):
+                conn.execute(t.delete())
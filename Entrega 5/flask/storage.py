@@ -0,0 +1,97 @@
+# flask/storage.py
+# Backend de armazenamento dos agendamentos.
+#   STORAGE_MODE=lock   -> lock no coordenador + verificação de conflito no BD (padrão)
+#   STORAGE_MODE=native -> o próprio BD recusa sobreposições e create_agendamento vira um INSERT:
+#       PostgreSQL: EXCLUDE USING gist (telescopio_id WITH =, tsrange(inicio, fim) WITH &&)
+#       SQLite:     triggers BEFORE INSERT/UPDATE equivalentes (escritas já são serializadas
+#                   pelo lock de escrita do arquivo, então a verificação no trigger é atômica)
+import os
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql, sqlite
+
+STORAGE_MODE = os.environ.get("STORAGE_MODE", "lock")
+
+OVERLAP_MARKER = "agendamento_sobreposto"
+EXCLUSION_NAME = "ex_agendamentos_sem_sobreposicao"
+
+class Storage:
+    dialect = None
+    # insert() do dialeto, com on_conflict_do_update (upsert atômico: INSERT ... ON CONFLICT)
+    insert = None
+
+    def __init__(self, mode=STORAGE_MODE):
+        if mode not in ("lock", "native"):
+            raise ValueError(f"STORAGE_MODE inválido: {mode}")
+        self.mode = mode
+
+    @property
+    def native_exclusion(self):
+        return self.mode == "native"
+
+    def install(self, engine):
+        # DDL extra do modo native; idempotente (chamado em todo init_db)
+        pass
+
+    def is_overlap_error(self, exc):
+        return False
+
+class SQLiteStorage(Storage):
+    dialect = "sqlite"
+    insert = staticmethod(sqlite.insert)
+
+    def _overlap_trigger(self, event, when, exclude_self):
+        return f"""
+        CREATE TRIGGER IF NOT EXISTS tg_agendamentos_sem_sobreposicao_{event.split()[0].lower()}
+        BEFORE {event} ON agendamentos
+        WHEN {when}
+        BEGIN
+            SELECT RAISE(ABORT, '{OVERLAP_MARKER}') FROM agendamentos
+            WHERE telescopio_id = NEW.telescopio_id AND status = 'CONFIRMED'
+              AND horario_inicio_utc < NEW.horario_fim_utc AND horario_fim_utc > NEW.horario_inicio_utc
+              {"AND id != NEW.id" if exclude_self else ""};
+        END
+        """
+
+    def install(self, engine):
+        if not self.native_exclusion:
+            return
+        with engine.begin() as conn:
+            conn.execute(text(self._overlap_trigger("INSERT", "NEW.status = 'CONFIRMED'", False)))
+            conn.execute(text(self._overlap_trigger(
+                "UPDATE OF status, telescopio_id, horario_inicio_utc, horario_fim_utc",
+                "NEW.status = 'CONFIRMED'", True)))
+
+    def is_overlap_error(self, exc):
+        return OVERLAP_MARKER in str(getattr(exc, "orig", exc))
+
+class PostgresStorage(Storage):
+    dialect = "postgresql"
+    insert = staticmethod(postgresql.insert)
+
+    def install(self, engine):
+        if not self.native_exclusion:
+            return
+        with engine.begin() as conn:
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS btree_gist"))
+            exists = conn.execute(text("SELECT 1 FROM pg_constraint WHERE conname = :n"), {"n": EXCLUSION_NAME}).scalar()
+            if not exists:
+                # as colunas são DateTime sem fuso (UTC), por isso tsrange e não tstzrange
+                conn.execute(text(f"""
+                    ALTER TABLE agendamentos ADD CONSTRAINT {EXCLUSION_NAME}
+                    EXCLUDE USING gist (
+                        telescopio_id WITH =,
+                        tsrange(horario_inicio_utc, horario_fim_utc) WITH &&
+                    ) WHERE (status = 'CONFIRMED')
+                """))
+
+    def is_overlap_error(self, exc):
+        orig = getattr(exc, "orig", exc)
+        code = getattr(orig, "pgcode", None) or getattr(orig, "sqlstate", None)
+        return code == "23P01" or EXCLUSION_NAME in str(orig)  # exclusion_violation
+
+BACKENDS = {cls.dialect: cls for cls in (SQLiteStorage, PostgresStorage)}
+
+def get_storage(dialect, mode=STORAGE_MODE):
+    if dialect not in BACKENDS:
+        raise ValueError(f"sem backend de armazenamento para o dialeto {dialect}")
+    return BACKENDS[dialect](mode)
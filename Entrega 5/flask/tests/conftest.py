@@ -0,0 +1,41 @@
+import os, sys, tempfile
+
+# o app lê a configuração do ambiente no import: aponta o BD para um arquivo temporário
+_tmp = tempfile.mkdtemp(prefix='agendamento-test-')
+os.environ.setdefault("SQLITE_PATH", f"sqlite:///{os.path.join(_tmp, 'test.db')}")
+# locks em processo (tabela local com TTL): os testes não dependem do coordenador nem do Redis
+os.environ.setdefault("LOCK_PROVIDER", "local")
+os.environ.setdefault("LOCAL_LOCK_PATH", os.path.join(_tmp, "locks.db"))
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sqlite3
+
+import pytest
+
+@pytest.fixture()
+def client(monkeypatch):
+    # BD recriado e semeado, caches vazios e locks de verdade pelo provedor local (LOCK_PROVIDER acima).
+    # acquire_lock só é envolvido para contar as chamadas (client.lock_calls)
+    import app as app_module
+    from app import app, db
+    app_module.get_lock_provider()  # cria a tabela de locks
+    with sqlite3.connect(os.environ["LOCAL_LOCK_PATH"]) as conn:
+        conn.execute("DELETE FROM locks")  # nada sobra de outro teste
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        app_module.seed()
+    app_module.conflict_cache.clear()
+    app_module.availability_cache.clear()
+    app_module.idempotency_store.clear()
+    calls, acquire = [], app_module.acquire_lock
+
+    def counting_acquire(resource, *a, **kw):
+        calls.append(resource)
+        return acquire(resource, *a, **kw)
+
+    monkeypatch.setattr(app_module, "acquire_lock", counting_acquire)
+    c = app.test_client()
+    c.lock_calls = calls
+    return c
@@ -1,9 +1,15 @@
-import requests
+import threading
 from concurrent.futures import ThreadPoolExecutor
-import time
+from datetime import datetime
 
-BASE = "http://localhost:5000"
+import pytest
 
+import app as app_module
+from app import app, db
+from lock_keys import lock_resources
+from lock_providers import get_provider
+
+# roda em processo com o test client e LOCK_PROVIDER=local (conftest), sem coordenador nem Redis
 PAY = {
     "cientista_id": 1,
     "telescopio_id": 1,
@@ -11,21 +17,25 @@ PAY = {
     "horario_fim_utc": "2025-01-01T02:00:00Z"
 }
 
-def test_basic():
-    r = requests.get(f"{BASE}/time")
+@pytest.fixture()
+def client():
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        app_module.seed()
+    app_module.conflict_cache.clear()
+    return app
+
+def test_basic(client):
+    r = client.test_client().get("/time")
     assert r.status_code == 200
 
-def test_concurrent():
-    time.sleep(0.5)  # tempo para serviços ficarem de pé
-
+def test_concurrent(client):
     def p():
-        return requests.post(f"{BASE}/agendamentos", json=PAY, timeout=5)
+        return client.test_client().post("/agendamentos", json=PAY)
 
-    results = []
     with ThreadPoolExecutor(max_workers=10) as ex:
-        futures = [ex.submit(p) for _ in range(10)]
-        for f in futures:
-            results.append(f.result())
+        results = list(ex.map(lambda _: p(), range(10)))
 
     # extração dos códigos
     codes = [r.status_code for r in results]
@@ -41,3 +51,12 @@ def test_concurrent():
 
     assert created == 1
     assert conflicts == 9
+
+def test_wait_ms_succeeds_after_holder_releases(client):
+    # lock da mesma chave segurado por outro pedido: com ?wait_ms= espera em vez de 409
+    key = lock_resources(1, datetime(2025, 1, 1), datetime(2025, 1, 1, 2))[0]
+    _, held = get_provider().acquire(key, 10000)
+    c = client.test_client()
+    assert c.post("/agendamentos", json=PAY).status_code == 409
+    threading.Timer(0.2, get_provider().release, args=(key, held["owner"])).start()
+    assert c.post("/agendamentos?wait_ms=3000", json=PAY).status_code == 201
@@ -0,0 +1,25 @@
+import json
+
+from audit import AuditWriter, AUDIT_DROPPED
+
+def test_writes_logging_md_lines_and_flushes_on_close(tmp_path):
+    path = tmp_path / "audit.log"
+    w = AuditWriter(path=str(path), flush_ms=5, fsync="batch")
+    for i in range(50):
+        w.emit("AGENDAMENTO_CRIADO", {"id": i})
+    w.close()
+    lines = path.read_text().splitlines()
+    assert len(lines) == 50
+    ev = json.loads(lines[0])
+    assert set(ev) == {"timestamp_utc", "level", "event_type", "service", "details"}
+    assert ev["level"] == "AUDIT" and ev["timestamp_utc"].endswith("Z")
+    assert [json.loads(l)["details"]["id"] for l in lines] == list(range(50))
+
+def test_full_queue_drops_instead_of_blocking(tmp_path):
+    w = AuditWriter(path=str(tmp_path / "audit.log"), queue_size=2)
+    w._thread = object()  # writer "ocupado": nada é drenado
+    dropped = AUDIT_DROPPED._value.get()
+    assert w.emit("E", {}) and w.emit("E", {})
+    assert not w.emit("E", {})
+    assert AUDIT_DROPPED._value.get() - dropped == 1
+    assert w.depth() == 2
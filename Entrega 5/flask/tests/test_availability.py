@@ -0,0 +1,58 @@
+from datetime import datetime, timedelta
+
+import app as app_module
+from availability import free_gaps, split_by_day, join_days
+
+D = datetime(2033, 3, 1)
+
+def h(hours):
+    return D + timedelta(hours=hours)
+
+def test_free_gaps_merges_overlapping_busy():
+    busy = [(h(-2), h(1)), (h(2), h(4)), (h(3), h(5)), (h(8), h(30))]
+    assert free_gaps(busy, h(0), h(10)) == [(h(1), h(2)), (h(5), h(8))]
+    assert free_gaps([], h(0), h(1)) == [(h(0), h(1))]
+
+def test_days_split_and_join_back():
+    gaps = [(h(20), h(52))]
+    per_day = split_by_day(gaps, D, 3)
+    assert per_day == [[(h(20), h(24))], [(h(24), h(48))], [(h(48), h(52))]]
+    assert join_days(per_day, h(21), h(60), timedelta(hours=1)) == [(h(21), h(52))]
+    assert join_days(per_day, h(0), h(72), timedelta(hours=40)) == []
+
+def book(c, a, b):
+    r = c.post("/agendamentos", json={"cientista_id": 1, "telescopio_id": 1,
+                                      "horario_inicio_utc": app_module._iso(a), "horario_fim_utc": app_module._iso(b)})
+    assert r.status_code == 201
+    return r.get_json()["id"]
+
+def get(c, a, b, headers=None, **params):
+    return c.get("/telescopios/1/disponibilidade", headers=headers,
+                 query_string={"from": app_module._iso(a), "to": app_module._iso(b), **params})
+
+def test_gaps_across_midnight_and_min_duration(client):
+    book(client, h(2), h(4))
+    book(client, h(23), h(25))
+    book(client, h(26), h(26.5))
+    r = get(client, h(0), h(48))
+    assert r.status_code == 200
+    assert r.get_json()["livres"] == [[app_module._iso(a), app_module._iso(b)] for a, b in
+                                      [(h(0), h(2)), (h(4), h(23)), (h(25), h(26)), (h(26.5), h(48))]]
+    r = get(client, h(0), h(48), min_duration=120)
+    assert [x[0] for x in r.get_json()["livres"]] == [app_module._iso(h(0)), app_module._iso(h(4)), app_module._iso(h(26.5))]
+
+def test_etag_and_invalidation_on_create_and_cancel(client):
+    ag = book(client, h(2), h(4))
+    r1 = get(client, h(0), h(24))
+    etag = r1.headers["ETag"]
+    assert get(client, h(0), h(24), headers={"If-None-Match": etag}).status_code == 304
+    book(client, h(10), h(11))
+    r2 = get(client, h(0), h(24), headers={"If-None-Match": etag})
+    assert r2.status_code == 200 and len(r2.get_json()["livres"]) == 3
+    client.post(f"/agendamentos/{ag}/cancel")
+    assert get(client, h(0), h(24)).get_json()["livres"][0] == [app_module._iso(h(0)), app_module._iso(h(10))]
+
+def test_invalid_requests(client):
+    assert get(client, h(5), h(1)).status_code == 400
+    assert get(client, h(0), h(24 * 60)).status_code == 400
+    assert client.get("/telescopios/999/disponibilidade").status_code == 404
@@ -0,0 +1,51 @@
+from datetime import datetime, timedelta
+
+import app as app_module
+from app import app, Agendamento
+
+T0 = datetime(2030, 6, 1)
+
+def item(h0, h1, tel=1):
+    return {"cientista_id": 1, "telescopio_id": tel,
+            "horario_inicio_utc": (T0 + timedelta(hours=h0)).isoformat() + "Z",
+            "horario_fim_utc": (T0 + timedelta(hours=h1)).isoformat() + "Z"}
+
+def count():
+    with app.app_context():
+        return Agendamento.query.count()
+
+def test_batch_creates_all_with_one_lock_call(client):
+    r = client.post("/agendamentos/batch", json={"items": [item(0, 1), item(1, 2), item(0, 1, tel=2)]})
+    assert r.status_code == 201
+    assert [x["status"] for x in r.get_json()["results"]] == [201, 201, 201]
+    assert len(client.lock_calls) == 1
+    assert count() == 3
+
+def test_all_or_nothing_aborts_on_conflict(client):
+    client.post("/agendamentos", json=item(5, 6))
+    r = client.post("/agendamentos/batch", json={"items": [item(0, 1), item(5, 7)]})
+    assert r.status_code == 409
+    assert [x["status"] for x in r.get_json()["results"]] == [409, 409]
+    assert count() == 1
+
+def test_best_effort_reports_per_item(client):
+    client.post("/agendamentos", json=item(5, 6))
+    r = client.post("/agendamentos/batch", json={"mode": "best_effort",
+                                                  "items": [item(0, 1), item(5, 7), item(0, 2), {"telescopio_id": 1}]})
+    assert r.status_code == 207
+    assert [x["status"] for x in r.get_json()["results"]] == [201, 409, 409, 400]
+    assert count() == 2
+
+def test_best_effort_drops_items_on_held_locks(client):
+    # outro pedido segurando as chaves do primeiro item
+    assert app_module.get_lock_provider().acquire(app_module.lock_resources(1, T0, T0 + timedelta(hours=1)), 60000)[0]
+    r = client.post("/agendamentos/batch", json={"mode": "best_effort", "items": [item(0, 1), item(3, 4)]})
+    assert [x["status"] for x in r.get_json()["results"]] == [409, 201]
+    assert len(client.lock_calls) == 2
+
+def test_ids_must_be_integers(client):
+    r = client.post("/agendamentos/batch", json={"mode": "best_effort",
+                                                  "items": [item(0, 1), {**item(2, 3), "telescopio_id": "1"}]})
+    assert [x["status"] for x in r.get_json()["results"]] == [201, 400]
+    assert client.post("/agendamentos", json={**item(4, 5), "cientista_id": True}).status_code == 400
+    assert count() == 1
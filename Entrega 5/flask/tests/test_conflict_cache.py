@@ -0,0 +1,81 @@
+import threading
+from datetime import datetime, timedelta
+
+from app import app, db, Agendamento, bump_cache_version
+from conflict_cache import ConflictCache, IntervalIndex
+
+T0 = datetime(2030, 1, 1)
+
+def h(n):
+    return T0 + timedelta(hours=n)
+
+def test_interval_index_overlap():
+    ix = IntervalIndex()
+    ix.add(h(0), h(1), 1)
+    ix.add(h(2), h(10), 2)  # intervalo longo começando antes da consulta
+    ix.add(h(11), h(12), 3)
+    assert ix.overlap(h(1), h(2)) is None      # encosta nos dois lados
+    assert ix.overlap(h(8), h(9)) == 2
+    assert ix.overlap(h(0), h(1)) == 1
+    ix.remove(2, h(2))
+    assert ix.overlap(h(8), h(9)) is None
+    assert len(ix) == 2
+
+def test_slow_load_does_not_block_other_telescopes():
+    started, release = threading.Event(), threading.Event()
+
+    def loader(tel):
+        if tel == 1:
+            started.set()
+            release.wait(5)
+        return 1, [(tel, h(0), h(1))]
+
+    cache = ConflictCache(loader)
+    slow = threading.Thread(target=cache.overlap, args=(1, 1, h(0), h(1)))
+    slow.start()
+    assert started.wait(5)
+    other = []
+    fast = threading.Thread(target=lambda: other.append(cache.overlap(2, 1, h(0), h(1))))
+    fast.start()
+    fast.join(1)
+    release.set()
+    assert other == [2]  # carregado e consultado com o telescópio 1 ainda no BD
+    slow.join(5)
+    assert cache.overlap(1, 1, h(0), h(1)) == 1
+
+def payload(inicio, fim, tel=1):
+    return {"cientista_id": 1, "telescopio_id": tel,
+            "horario_inicio_utc": inicio.isoformat() + "Z", "horario_fim_utc": fim.isoformat() + "Z"}
+
+def test_known_overlap_rejected_before_lock(client):
+    r = client.post("/agendamentos", json=payload(h(0), h(2)))
+    assert r.status_code == 201
+    ag_id = r.get_json()["id"]
+    assert len(client.lock_calls) == 1
+
+    assert client.post("/agendamentos", json=payload(h(1), h(3))).status_code == 409
+    assert len(client.lock_calls) == 1  # recusado pelo cache, sem ir ao coordenador
+
+    assert client.post(f"/agendamentos/{ag_id}/cancel").status_code == 200
+    assert client.post("/agendamentos", json=payload(h(1), h(3))).status_code == 201
+
+def test_change_from_other_worker_invalidates(client):
+    ag_id = client.post("/agendamentos", json=payload(h(0), h(2))).get_json()["id"]
+    # outro worker cancela direto no BD, incrementando a versão na mesma transação
+    with app.app_context():
+        db.session.get(Agendamento, ag_id).status = "CANCELLED"
+        bump_cache_version(1)
+        db.session.commit()
+    assert client.post("/agendamentos", json=payload(h(0), h(2))).status_code == 201
+
+def test_offset_dates_stored_in_utc(client):
+    # 07:00-03:00 é 10:00Z: a reserva é gravada em UTC e o horário livre seguinte não é recusado
+    r = client.post("/agendamentos", json={"cientista_id": 1, "telescopio_id": 1,
+                                          "horario_inicio_utc": "2030-01-01T07:00:00-03:00",
+                                          "horario_fim_utc": "2030-01-01T08:00:00-03:00"})
+    assert r.status_code == 201
+    with app.app_context():
+        assert db.session.get(Agendamento, r.get_json()["id"]).horario_inicio_utc == h(10)
+    assert client.post("/agendamentos", json=payload(h(11), h(12))).status_code == 201
+    assert client.post("/agendamentos", json=payload(h(7), h(8))).status_code == 201
+    assert client.post("/agendamentos", json=payload(h(10), h(11))).status_code == 409
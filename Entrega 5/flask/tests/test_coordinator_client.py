@@ -0,0 +1,121 @@
+import asyncio, json, os, sys, threading
+
+import pytest
+import requests
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from async_locks import AsyncCoordinatorClient
+from coordinator_client import CoordinatorClient, POOL_CONN_OPENED, POOL_CONN_REUSED
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    fail_next = 0
+    fail_status = 503
+    drop_next = 0
+    hits = 0
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        _Handler.hits += 1
+        if _Handler.drop_next > 0:
+            # pedido lido e conexão fechada sem resposta
+            _Handler.drop_next -= 1
+            self.close_connection = True
+            return
+        if _Handler.fail_next > 0:
+            _Handler.fail_next -= 1
+            return self._reply(_Handler.fail_status, {"error": "unavailable"})
+        return self._reply(200, {"owner": "x", "echo": json.loads(body)})
+
+    def _reply(self, status, obj):
+        data = json.dumps(obj).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *a):
+        pass
+
+def _serve():
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv
+
+def test_reuses_keepalive_connection():
+    srv = _serve()
+    try:
+        c = CoordinatorClient(f"http://127.0.0.1:{srv.server_port}")
+        opened = POOL_CONN_OPENED._value.get()
+        reused = POOL_CONN_REUSED._value.get()
+        for _ in range(5):
+            assert c.post("/lock", {"resource": "r"}).status_code == 200
+        assert POOL_CONN_OPENED._value.get() - opened == 1
+        assert POOL_CONN_REUSED._value.get() - reused == 4
+    finally:
+        srv.shutdown()
+
+def test_retries_transient_status_only():
+    srv = _serve()
+    try:
+        c = CoordinatorClient(f"http://127.0.0.1:{srv.server_port}", max_retries=2, backoff_base_ms=1)
+        _Handler.fail_next = 2
+        assert c.post("/lock", {"resource": "r"}).status_code == 200
+        _Handler.fail_next = 3
+        assert c.post("/lock", {"resource": "r"}).status_code == 503
+    finally:
+        _Handler.fail_next = 0
+        srv.shutdown()
+
+def test_lock_not_retried_after_it_may_have_been_granted():
+    # 504 e conexão caída depois do envio: o coordenador pode ter concedido; /unlock pode repetir
+    srv = _serve()
+    try:
+        c = CoordinatorClient(f"http://127.0.0.1:{srv.server_port}", max_retries=2, backoff_base_ms=1)
+        _Handler.fail_status, _Handler.fail_next, _Handler.hits = 504, 1, 0
+        assert c.post("/lock", {"resource": "r"}).status_code == 504 and _Handler.hits == 1
+        _Handler.fail_next, _Handler.hits = 1, 0
+        assert c.post("/unlock", {"resource": "r"}).status_code == 200 and _Handler.hits == 2
+        _Handler.drop_next, _Handler.hits = 1, 0
+        with pytest.raises(requests.exceptions.ConnectionError):
+            c.post("/lock", {"resource": "r"})
+        assert _Handler.hits == 1
+        _Handler.fail_status, _Handler.fail_next = 503, 1
+        assert c.post("/lock", {"resource": "r"}).status_code == 200
+    finally:
+        _Handler.fail_status, _Handler.fail_next, _Handler.drop_next = 503, 0, 0
+        srv.shutdown()
+
+def test_async_lock_not_retried_on_504():
+    srv = _serve()
+
+    async def run():
+        c = AsyncCoordinatorClient(f"http://127.0.0.1:{srv.server_port}", max_retries=2, backoff_base_ms=1)
+        try:
+            _Handler.fail_status, _Handler.fail_next, _Handler.hits = 504, 1, 0
+            assert (await c.post("/lock", {"resource": "r"})).status_code == 504 and _Handler.hits == 1
+            _Handler.fail_next, _Handler.hits = 1, 0
+            assert (await c.post("/extend", {"resource": "r"})).status_code == 200 and _Handler.hits == 2
+        finally:
+            await c.aclose()
+
+    try:
+        asyncio.run(run())
+    finally:
+        _Handler.fail_status, _Handler.fail_next = 503, 0
+        srv.shutdown()
+
+def test_refused_connection_is_retried_for_lock():
+    srv = _serve()
+    port = srv.server_port
+    srv.shutdown()
+    srv.server_close()
+    attempts = []
+    c = CoordinatorClient(f"http://127.0.0.1:{port}", max_retries=2, backoff_base_ms=1)
+    c._backoff = attempts.append
+    with pytest.raises(requests.exceptions.ConnectionError):
+        c.post("/lock", {"resource": "r"})
+    assert attempts == [0, 1]
@@ -0,0 +1,25 @@
+from sqlalchemy import create_engine
+
+import db_config
+from app import app, db
+
+def test_app_engine_uses_tuned_pragmas():
+    with app.app_context():
+        values = db_config.effective_pragmas(db.engine)
+    assert values["journal_mode"] == "wal"
+    assert values["synchronous"] == 1  # NORMAL
+    assert values["busy_timeout"] == 5000
+
+def test_env_overrides(monkeypatch, tmp_path):
+    monkeypatch.setenv("SQLITE_SYNCHRONOUS", "FULL")
+    monkeypatch.setenv("SQLITE_CACHE_SIZE", "-1024")
+    engine = create_engine(f"sqlite:///{tmp_path / 'x.db'}")
+    db_config.configure_engine(engine)
+    values = db_config.effective_pragmas(engine)
+    assert values["synchronous"] == 2 and values["cache_size"] == -1024
+
+def test_disabled(monkeypatch, tmp_path):
+    monkeypatch.setenv("SQLITE_PRAGMAS", "0")
+    engine = create_engine(f"sqlite:///{tmp_path / 'x.db'}")
+    db_config.configure_engine(engine)
+    assert db_config.effective_pragmas(engine)["journal_mode"] == "delete"
@@ -0,0 +1,70 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import app as app_module
+from app import app, db, Agendamento, BookingConflict
+from group_commit import GroupCommitWriter
+
+T0 = datetime(2034, 1, 1, tzinfo=timezone.utc)
+
+def pay(h0, h1, tel=1):
+    return {"cientista_id": 1, "telescopio_id": tel,
+            "horario_inicio_utc": (T0 + timedelta(hours=h0)).isoformat().replace("+00:00", "Z"),
+            "horario_fim_utc": (T0 + timedelta(hours=h1)).isoformat().replace("+00:00", "Z")}
+
+def test_writer_groups_concurrent_submissions():
+    sizes = []
+
+    def commit(items):
+        sizes.append(len(items))
+        time.sleep(0.02)  # "fsync": os pedidos que chegam nesse meio tempo vão para o próximo lote
+        return [x * 2 for x in items]
+
+    w = GroupCommitWriter(commit, max_delay_ms=5, max_batch=8)
+    with ThreadPoolExecutor(max_workers=16) as ex:
+        results = list(ex.map(lambda x: w.submit(x).result(timeout=5), range(32)))
+    assert results == [x * 2 for x in range(32)]
+    assert sum(sizes) == 32 and max(sizes) > 1 and max(sizes) <= 8
+
+def test_writer_failure_reaches_every_future():
+    w = GroupCommitWriter(lambda items: 1 / 0, max_delay_ms=1)
+    with pytest.raises(ZeroDivisionError):
+        w.submit("x").result(timeout=5)
+
+@pytest.fixture()
+def client(client, monkeypatch):
+    events, release = [], app_module.release_lock
+    monkeypatch.setattr(app_module, "GROUP_COMMIT", True)
+    monkeypatch.setattr(app_module, "release_lock", lambda resource, owner: (events.append("release"), release(resource, owner)))
+    client.events = events
+    return client
+
+def test_group_commit_creates_bookings(client):
+    with ThreadPoolExecutor(max_workers=8) as ex:
+        rs = list(ex.map(lambda h: app.test_client().post("/agendamentos", json=pay(h, h + 1)), range(24)))
+    assert [r.status_code for r in rs] == [201] * 24
+    assert len({r.get_json()["id"] for r in rs}) == 24
+    with app.app_context():
+        assert Agendamento.query.count() == 24
+    assert client.events.count("release") == 24
+
+def test_writer_rechecks_conflicts_inside_the_batch(client):
+    # dois itens sobrepostos que passaram cada um pelo seu lock: só o primeiro do lote entra
+    d1, d2 = pay(0, 2), pay(1, 3)
+    items = [(d, app_module.parse_agendamento(d)[0], app_module.parse_agendamento(d)[1], ("o", None, "k")) for d in (d1, d2)]
+    results = app_module._commit_group(items)
+    assert isinstance(results[0], int) and isinstance(results[1], BookingConflict)
+    with app.app_context():
+        assert Agendamento.query.count() == 1
+
+def test_group_commit_stores_utc(client):
+    local = {"cientista_id": 1, "telescopio_id": 1,
+             "horario_inicio_utc": "2034-01-01T07:00:00-03:00", "horario_fim_utc": "2034-01-01T08:00:00-03:00"}
+    ag_id = client.post("/agendamentos", json=local).get_json()["id"]
+    with app.app_context():
+        assert db.session.get(Agendamento, ag_id).horario_inicio_utc == datetime(2034, 1, 1, 10)
+    assert client.post("/agendamentos", json=pay(7, 8)).status_code == 201
+    assert client.post("/agendamentos", json=pay(10, 11)).status_code == 409
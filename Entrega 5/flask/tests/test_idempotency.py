@@ -0,0 +1,109 @@
+import os, threading, time, uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import app as app_module
+from app import app, Agendamento
+from idempotency import IdempotencyStore, StoredResponse
+
+PAY = {"cientista_id": 1, "telescopio_id": 1,
+       "horario_inicio_utc": "2032-01-01T00:00:00Z", "horario_fim_utc": "2032-01-01T01:00:00Z"}
+
+@pytest.fixture()
+def client(client, monkeypatch):
+    acquire = app_module.acquire_lock
+
+    def slow_acquire(resource, *a, **kw):
+        time.sleep(0.05)  # coordenador lento: retries chegam com o primeiro ainda em andamento
+        return acquire(resource, *a, **kw)
+
+    monkeypatch.setattr(app_module, "acquire_lock", slow_acquire)
+    return client
+
+def test_retry_replays_stored_response(client):
+    h = {"Idempotency-Key": "k-1"}
+    r1 = client.post("/agendamentos", json=PAY, headers=h)
+    r2 = client.post("/agendamentos", json=PAY, headers=h)
+    assert r1.status_code == r2.status_code == 201
+    assert r1.get_json() == r2.get_json()
+    assert r2.headers["Idempotent-Replayed"] == "true"
+    assert len(client.lock_calls) == 1
+    with app.app_context():
+        assert Agendamento.query.count() == 1
+
+def test_concurrent_duplicates_run_once(client):
+    with ThreadPoolExecutor(max_workers=5) as ex:
+        rs = list(ex.map(lambda _: client.application.test_client().post(
+            "/agendamentos", json=PAY, headers={"Idempotency-Key": "k-2"}), range(5)))
+    assert [r.status_code for r in rs] == [201] * 5
+    assert len({r.get_json()["id"] for r in rs}) == 1
+    assert len(client.lock_calls) == 1
+
+def test_same_key_different_body_is_rejected(client):
+    h = {"Idempotency-Key": "k-3"}
+    client.post("/agendamentos", json=PAY, headers=h)
+    other = dict(PAY, telescopio_id=2)
+    assert client.post("/agendamentos", json=other, headers=h).status_code == 422
+
+def test_conflicts_are_not_stored(client):
+    client.post("/agendamentos", json=PAY)
+    h = {"Idempotency-Key": "k-4"}
+    assert client.post("/agendamentos", json=PAY, headers=h).status_code == 409
+    r = client.post("/agendamentos", json=PAY, headers=h)
+    assert r.status_code == 409 and "Idempotent-Replayed" not in r.headers
+
+def test_cancel_replay(client):
+    ag_id = client.post("/agendamentos", json=PAY).get_json()["id"]
+    h = {"Idempotency-Key": "c-1"}
+    assert client.post(f"/agendamentos/{ag_id}/cancel", headers=h).status_code == 200
+    r = client.post(f"/agendamentos/{ag_id}/cancel", headers=h)
+    assert r.status_code == 200 and r.headers["Idempotent-Replayed"] == "true"
+
+def test_wait_for_in_flight_request_is_bounded_once(client, monkeypatch):
+    # o primeiro pedido não termina: o retry recebe 409 depois de uma espera só, não duas
+    import idempotency
+    monkeypatch.setattr(app_module, "IDEMPOTENCY_WAIT_MS", 300)
+    monkeypatch.setattr(idempotency, "IDEMPOTENCY_WAIT_MS", 300)
+    scope = "POST /agendamentos k-stuck"
+    assert app_module.idempotency_store.begin(scope)
+    try:
+        t0 = time.monotonic()
+        r = client.post("/agendamentos", json=PAY, headers={"Idempotency-Key": "k-stuck"})
+        assert r.status_code == 409 and r.headers["Retry-After"] == "1"
+        assert 0.3 <= time.monotonic() - t0 < 0.5
+    finally:
+        app_module.idempotency_store.finish(scope)
+
+def test_store_evicts_lru_and_expires():
+    store = IdempotencyStore(ttl_s=60, max_items=2, redis_url="")
+    item = lambda exp: StoredResponse("fp", 201, b"{}", "application/json", exp)
+    store.put("a", item(time.time() + 60))
+    store.put("b", item(time.time() + 60))
+    store.get("a")
+    store.put("c", item(time.time() + 60))
+    assert store.get("b") is None and store.get("a") is not None
+    store.put("d", item(time.time() - 1))
+    assert store.get("d") is None
+
+@pytest.mark.skipif(not os.environ.get("TEST_REDIS_URL"), reason="defina TEST_REDIS_URL para testar contra um Redis real")
+def test_retry_on_other_worker_waits_for_first():
+    # dois workers: o segundo encontra a reserva no Redis e espera a resposta do primeiro
+    a, b = (IdempotencyStore(redis_url=os.environ["TEST_REDIS_URL"]) for _ in range(2))
+    key = f"POST /agendamentos {uuid.uuid4().hex}"
+    assert a.begin(key)
+    done = []
+    t = threading.Thread(target=lambda: done.append(b.begin(key)))
+    t.start()
+    time.sleep(0.2)
+    assert not done  # ainda esperando
+    a.put(key, StoredResponse("fp", 201, b'{"id": 1}', "application/json", time.time() + 60))
+    a.finish(key)
+    t.join(2)
+    assert done == [False] and b.get(key).status == 201
+    # sem resposta guardada (409/5xx) a reserva é apagada e o próximo pedido executa
+    key2 = key + "-2"
+    assert a.begin(key2)
+    a.finish(key2)
+    assert b.begin(key2)
+    b.finish(key2)
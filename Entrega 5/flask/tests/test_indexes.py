@@ -0,0 +1,22 @@
+from sqlalchemy import inspect
+
+from app import app, db, Agendamento, ensure_indexes
+
+def test_ensure_indexes_migrates_existing_table():
+    with app.app_context():
+        db.create_all()
+        ix = next(i for i in Agendamento.__table__.indexes if i.name == "ix_agendamentos_conflito")
+        ix.drop(db.engine)  # simula um agendamento.db anterior ao índice
+        assert "ix_agendamentos_conflito" not in {i["name"] for i in inspect(db.engine).get_indexes("agendamentos")}
+        ensure_indexes()
+        ensure_indexes()  # idempotente
+        assert "ix_agendamentos_conflito" in {i["name"] for i in inspect(db.engine).get_indexes("agendamentos")}
+
+def test_conflict_query_uses_index():
+    with app.app_context():
+        db.create_all()
+        plan = db.session.execute(db.text(
+            "EXPLAIN QUERY PLAN SELECT id FROM agendamentos WHERE telescopio_id=1 AND status='CONFIRMED' "
+            "AND horario_inicio_utc < '2025-01-01 02:00:00' AND horario_fim_utc > '2025-01-01 00:00:00'"
+        )).fetchall()
+        assert any("ix_agendamentos_conflito" in row[-1] for row in plan)
@@ -0,0 +1,82 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+import app as app_module
+from app import app, db, Agendamento, StaleLock
+from lease import LeaseRenewer
+from lock_providers import LocalLockProvider
+
+def test_renewer_keeps_lease_alive_past_ttl(tmp_path):
+    p = LocalLockProvider(str(tmp_path / "locks.db"))
+    renewer = LeaseRenewer(p.extend)
+    ok, info = p.acquire("telescopio-1_a", 150)
+    renewer.track("telescopio-1_a", info["owner"], 150)
+    time.sleep(0.5)  # mais de 3x o TTL
+    assert not renewer.lost(info["owner"])
+    assert not p.acquire("telescopio-1_a", 150)[0]
+    renewer.untrack(info["owner"])
+    time.sleep(0.2)
+    assert p.acquire("telescopio-1_a", 150)[0]
+
+def test_renewer_marks_lease_lost_when_extend_refused():
+    refused = threading.Event()
+
+    def extend(resource, owner, ttl_ms):
+        refused.set()
+        return False
+
+    renewer = LeaseRenewer(extend)
+    renewer.track("k", "o", 60)
+    assert refused.wait(1.0)
+    time.sleep(0.05)
+    assert renewer.lost("o")
+    assert not renewer.lost("outro")  # sem lease registrado
+
+def test_local_provider_fences_increase_per_prefix(tmp_path):
+    p = LocalLockProvider(str(tmp_path / "locks.db"))
+    _, a = p.acquire(["telescopio-1_a", "telescopio-2_a"], 10000)
+    p.release(["telescopio-1_a", "telescopio-2_a"], a["owner"])
+    _, b = p.acquire("telescopio-1_b", 10000)
+    assert a["fences"] == {"telescopio-1": 1, "telescopio-2": 1}
+    assert b["fences"] == {"telescopio-1": 2}
+    assert p.extend("telescopio-1_b", b["owner"], 10000)
+    assert not p.extend("telescopio-1_b", "outro", 10000)
+
+@pytest.fixture()
+def fresh_db(client):
+    with app.app_context():
+        yield
+
+def _data(h):
+    return {"cientista_id": 1, "telescopio_id": 1}, datetime(2031, 1, 1, h), datetime(2031, 1, 1, h) + timedelta(hours=1)
+
+def test_stale_fencing_token_is_rejected(fresh_db):
+    app_module.insert_agendamento(*_data(0), lock=("novo", {"telescopio-1": 5}, "telescopio-1_a"))
+    with pytest.raises(StaleLock):
+        app_module.insert_agendamento(*_data(2), lock=("velho", {"telescopio-1": 4}, "telescopio-1_a"))
+    app_module.insert_agendamento(*_data(4), lock=("novo", {"telescopio-1": 5}, "telescopio-1_a"))
+    assert Agendamento.query.count() == 2
+
+def test_fences_of_disjoint_keys_do_not_conflict(fresh_db):
+    # dois holders legítimos do mesmo telescópio com chaves diferentes: o de token menor commita depois
+    app_module.insert_agendamento(*_data(0), lock=("b", {"telescopio-1": 6}, "telescopio-1_b"))
+    app_module.insert_agendamento(*_data(2), lock=("a", {"telescopio-1": 5}, ["telescopio-1_a"]))
+    assert Agendamento.query.count() == 2
+
+def test_lost_lease_aborts_commit(fresh_db, monkeypatch):
+    monkeypatch.setattr(app_module.lease_renewer, "lost", lambda owner: owner == "expirado")
+    with pytest.raises(StaleLock):
+        app_module.insert_agendamento(*_data(0), lock=("expirado", None, "telescopio-1_a"))
+    assert Agendamento.query.count() == 0
+
+def test_fences_of_past_slots_are_pruned(fresh_db):
+    past = ["telescopio-1_s15-2020-01-01T10:00Z", "telescopio-1_s15-2020-01-01T10:15Z"]
+    app_module.insert_agendamento(*_data(0), lock=("a", {"telescopio-1": 1}, past))
+    assert db.session.query(app_module.LockFence).count() == 2  # as chaves do próprio commit ficam
+    future = "telescopio-1_2031-01-01T02:00:00Z"
+    app_module.insert_agendamento(*_data(2), lock=("b", {"telescopio-1": 2}, future))
+    assert [f.resource for f in db.session.query(app_module.LockFence)] == [future]
+    assert db.session.get(app_module.LockFence, future).slot_utc == datetime(2031, 1, 1, 2)
@@ -0,0 +1,59 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+import app as app_module
+from app import app, db, Agendamento
+
+T0 = datetime(2031, 1, 1)
+
+@pytest.fixture()
+def client(client):
+    with app.app_context():
+        rows = []
+        for i in range(25):
+            # dois agendamentos por horário (telescópios 1 e 2) para exercitar o desempate por id
+            inicio = T0 + timedelta(hours=i // 2)
+            rows.append(Agendamento(cientista_id=1, telescopio_id=i % 2 + 1, horario_inicio_utc=inicio,
+                                    horario_fim_utc=inicio + timedelta(minutes=30),
+                                    status="CANCELLED" if i == 3 else "CONFIRMED"))
+        db.session.add_all(rows)
+        db.session.commit()
+    return client
+
+def test_keyset_pages_cover_everything_once(client):
+    seen, cursor = [], None
+    while True:
+        r = client.get("/agendamentos", query_string={"limit": 10, **({"cursor": cursor} if cursor else {})})
+        assert r.status_code == 200
+        body = r.get_json()
+        seen += [a["id"] for a in body["items"]]
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+    assert sorted(seen) == list(range(1, 26)) and len(seen) == 25
+
+def test_filters(client):
+    body = client.get("/agendamentos?telescopio=2&status=confirmed&from=2031-01-01T02:00:00Z&to=2031-01-01T05:00:00Z").get_json()
+    assert [a["telescopio_id"] for a in body["items"]] == [2, 2, 2]
+    assert all(a["status"] == "CONFIRMED" for a in body["items"])
+    assert body["items"][0]["horario_inicio_utc"] == "2031-01-01T02:00:00Z"
+
+def test_etag_304(client):
+    r = client.get("/agendamentos?limit=5")
+    etag = r.headers["ETag"]
+    assert client.get("/agendamentos?limit=5", headers={"If-None-Match": etag}).status_code == 304
+    client.post("/agendamentos/1/cancel")
+    assert client.get("/agendamentos?limit=5", headers={"If-None-Match": etag}).status_code == 200
+
+def test_ndjson_export_streams_all(client, monkeypatch):
+    monkeypatch.setattr(app_module, "EXPORT_BATCH_SIZE", 5)
+    r = client.get("/agendamentos?format=ndjson&telescopio=1")
+    assert r.mimetype == "application/x-ndjson"
+    lines = [json.loads(l) for l in r.get_data(as_text=True).splitlines()]
+    assert len(lines) == 13
+    assert [l["horario_inicio_utc"] for l in lines] == sorted(l["horario_inicio_utc"] for l in lines)
+
+def test_invalid_cursor(client):
+    assert client.get("/agendamentos?cursor=nope").status_code == 400
@@ -0,0 +1,47 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from lock_keys import lock_resources, TooManySlots
+
+def dt(s):
+    return datetime.fromisoformat(s.replace("Z", "+00:00"))
+
+def test_start_mode_normalizes_offset_format():
+    a = lock_resources(1, dt("2025-01-01T10:00:00Z"), dt("2025-01-01T11:00:00Z"), mode="start")
+    b = lock_resources(1, dt("2025-01-01T07:00:00-03:00"), dt("2025-01-01T08:00:00-03:00"), mode="start")
+    assert a == b == ["telescopio-1_2025-01-01T10:00:00Z"]
+
+def test_slots_cover_interval():
+    keys = lock_resources(1, dt("2025-01-01T10:05:00Z"), dt("2025-01-01T10:45:00Z"), mode="slots", slot_minutes=15)
+    assert keys == [
+        "telescopio-1_s15-2025-01-01T10:00Z",
+        "telescopio-1_s15-2025-01-01T10:15Z",
+        "telescopio-1_s15-2025-01-01T10:30Z",
+    ]
+
+def test_overlapping_requests_share_a_slot():
+    a = lock_resources(2, dt("2025-01-01T10:00:00Z"), dt("2025-01-01T12:00:00Z"), mode="slots", slot_minutes=30)
+    b = lock_resources(2, dt("2025-01-01T11:50:00+00:00"), dt("2025-01-01T13:00:00Z"), mode="slots", slot_minutes=30)
+    c = lock_resources(2, dt("2025-01-01T12:00:00Z"), dt("2025-01-01T13:00:00Z"), mode="slots", slot_minutes=30)
+    assert set(a) & set(b)
+    assert not set(a) & set(c)  # intervalos adjacentes não disputam lock
+
+def test_too_many_slots():
+    with pytest.raises(TooManySlots):
+        lock_resources(1, dt("2025-01-01T00:00:00Z"), dt("2026-01-01T00:00:00Z"), mode="slots", slot_minutes=1)
+
+def test_parse_compares_mixed_offsets_in_utc():
+    from app import parse_agendamento, naive_utc
+    body = {"cientista_id": 1, "telescopio_id": 1}
+    inicio, fim = parse_agendamento({**body, "horario_inicio_utc": "2025-01-01T00:00:00Z", "horario_fim_utc": "2025-01-01T02:00:00"})
+    assert naive_utc(fim) - naive_utc(inicio) == timedelta(hours=2)
+    with pytest.raises(ValueError):
+        parse_agendamento({**body, "horario_inicio_utc": "2025-01-01T00:00:00", "horario_fim_utc": "2025-01-01T02:00:00+03:00"})
+
+def test_key_time_reads_both_modes():
+    from lock_keys import key_time
+    for mode in ("start", "slots"):
+        keys = lock_resources(3, dt("2025-01-01T07:00:00-03:00"), dt("2025-01-01T08:00:00-03:00"), mode=mode, slot_minutes=60)
+        assert [key_time(k) for k in keys] == [datetime(2025, 1, 1, 10)]
+    assert key_time("telescopio-1_a") is None
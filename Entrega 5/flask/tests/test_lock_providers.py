@@ -0,0 +1,181 @@
+import multiprocessing
+import os
+import re
+import threading
+import time
+
+import pytest
+
+from lock_providers import LocalLockProvider
+
+def test_local_lock_is_exclusive_and_owner_checked(tmp_path):
+    p = LocalLockProvider(str(tmp_path / "locks.db"))
+    ok, info = p.acquire("telescopio-1_a", 10000)
+    assert ok
+    ok2, info2 = p.acquire(["telescopio-1_a", "telescopio-1_b"], 10000)
+    assert not ok2 and info2 == {"error": "locked", "resources": ["telescopio-1_a"]}
+    assert not p.release("telescopio-1_a", "outro-dono")
+    assert p.release("telescopio-1_a", info["owner"])
+    assert p.acquire(["telescopio-1_a", "telescopio-1_b"], 10000)[0]
+
+def test_local_lock_expires_after_ttl(tmp_path):
+    p = LocalLockProvider(str(tmp_path / "locks.db"))
+    assert p.acquire("k", 50)[0]
+    assert not p.acquire("k", 50)[0]
+    time.sleep(0.1)
+    assert p.acquire("k", 50)[0]
+
+def test_local_lock_single_winner_across_threads(tmp_path):
+    p = LocalLockProvider(str(tmp_path / "locks.db"))
+    results = []
+    barrier = threading.Barrier(8)
+
+    def worker():
+        barrier.wait()
+        results.append(p.acquire("k", 10000)[0])
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results.count(True) == 1
+
+def _acquire_in_child(path, q):
+    q.put(LocalLockProvider(path).acquire("k", 10000)[0])
+
+def test_local_lock_single_winner_across_processes(tmp_path):
+    path = str(tmp_path / "locks.db")
+    LocalLockProvider(path)
+    ctx = multiprocessing.get_context("spawn")
+    q = ctx.Queue()
+    procs = [ctx.Process(target=_acquire_in_child, args=(path, q)) for _ in range(4)]
+    for pr in procs:
+        pr.start()
+    for pr in procs:
+        pr.join()
+    assert sorted(q.get() for _ in procs) == [False, False, False, True]
+
+def test_redis_scripts_match_coordinator():
+    # chaves e scripts compartilhados com coordenador/server.js e locks.js: os dois caminhos convivem no mesmo Redis
+    import lock_providers
+    base = os.path.join(os.path.dirname(__file__), "..", "..", "coordenador")
+    js = "".join(open(os.path.join(base, f)).read() for f in ("server.js", "locks.js"))
+    for name in ("LOCK_MANY_SCRIPT", "EXTEND_SCRIPT", "UNLOCK_SCRIPT", "UNLOCK_MANY_SCRIPT", "QUEUED_LOCK_SCRIPT",
+                 "CANCEL_WAIT_SCRIPT"):
+        script = re.search(rf"const {name} = `(.*?)`;", js, re.S).group(1)
+        assert script.strip() == getattr(lock_providers, name).strip(), name
+
+@pytest.mark.skipif(not os.environ.get("TEST_REDIS_URL"), reason="defina TEST_REDIS_URL para testar contra um Redis real")
+def test_redis_provider_roundtrip():
+    from lock_providers import RedisLockProvider
+    p = RedisLockProvider(os.environ["TEST_REDIS_URL"])
+    keys = [f"telescopio-999_teste-{time.time()}-{i}" for i in range(2)]
+    ok, info = p.acquire(keys[0], 10000)
+    assert ok and p.redis.get(keys[0]) == info["owner"]
+    listed, _ = p.list_locks(limit=1000, prefix=keys[0])
+    assert [x["resource"] for x in listed["items"]] == [keys[0]]
+    ok2, info2 = p.acquire(keys, 10000)
+    assert not ok2 and info2["resources"] == [keys[0]]
+    assert not p.release(keys[0], "outro-dono")
+    assert p.release(keys[0], info["owner"])
+    ok3, info3 = p.acquire(keys, 10000)
+    assert ok3 and p.release(keys, info3["owner"])
+    assert p.redis.exists(*keys) == 0
+
+@pytest.mark.skipif(not os.environ.get("TEST_REDIS_URL"), reason="defina TEST_REDIS_URL para testar contra um Redis real")
+def test_async_redis_provider_fences_follow_the_clock():
+    # mesmo piso de fencing do provedor síncrono e do coordenador: o token não volta para trás
+    # quando o contador fence:<prefixo> do Redis ficou atrás (failover, rebalanceamento)
+    import asyncio
+    from async_locks import AsyncRedisLockProvider
+
+    async def run():
+        p = AsyncRedisLockProvider(os.environ["TEST_REDIS_URL"])
+        try:
+            prefix = f"telescopio-998{int(time.time() * 1000)}"
+            await p.redis.set(f"fence:{prefix}", 1)
+            granted = []
+            for wait_ms in (0, 500):
+                now_ms = int(time.time() * 1000)
+                ok, info = await p.acquire(f"{prefix}_a", 10000, wait_ms=wait_ms)
+                assert ok and info["fences"][prefix] >= now_ms * 1000
+                granted.append(info["fences"][prefix])
+                assert await p.release(f"{prefix}_a", info["owner"])
+            assert granted[1] > granted[0]
+        finally:
+            await p.aclose()
+
+    asyncio.run(run())
+
+def test_local_list_locks_paginates_by_prefix(tmp_path):
+    p = LocalLockProvider(str(tmp_path / "locks.db"))
+    for i in range(5):
+        p.acquire(f"telescopio-1_{i}", 10000)
+    p.acquire("telescopio-2_0", 10000)
+    p.acquire("outra-coisa", 10000)
+    body, _ = p.list_locks(limit=2, prefix="telescopio-1_")
+    seen = [x["resource"] for x in body["items"]]
+    while body["next_cursor"]:
+        body, _ = p.list_locks(cursor=body["next_cursor"], limit=2, prefix="telescopio-1_")
+        seen += [x["resource"] for x in body["items"]]
+    assert seen == [f"telescopio-1_{i}" for i in range(5)]
+    body, _ = p.list_locks(limit=100)
+    assert [x["resource"] for x in body["items"]] == [f"telescopio-1_{i}" for i in range(5)] + ["telescopio-2_0"]
+
+def test_admin_locks_pages_through_provider(monkeypatch, tmp_path):
+    import app as app_module
+    p = LocalLockProvider(str(tmp_path / "locks.db"))
+    monkeypatch.setattr(app_module, "get_lock_provider", lambda: p)
+    for i in range(3):
+        p.acquire(f"telescopio-7_{i}", 10000)
+    c = app_module.app.test_client()
+    auth = {"Authorization": f"Bearer {app_module.ADMIN_TOKEN}"}
+    r = c.get("/admin/locks?limit=2", headers=auth)
+    assert r.status_code == 200 and len(r.get_json()["items"]) == 2
+    r2 = c.get(f"/admin/locks?limit=2&cursor={r.get_json()['next_cursor']}", headers=auth)
+    assert [x["resource"] for x in r2.get_json()["items"]] == ["telescopio-7_2"]
+    assert r2.get_json()["next_cursor"] is None
+    assert c.get("/admin/locks?prefix=outra", headers=auth).status_code == 400
+
+def test_local_lock_waits_for_release(tmp_path):
+    p = LocalLockProvider(str(tmp_path / "locks.db"))
+    _, held = p.acquire("k", 10000)
+    threading.Timer(0.1, p.release, args=("k", held["owner"])).start()
+    assert not p.acquire("k", 10000, wait_ms=20)[0]
+    t0 = time.monotonic()
+    assert p.acquire("k", 10000, wait_ms=2000)[0]
+    assert time.monotonic() - t0 < 1.0
+
+def test_http_provider_maps_bad_coordinator_replies_to_unreachable(monkeypatch):
+    # proxy na frente do coordenador respondendo 502 em HTML, e depois coordenador fora do ar
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    import coordinator_client
+    from lock_providers import HttpCoordinatorProvider
+
+    class Html502(BaseHTTPRequestHandler):
+        def _reply(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            self.send_response(502)
+            self.send_header("Content-Type", "text/html")
+            self.end_headers()
+            self.wfile.write(b"<html>Bad Gateway</html>")
+        do_GET = do_POST = _reply
+
+        def log_message(self, *a):
+            pass
+
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), Html502)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    client = coordinator_client.CoordinatorClient(f"http://127.0.0.1:{srv.server_port}", max_retries=0)
+    monkeypatch.setattr(coordinator_client, "get_client", lambda: client)
+    p = HttpCoordinatorProvider()
+    try:
+        ok, info = p.acquire("telescopio-1_a", 10000)
+        assert not ok and info["error"] == "coordinator-unreachable"
+        body, status = p.list_locks()
+        assert status == 503 and body["error"] == "coordinator-unreachable"
+    finally:
+        srv.shutdown()
+        srv.server_close()
+    assert p.list_locks()[1] == 503  # conexão recusada
@@ -0,0 +1,40 @@
+from datetime import datetime, timedelta
+
+import pytest
+from prometheus_client import REGISTRY
+
+import app as app_module
+
+T0 = datetime(2033, 1, 1)
+
+def item(h0, h1):
+    return {"cientista_id": 1, "telescopio_id": 1,
+            "horario_inicio_utc": (T0 + timedelta(hours=h0)).isoformat() + "Z",
+            "horario_fim_utc": (T0 + timedelta(hours=h1)).isoformat() + "Z"}
+
+@pytest.fixture()
+def client(client, monkeypatch):
+    monkeypatch.setattr(app_module, "CONFLICT_CACHE", False)
+    return client
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+def test_real_status_labels(client):
+    before_201 = sample("app_requests_total", method="POST", endpoint="/agendamentos", status="201")
+    before_409 = sample("app_requests_total", method="POST", endpoint="/agendamentos", status="409")
+    client.post("/agendamentos", json=item(0, 1))
+    client.post("/agendamentos", json=item(0, 1))
+    assert sample("app_requests_total", method="POST", endpoint="/agendamentos", status="201") - before_201 == 1
+    assert sample("app_requests_total", method="POST", endpoint="/agendamentos", status="409") - before_409 == 1
+    assert sample("app_requests_total", method="POST", endpoint="/agendamentos", status="202") == 0
+
+def test_phase_histograms(client):
+    phases = ["json_parse", "lock_acquire", "conflict_query", "commit", "audit_emit", "lock_release"]
+    before = {p: sample("agendamento_phase_duration_seconds_count", phase=p) for p in phases}
+    held = sample("lock_held_seconds_count")
+    assert client.post("/agendamentos", json=item(2, 3)).status_code == 201
+    for p in phases:
+        assert sample("agendamento_phase_duration_seconds_count", phase=p) - before[p] == 1, p
+    assert sample("lock_held_seconds_count") - held == 1
+    assert b"app_request_duration_seconds_bucket" in client.get("/metrics").data
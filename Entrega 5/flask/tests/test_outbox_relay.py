@@ -0,0 +1,65 @@
+import os
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+import app as app_module
+from app import app, db, Agendamento, CacheVersion, OutboxEvent
+from outbox_relay import OutboxRelay, StreamConsumer
+from read_model import ReadModel
+
+def _pay(h):
+    return {"cientista_id": 1, "telescopio_id": 1,
+            "horario_inicio_utc": f"2031-01-01T{h:02d}:00:00Z", "horario_fim_utc": f"2031-01-01T{h:02d}:30:00Z"}
+
+def test_prune_keeps_unpublished_and_recent_events(client):
+    for h in range(4):
+        client.post("/agendamentos", json=_pay(h))
+    with app.app_context():
+        OutboxEvent.query.filter(OutboxEvent.id <= 3).update({"created_at": datetime(2020, 1, 1)})
+        db.session.commit()
+    app_module._outbox_prune(2, (datetime.now() - timedelta(days=1)).timestamp())
+    with app.app_context():
+        assert [e.id for e in OutboxEvent.query.order_by(OutboxEvent.id)] == [3, 4]
+
+def test_prune_waits_for_read_model_checkpoint(client, tmp_path, monkeypatch):
+    client.post("/agendamentos", json=_pay(0))
+    rm = ReadModel(str(tmp_path / "rm.db"), (Agendamento.__table__, CacheVersion.__table__),
+                   app_module._outbox_after, app_module._outbox_snapshot)
+    rm.run_once()  # snapshot: checkpoint no evento 1
+    for h in range(1, 4):
+        client.post("/agendamentos", json=_pay(h))
+    monkeypatch.setattr(app_module, "READ_MODEL", True)
+    monkeypatch.setattr(app_module, "read_model", rm)
+    app_module._outbox_prune(4, time.time() + 60)  # relay publicou tudo; o read model está atrasado
+    with app.app_context():
+        assert [e.id for e in OutboxEvent.query.order_by(OutboxEvent.id)] == [2, 3, 4]
+    assert rm.run_once() == 3
+
+@pytest.mark.skipif(not os.environ.get("TEST_REDIS_URL"), reason="defina TEST_REDIS_URL para testar contra um Redis real")
+def test_relay_publishes_each_event_once(client):
+    stream = f"teste:eventos:{time.time()}"
+    relays = [OutboxRelay(app_module._outbox_after, redis_url=os.environ["TEST_REDIS_URL"], stream=stream, batch=2)
+              for _ in range(2)]
+    ag_id = client.post("/agendamentos", json=_pay(0)).get_json()["id"]
+    client.post(f"/agendamentos/{ag_id}/cancel")
+    client.post("/agendamentos", json=_pay(1))
+    consumer = StreamConsumer(relays[0].redis, "relatorios", "c1", stream=stream)
+
+    # dois relays leram o mesmo offset: só o primeiro publica o trecho
+    assert relays[0].run_once() == 2
+    relays[1].offset = lambda: 0
+    assert relays[1].run_once() == 0
+    del relays[1].offset
+    assert relays[1].run_once() == 1
+    assert relays[0].offset() == 3 and relays[0].redis.xlen(stream) == 3
+
+    events = consumer.read(count=10, block_ms=10)
+    assert [(i, t, p["status"]) for i, t, p, _ in events] == [
+        (1, "AGENDAMENTO_CRIADO", "CONFIRMED"), (2, "AGENDAMENTO_CANCELADO", "CANCELLED"), (3, "AGENDAMENTO_CRIADO", "CONFIRMED")]
+    consumer.ack([1, 2])
+    # sem ack: reentregue ao mesmo consumidor
+    again = StreamConsumer(relays[0].redis, "relatorios", "c1", stream=stream)
+    assert [e[0] for e in again.read(count=10, block_ms=10)] == [3]
+    relays[0].redis.delete(stream, relays[0].offset_key)
@@ -0,0 +1,110 @@
+import json
+import time
+
+from sqlalchemy import event
+
+import app as app_module
+from app import app, db, Agendamento, CacheVersion, OutboxEvent, Telescopio
+from read_model import ReadModel
+
+def _pay(h):
+    return {"cientista_id": 1, "telescopio_id": 1,
+            "horario_inicio_utc": f"2031-01-01T{h:02d}:00:00Z", "horario_fim_utc": f"2031-01-01T{h:02d}:30:00Z"}
+
+def _model(tmp_path, **kw):
+    return ReadModel(str(tmp_path / "rm.db"), (Agendamento.__table__, CacheVersion.__table__),
+                     app_module._outbox_after, app_module._outbox_snapshot,
+                     reference_tables=(Telescopio.__table__,), load_reference=app_module._reference_rows, **kw)
+
+def _events():
+    with app.app_context():
+        return [(e.event_type, json.loads(e.payload)) for e in OutboxEvent.query.order_by(OutboxEvent.id)]
+
+def test_outbox_follows_the_transaction(client, monkeypatch):
+    ag_id = client.post("/agendamentos", json=_pay(0)).get_json()["id"]
+    client.post(f"/agendamentos/{ag_id}/cancel")
+    # commit abortado (lease perdido): nem a linha nem o evento ficam
+    monkeypatch.setattr(app_module.lease_renewer, "lost", lambda owner: True)
+    assert client.post("/agendamentos", json=_pay(2)).status_code == 409
+    events = _events()
+    assert [(t, p["id"], p["status"], p["version"]) for t, p in events] == [
+        ("AGENDAMENTO_CRIADO", ag_id, "CONFIRMED", 1), ("AGENDAMENTO_CANCELADO", ag_id, "CANCELLED", 2)]
+
+def test_projection_matches_primary(client, tmp_path):
+    first = client.post("/agendamentos", json=_pay(0)).get_json()["id"]
+    rm = _model(tmp_path)
+    assert rm.run_once() == 1  # snapshot
+    client.post("/agendamentos", json=_pay(1))
+    client.post(f"/agendamentos/{first}/cancel")
+    client.post("/agendamentos/batch", json={"items": [_pay(3), _pay(4)]})
+    assert rm.run_once() == 4
+    with app.app_context(), rm.connect() as conn:
+        assert app_module._page([], None, 100, conn) == app_module._page([], None, 100)
+        assert app_module.cache_version(1, conn) == app_module.cache_version(1) == 4
+    assert rm.lag_s() < 1
+
+def test_gets_use_read_model_only_while_fresh(client, tmp_path, monkeypatch):
+    rm = _model(tmp_path, max_lag_ms=60000)
+    monkeypatch.setattr(app_module, "READ_MODEL", True)
+    monkeypatch.setattr(app_module, "read_model", rm)
+    monkeypatch.setattr(rm, "ensure_started", lambda: None)  # o teste avança o projetor à mão
+    client.post("/agendamentos", json=_pay(0))
+    assert len(client.get("/agendamentos").get_json()["items"]) == 1  # sem snapshot: BD principal
+    rm.run_once()
+    client.post("/agendamentos", json=_pay(1))  # ainda não projetado
+    assert len(client.get("/agendamentos").get_json()["items"]) == 1
+    livres = client.get("/telescopios/1/disponibilidade",
+                        query_string={"from": "2031-01-01T00:00:00Z", "to": "2031-01-01T02:00:00Z"}).get_json()["livres"]
+    assert livres == [["2031-01-01T00:30:00Z", "2031-01-01T02:00:00Z"]]
+    rm.max_lag_s = 0
+    time.sleep(0.01)
+    assert len(client.get("/agendamentos").get_json()["items"]) == 2
+
+def test_gap_waits_for_older_transaction(tmp_path):
+    now = time.time()
+    ev = lambda i, age: (i, "AGENDAMENTO_CRIADO", {"id": i, "cientista_id": 1, "telescopio_id": 1, "horario_inicio_utc": "2031-01-01T00:00:00",
+                             "horario_fim_utc": "2031-01-01T01:00:00", "status": "CONFIRMED", "version": i}, now - age)
+    feed = [ev(1, 0), ev(3, 0)]
+    rm = ReadModel(str(tmp_path / "rm.db"), (Agendamento.__table__, CacheVersion.__table__),
+                   lambda after, limit: [e for e in feed if e[0] > after], lambda: (0, [], {}), gap_ms=1000)
+    rm.run_once()  # snapshot vazio
+    assert rm.run_once() == 1  # id 2 pode estar em andamento: para no buraco
+    assert rm.lag_s() > 0.0 and rm.run_once() == 0
+    feed[1] = ev(3, 5)  # buraco mais velho que READ_MODEL_GAP_MS: id 2 foi descartado
+    assert rm.run_once() == 1
+
+def test_projector_prunes_applied_events(client, tmp_path):
+    rm = _model(tmp_path, prune=app_module._outbox_prune, retention_s=0)
+    rm.run_once()  # snapshot
+    for h in range(3):
+        client.post("/agendamentos", json=_pay(h))
+    time.sleep(0.01)
+    assert rm.run_once() == 3
+    assert _events() == []  # aplicados e fora da retenção
+    client.post("/agendamentos", json=_pay(5))
+    rm._next_prune = float("inf")
+    assert rm.run_once() == 1 and len(_events()) == 1  # poda só a cada OUTBOX_PRUNE_INTERVAL_S
+
+def test_availability_does_not_touch_primary_while_fresh(client, tmp_path, monkeypatch):
+    rm = _model(tmp_path, max_lag_ms=60000)
+    monkeypatch.setattr(app_module, "READ_MODEL", True)
+    monkeypatch.setattr(app_module, "read_model", rm)
+    monkeypatch.setattr(rm, "ensure_started", lambda: None)
+    client.post("/agendamentos", json=_pay(0))
+    rm.run_once()
+    with app.app_context():
+        db.session.add(Telescopio(id=7, nome="Novo"))
+        db.session.commit()
+        engine = db.engine
+    primary = []
+    listener = lambda conn, cursor, stmt, *a: primary.append(stmt)
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        q = {"from": "2031-01-01T00:00:00Z", "to": "2031-01-01T02:00:00Z"}
+        assert client.get("/telescopios/1/disponibilidade", query_string=q).status_code == 200
+        assert client.get("/telescopios/7/disponibilidade", query_string=q).status_code == 404  # ainda não copiado
+        assert primary == []
+        rm.refresh_reference()
+        assert client.get("/telescopios/7/disponibilidade", query_string=q).status_code == 200
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
@@ -0,0 +1,70 @@
+import pytest
+
+import app as app_module
+from app import app, db, Agendamento, Cientista, Telescopio
+from db_shards import ShardRouter
+
+def _pay(tel, h):
+    return {"cientista_id": 1, "telescopio_id": tel,
+            "horario_inicio_utc": f"2031-01-01T{h:02d}:00:00Z", "horario_fim_utc": f"2031-01-01T{h:02d}:30:00Z"}
+
+@pytest.fixture()
+def client(client, tmp_path, monkeypatch):
+    # shard 0 = BD dos testes; telescópios ímpares no shard 1 (telescopio_id % 2)
+    with app.app_context():
+        router = ShardRouter(db.engine, db.session, [f"sqlite:///{tmp_path / 'shard1.db'}"])
+        monkeypatch.setattr(app_module, "shards", router)
+        app_module.init_shards()
+    yield client
+    router.dispose()
+
+def _rows(shard):
+    with app.app_context():
+        s = app_module.shards.session(shard)
+        return sorted((a.telescopio_id, a.id) for a in s.query(Agendamento))
+
+def test_writes_go_to_the_telescope_shard(client):
+    ids = [client.post("/agendamentos", json=_pay(tel, h)).get_json()["id"] for tel, h in ((1, 0), (2, 0), (1, 1))]
+    assert ids == [1 * 2 + 1, 1 * 2 + 0, 2 * 2 + 1]  # id local * 2 + shard
+    assert _rows(0) == [(2, 1)] and _rows(1) == [(1, 1), (1, 2)]
+    assert client.post("/agendamentos", json=_pay(1, 0)).status_code == 409
+    assert client.post("/agendamentos", json=_pay(2, 0)).status_code == 409
+    assert client.post(f"/agendamentos/{ids[0]}/cancel").get_json() == {"id": ids[0], "status": "CANCELLED"}
+    assert client.post("/agendamentos", json=_pay(1, 0)).status_code == 201
+    assert client.post("/agendamentos/99/cancel").status_code == 404
+
+def test_listing_merges_shards_in_order(client):
+    for tel, h in ((1, 3), (2, 1), (1, 0), (2, 2), (2, 0)):
+        client.post("/agendamentos", json=_pay(tel, h))
+    seen, cursor = [], None
+    while True:
+        page = client.get("/agendamentos", query_string={"limit": 2, **({"cursor": cursor} if cursor else {})}).get_json()
+        seen += [(r["horario_inicio_utc"][11:13], r["telescopio_id"], r["id"]) for r in page["items"]]
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    assert seen == sorted(seen, key=lambda r: (r[0], r[2])) and len(seen) == 5
+    assert [r[:2] for r in seen] == [("00", 1), ("00", 2), ("01", 2), ("02", 2), ("03", 1)]
+    only = client.get("/agendamentos", query_string={"telescopio": 1}).get_json()["items"]
+    assert [r["telescopio_id"] for r in only] == [1, 1]
+    export = client.get("/agendamentos", query_string={"format": "ndjson"}).get_data(as_text=True).splitlines()
+    assert len(export) == 5
+
+def test_batch_commits_per_shard(client):
+    best = client.post("/agendamentos/batch", json={"mode": "best_effort", "items": [_pay(1, 0), _pay(2, 0), _pay(2, 0)]})
+    assert best.status_code == 207
+    assert [r["status"] for r in best.get_json()["results"]] == [201, 201, 409]
+    assert _rows(0) == [(2, 1)] and _rows(1) == [(1, 1)]
+    assert client.post("/agendamentos/batch", json={"items": [_pay(1, 5), _pay(2, 5)]}).status_code == 400
+    assert client.post("/agendamentos/batch", json={"items": [_pay(1, 5), _pay(3, 5)]}).status_code == 201
+
+def test_reference_rows_created_later_reach_the_shard(client):
+    # criados no shard 0 depois do init_shards: copiados para o shard 1 na primeira reserva
+    with app.app_context():
+        db.session.add_all([Cientista(id=5, nome="Nova", email="nova@example.com"), Telescopio(id=3, nome="Novo")])
+        db.session.commit()
+    assert client.post("/agendamentos", json={**_pay(3, 0), "cientista_id": 5}).status_code == 201
+    assert client.post("/agendamentos/batch", json={"items": [{**_pay(1, 3), "cientista_id": 5}]}).status_code == 201
+    with app.app_context():
+        s = app_module.shards.session(1)
+        assert s.get(Cientista, 5).email == "nova@example.com" and s.get(Telescopio, 3).nome == "Novo"
@@ -0,0 +1,98 @@
+import os
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import IntegrityError
+
+import app as app_module
+from app import app, db, Agendamento, Cientista, Telescopio
+from storage import SQLiteStorage, PostgresStorage
+
+T0 = datetime(2032, 1, 1)
+
+def item(h0, h1, tel=1):
+    return {"cientista_id": 1, "telescopio_id": tel,
+            "horario_inicio_utc": (T0 + timedelta(hours=h0)).isoformat() + "Z",
+            "horario_fim_utc": (T0 + timedelta(hours=h1)).isoformat() + "Z"}
+
+@pytest.fixture()
+def native_client(monkeypatch):
+    def no_lock(*a, **kw):
+        raise AssertionError("modo native não deve chamar o coordenador")
+    monkeypatch.setattr(app_module, "acquire_lock", no_lock)
+    monkeypatch.setattr(app_module, "CONFLICT_CACHE", False)  # exercita o trigger, não o cache
+    native = SQLiteStorage("native")
+    monkeypatch.setattr(app_module, "storage", native)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        native.install(db.engine)
+    yield app.test_client()
+    with app.app_context():
+        db.drop_all()  # remove a tabela e os triggers
+
+def test_sqlite_native_rejects_overlap_with_single_insert(native_client):
+    assert native_client.post("/agendamentos", json=item(0, 2)).status_code == 201
+    assert native_client.post("/agendamentos", json=item(1, 3)).status_code == 409
+    assert native_client.post("/agendamentos", json=item(2, 3)).status_code == 201
+    assert native_client.post("/agendamentos", json=item(1, 3, tel=2)).status_code == 201
+
+def test_sqlite_native_allows_rebooking_after_cancel(native_client):
+    ag_id = native_client.post("/agendamentos", json=item(0, 2)).get_json()["id"]
+    assert native_client.post(f"/agendamentos/{ag_id}/cancel").status_code == 200
+    assert native_client.post("/agendamentos", json=item(0, 2)).status_code == 201
+
+def test_sqlite_native_trigger_blocks_direct_insert(native_client):
+    with app.app_context():
+        db.session.add(Agendamento(cientista_id=1, telescopio_id=1, horario_inicio_utc=T0, horario_fim_utc=T0 + timedelta(hours=1)))
+        db.session.commit()
+        db.session.add(Agendamento(cientista_id=1, telescopio_id=1, horario_inicio_utc=T0, horario_fim_utc=T0 + timedelta(hours=1)))
+        with pytest.raises(IntegrityError) as exc:
+            db.session.commit()
+        db.session.rollback()
+        assert app_module.storage.is_overlap_error(exc.value)
+
+def test_sqlite_native_batch(native_client):
+    native_client.post("/agendamentos", json=item(5, 6))
+    r = native_client.post("/agendamentos/batch", json={"mode": "best_effort", "items": [item(0, 1), item(5, 7)]})
+    assert [x["status"] for x in r.get_json()["results"]] == [201, 409]
+
+@pytest.mark.skipif(not os.environ.get("TEST_POSTGRES_URL"), reason="TEST_POSTGRES_URL não definido (ex.: docker compose --profile postgres up)")
+def test_postgres_exclusion_constraint():
+    engine = create_engine(os.environ["TEST_POSTGRES_URL"])
+    db.metadata.drop_all(engine)
+    db.metadata.create_all(engine)
+    pg = PostgresStorage("native")
+    pg.install(engine)
+    pg.install(engine)  # idempotente
+    with engine.begin() as conn:
+        conn.execute(Cientista.__table__.insert().values(id=1, nome="Teste", email="teste@example.com"))
+        conn.execute(Telescopio.__table__.insert().values(id=1, nome="Hubble-Acad"))
+    table = Agendamento.__table__
+    row = {"cientista_id": 1, "telescopio_id": 1, "status": "CONFIRMED",
+           "horario_inicio_utc": T0, "horario_fim_utc": T0 + timedelta(hours=2)}
+    with engine.begin() as conn:
+        conn.execute(table.insert().values(**row))
+    with pytest.raises(IntegrityError) as exc:
+        with engine.begin() as conn:
+            conn.execute(table.insert().values(**{**row, "horario_inicio_utc": T0 + timedelta(hours=1),
+                                                  "horario_fim_utc": T0 + timedelta(hours=3)}))
+    assert pg.is_overlap_error(exc.value)
+    with engine.begin() as conn:
+        conn.execute(table.insert().values(**{**row, "status": "CANCELLED"}))
+    db.metadata.drop_all(engine)
+
+def test_cache_version_bump_is_one_upsert():
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        assert [app_module.bump_cache_version(7) for _ in range(3)] == [1, 2, 3]
+        db.session.commit()
+        assert app_module.cache_version(7) == 3
+    # PostgreSQL: o mesmo comando, sem depender de um servidor
+    stmt = PostgresStorage.insert(app_module.CacheVersion).values(telescopio_id=1, version=1).on_conflict_do_update(
+        index_elements=[app_module.CacheVersion.telescopio_id], set_={"version": app_module.CacheVersion.version + 1})
+    sql = str(stmt.returning(app_module.CacheVersion.version).compile(dialect=postgresql.dialect()))
+    assert "ON CONFLICT (telescopio_id) DO UPDATE" in sql and "RETURNING" in sql
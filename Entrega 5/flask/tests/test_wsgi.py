@@ -0,0 +1,15 @@
+import os
+
+import app as app_module
+import coordinator_client
+
+def test_create_app_is_idempotent():
+    a = app_module.create_app()
+    assert app_module.create_app() is a
+    assert a.test_client().get("/health").status_code == 200
+
+def test_client_recreated_in_forked_worker(monkeypatch):
+    parent = coordinator_client.get_client()
+    assert coordinator_client.get_client() is parent
+    monkeypatch.setattr(os, "getpid", lambda: -1)  # simula o processo filho
+    assert coordinator_client.get_client() is not parent
@@ -0,0 +1,5 @@
+# flask/wsgi.py
+# Entrada WSGI de produção:  gunicorn -c gunicorn.conf.py wsgi:app
+from app import create_app
+
+app = create_app()